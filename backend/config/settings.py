@@ -104,6 +104,23 @@ else:
         }
     }
 
+# Cache partilhada por todos os processos (workers): as versões do catálogo,
+# do grafo de elenco e das recomendações, e as listas pessoais em cache, só
+# são invalidadas de facto se todos os workers virem a mesma cache. Usa-se o
+# Redis (serviço `redis` no docker-compose), que mantém as leituras em cache
+# fora da base de dados e tem `incr` atómico; sem `REDIS_URL` (desenvolvimento
+# e testes, num só processo) fica a cache em memória por omissão. Ver
+# `backend/core/checks.py`.
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator', 'OPTIONS': {'min_length': 8}},
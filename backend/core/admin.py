@@ -7,6 +7,8 @@ from .models.elenco import Elenco
 from .models.video import Video
 from .models.review import Review
 from .models.listas import Watchlist, Favorito
+from .models.faceta import ContagemFaceta
+from .models.recomendacao import FilmeSemelhante
 
 class ElencoInline(admin.TabularInline):
     model = Elenco
@@ -47,8 +49,8 @@ class CategoriaAdmin(admin.ModelAdmin):
 
 @admin.register(Pessoa)
 class PessoaAdmin(admin.ModelAdmin):
-    list_display = ("id", "nome")
-    search_fields = ("nome",)
+    list_display = ("id", "nome", "imdb_id")
+    search_fields = ("nome", "imdb_id")
 
 @admin.register(Realizador)
 class RealizadorAdmin(admin.ModelAdmin):
@@ -70,6 +72,15 @@ class FilmeAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("titulo",)}
     filter_horizontal = ("generos",)
 
+    def save_model(self, request, obj, form, change):
+        if change:
+            # Grava só o que o formulário mudou: os agregados das reviews são
+            # mantidos na base de dados (ver `Filme.CAMPOS_DERIVADOS`).
+            concretos = {f.name for f in obj._meta.concrete_fields}
+            obj.save(update_fields=[c for c in form.changed_data if c in concretos] + ["updated_at"])
+        else:
+            super().save_model(request, obj, form, change)
+
 @admin.register(Elenco)
 class ElencoAdmin(admin.ModelAdmin):
     list_display = ("filme", "pessoa", "papel")
@@ -94,3 +105,15 @@ class WatchlistAdmin(admin.ModelAdmin):
 class FavoritoAdmin(admin.ModelAdmin):
     list_display = ("utilizador", "filme")
     search_fields = ("utilizador__username", "filme__titulo")
+
+
+@admin.register(ContagemFaceta)
+class ContagemFacetaAdmin(admin.ModelAdmin):
+    list_display = ("genero", "decada", "faixa_rating", "total")
+    list_filter = ("decada", "faixa_rating")
+
+@admin.register(FilmeSemelhante)
+class FilmeSemelhanteAdmin(admin.ModelAdmin):
+    list_display = ("filme", "posicao", "semelhante", "similaridade")
+    list_select_related = ("filme", "semelhante")
+    raw_id_fields = ("filme", "semelhante")
@@ -40,6 +40,8 @@ class CoreConfig(AppConfig):
             # necessária para que os sinais sejam registados.
             from . import signals  # noqa: F401
             logger.debug("Sinais da aplicação 'core' carregados com sucesso.")
+            # Regista as verificações de sistema (`manage.py check`).
+            from . import checks  # noqa: F401
         except Exception as e:
             # Regista uma exceção detalhada se a importação dos sinais falhar.
             # Isto é crucial para depurar problemas durante o arranque do servidor.
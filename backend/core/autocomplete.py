@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""
+Índice em memória para sugestões de pesquisa (type-ahead) de filmes e pessoas.
+
+Cada processo (worker) mantém o seu próprio índice, carregado de forma
+preguiçosa no primeiro pedido e atualizado incrementalmente pelos sinais
+`post_save`/`post_delete` de `Filme` e `Pessoa` (ver `signals.py`). Como os
+sinais só chegam ao processo que fez a escrita, o índice é também recarregado
+por inteiro ao fim de `AUTOCOMPLETE_TTL` segundos, para que todos os workers
+acabem por convergir.
+
+O recarregamento constrói um índice novo fora do lock e só o troca pelo atual
+no fim: enquanto decorre, os outros pedidos continuam a ser servidos pelo
+índice antigo, e as alterações incrementais que chegam entretanto são
+repetidas no novo antes da troca. Só o primeiro carregamento de cada processo
+obriga os pedidos a esperar (ver o comando `benchmark_autocomplete`).
+
+O índice tem duas estruturas:
+
+- uma lista ordenada de chaves normalizadas, uma por cada início de palavra do
+  nome ("o padrinho", "padrinho"), pesquisada com `bisect` para prefixos;
+- um índice invertido de trigramas (`array('I')` por trigrama) que tolera
+  erros de escrita quando os prefixos não chegam para preencher a resposta.
+
+A memória é limitada por `AUTOCOMPLETE_MAX_ENTRADAS`, que conta todas as
+entradas, incluindo as removidas (cujas chaves e trigramas só são libertados
+ao reconstruir o índice). Ao carregar, os filmes com melhor `media_rating`
+têm prioridade e fica uma folga (`FRACAO_FOLGA`) para as alterações
+incrementais; cada alteração de um nome remove uma entrada e insere outra, e
+quando as removidas passam dessa folga o índice é compactado (reconstruído a
+partir das entradas vivas, sem ir à base de dados). Uma inserção que mesmo
+assim não caiba é ignorada e o índice é recarregado no pedido seguinte.
+"""
+from __future__ import annotations
+
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+
+from django.conf import settings
+
+TIPO_FILME = "filme"
+TIPO_PESSOA = "pessoa"
+
+# Fração mínima dos trigramas da pesquisa que um nome tem de conter para ser
+# sugerido pelo caminho tolerante a erros.
+LIMIAR_SEMELHANCA = 0.5
+
+# Trigramas presentes em mais nomes do que isto (" th", "the") quase não
+# distinguem candidatos e custariam mais a percorrer do que tudo o resto.
+MAX_POSTINGS = 20_000
+
+# Fração de `max_entradas` deixada livre ao carregar e que, ocupada por
+# entradas removidas, leva à compactação do índice.
+FRACAO_FOLGA = 0.1
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos e com qualquer pontuação reduzida a um espaço."""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    limpo = "".join(c if c.isalnum() else " " for c in sem_acentos.lower())
+    return " ".join(limpo.split())
+
+
+def trigramas(texto: str) -> set[str]:
+    """Trigramas de cada palavra, com espaços de guarda como no `pg_trgm`."""
+    grams = set()
+    for palavra in texto.split():
+        palavra = f"  {palavra} "
+        grams.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return grams
+
+
+@dataclass(slots=True)
+class Entrada:
+    tipo: str
+    id: int
+    label: str
+    slug: str
+    peso: float
+    chave: str
+
+
+class IndiceAutocomplete:
+    """Índice de prefixos e trigramas sobre `Filme.titulo` e `Pessoa.nome`."""
+
+    def __init__(self, max_entradas: int | None = None, ttl: float | None = None):
+        self.max_entradas = max_entradas or getattr(settings, "AUTOCOMPLETE_MAX_ENTRADAS", 200_000)
+        self.ttl = ttl if ttl is not None else getattr(settings, "AUTOCOMPLETE_TTL", 900)
+        # Entradas carregadas; o resto de `max_entradas` é a folga.
+        self._folga = max(1, int(self.max_entradas * FRACAO_FOLGA))
+        self._capacidade = max(1, self.max_entradas - self._folga)
+        self._lock = threading.RLock()
+        # Um só carregamento de cada vez; não bloqueia as pesquisas.
+        self._lock_carga = threading.Lock()
+        self._carregado_em: float | None = None
+        self._invalidado = False
+        # Alterações feitas durante um carregamento, a repetir no índice novo.
+        self._alteracoes: list[tuple] | None = None
+        self._limpar()
+
+    def _limpar(self):
+        self._slots: list[Entrada | None] = []
+        self._slot_por_objeto: dict[tuple[str, int], int] = {}
+        self._chaves: list[str] = []
+        self._chave_slot = array("I")
+        self._postings: dict[str, array] = {}
+        self._removidos = 0
+        self._pendentes: list[tuple[str, int]] | None = None
+
+    @property
+    def carregado(self) -> bool:
+        return self._carregado_em is not None
+
+    # --- Carregamento ---
+
+    def carregar(self, filmes=None, pessoas=None):
+        """
+        Reconstrói o índice a partir de todos os nomes da base de dados (ou dos
+        `filmes` e `pessoas` dados, como em `construir`).
+        """
+        from .models.filme import Filme
+        from .models.pessoa import Pessoa
+
+        if filmes is None:
+            filmes = (
+                Filme.objects.order_by("-media_rating", "id")
+                .values_list("id", "titulo", "slug", "media_rating")[: self._capacidade]
+                .iterator()
+            )
+        if pessoas is None:
+            pessoas = (
+                Pessoa.objects.order_by("id")
+                .values_list("id", "nome", "slug")[: self._capacidade]
+                .iterator()
+            )
+        self._reconstruir(filmes, pessoas, recarregado=True)
+
+    def compactar(self):
+        """
+        Reconstrói o índice só com as entradas vivas, libertando as chaves e
+        os trigramas das removidas. Não conta como recarregamento: o TTL mantém-se.
+        """
+        with self._lock:
+            vivas = [entrada for entrada in self._slots if entrada is not None]
+        vivas.sort(key=lambda entrada: -entrada.peso)
+        self._reconstruir(
+            [(e.id, e.label, e.slug, e.peso) for e in vivas if e.tipo == TIPO_FILME],
+            [(e.id, e.label, e.slug) for e in vivas if e.tipo == TIPO_PESSOA],
+            recarregado=False,
+        )
+
+    def _reconstruir(self, filmes, pessoas, recarregado):
+        """Constrói um índice novo fora do lock e troca-o pelo atual."""
+        with self._lock:
+            # Uma invalidação que chegue a meio do carregamento não se perde.
+            if recarregado:
+                self._invalidado = False
+            self._alteracoes = []
+        try:
+            novo = self.construir(filmes, pessoas)
+        except BaseException:
+            with self._lock:
+                self._alteracoes = None
+            raise
+
+        with self._lock:
+            for metodo, argumentos in self._alteracoes:
+                getattr(novo, metodo)(*argumentos)
+            self._alteracoes = None
+            self._slots = novo._slots
+            self._slot_por_objeto = novo._slot_por_objeto
+            self._chaves = novo._chaves
+            self._chave_slot = novo._chave_slot
+            self._postings = novo._postings
+            self._removidos = novo._removidos
+            # Uma inserção recusada no índice novo pede um recarregamento.
+            self._invalidado = self._invalidado or novo._invalidado
+            if recarregado:
+                self._carregado_em = time.monotonic()
+
+    def construir(self, filmes, pessoas) -> "IndiceAutocomplete":
+        """
+        Um índice novo (com os mesmos limites) a partir de `(id, titulo, slug,
+        media_rating)` por filme, por ordem de prioridade, e `(id, nome, slug)`
+        por pessoa; as pessoas só ocupam as entradas que sobrarem, e a folga
+        fica livre.
+        """
+        novo = IndiceAutocomplete(self.max_entradas, self.ttl)
+        novo._pendentes = []
+        for pk, titulo, slug, rating in filmes:
+            novo._inserir(TIPO_FILME, pk, titulo, slug, rating)
+            if len(novo._slots) >= self._capacidade:
+                break
+        for pk, nome, slug in pessoas:
+            if len(novo._slots) >= self._capacidade:
+                break
+            novo._inserir(TIPO_PESSOA, pk, nome, slug, 0.0)
+        # Em carregamento, as chaves são ordenadas uma única vez no fim em vez
+        # de inseridas uma a uma na posição certa (o que seria quadrático).
+        novo._pendentes.sort()
+        novo._chaves = [chave for chave, _ in novo._pendentes]
+        novo._chave_slot = array("I", (slot for _, slot in novo._pendentes))
+        novo._pendentes = None
+        return novo
+
+    def _desatualizado(self) -> bool:
+        return self._invalidado or time.monotonic() - self._carregado_em > self.ttl
+
+    def _fragmentado(self) -> bool:
+        return self._removidos >= self._folga
+
+    def garantir_carregado(self):
+        if self._carregado_em is None:
+            # Ainda não há índice para servir: espera pelo carregamento.
+            with self._lock_carga:
+                # Outro thread pode ter carregado entretanto.
+                if self._carregado_em is None:
+                    self.carregar()
+        elif (self._desatualizado() or self._fragmentado()) and self._lock_carga.acquire(blocking=False):
+            # Um só thread recarrega; os outros continuam com o índice atual.
+            try:
+                if self._desatualizado():
+                    self.carregar()
+                elif self._fragmentado():
+                    self.compactar()
+            finally:
+                self._lock_carga.release()
+
+    def invalidar(self):
+        """Marca o índice deste processo como desatualizado; o próximo pedido recarrega-o."""
+        with self._lock:
+            self._invalidado = True
+
+    # --- Manutenção incremental ---
+
+    def _inserir(self, tipo, pk, label, slug, peso):
+        chave = normalizar(label)
+        if not chave:
+            return
+        if len(self._slots) >= self.max_entradas:
+            # Sem lugar nem na folga: o próximo pedido recarrega o índice.
+            self._invalidado = True
+            return
+        slot = len(self._slots)
+        self._slots.append(Entrada(tipo, pk, label, slug, float(peso or 0), chave))
+        self._slot_por_objeto[(tipo, pk)] = slot
+
+        palavras = chave.split(" ")
+        for i in range(len(palavras)):
+            sufixo = " ".join(palavras[i:])
+            if self._pendentes is not None:
+                self._pendentes.append((sufixo, slot))
+                continue
+            posicao = bisect_left(self._chaves, sufixo)
+            self._chaves.insert(posicao, sufixo)
+            self._chave_slot.insert(posicao, slot)
+        for gram in trigramas(chave):
+            self._postings.setdefault(gram, array("I")).append(slot)
+
+    def _registar(self, metodo: str, *argumentos):
+        """
+        Aplica uma alteração ao índice atual, se estiver carregado, e guarda-a
+        se houver um carregamento em curso (incluindo o primeiro), para a
+        repetir no índice novo.
+        """
+        with self._lock:
+            if self._alteracoes is not None:
+                self._alteracoes.append((metodo, argumentos))
+            if self.carregado:
+                getattr(self, metodo)(*argumentos)
+
+    def atualizar(self, tipo: str, pk: int, label: str, slug: str, peso: float = 0.0):
+        """Insere ou substitui a entrada de um objeto."""
+        self._registar("_atualizar", tipo, pk, label, slug, peso)
+
+    def _atualizar(self, tipo, pk, label, slug, peso):
+        slot = self._slot_por_objeto.get((tipo, pk))
+        if slot is not None:
+            entrada = self._slots[slot]
+            if entrada.label == label and entrada.slug == slug:
+                entrada.peso = float(peso or 0)
+                return
+            self._remover_slot(slot)
+        self._inserir(tipo, pk, label, slug, peso)
+
+    def atualizar_peso(self, tipo: str, pk: int, peso: float):
+        self._registar("_atualizar_peso", tipo, pk, peso)
+
+    def _atualizar_peso(self, tipo, pk, peso):
+        slot = self._slot_por_objeto.get((tipo, pk))
+        if slot is not None:
+            self._slots[slot].peso = float(peso or 0)
+
+    def remover(self, tipo: str, pk: int):
+        self._registar("_remover", tipo, pk)
+
+    def _remover(self, tipo, pk):
+        slot = self._slot_por_objeto.get((tipo, pk))
+        if slot is not None:
+            self._remover_slot(slot)
+
+    def _remover_slot(self, slot):
+        # As chaves e os postings do slot ficam para trás e são ignorados nas
+        # pesquisas; só a compactação (ou um recarregamento) os liberta.
+        entrada = self._slots[slot]
+        del self._slot_por_objeto[(entrada.tipo, entrada.id)]
+        self._slots[slot] = None
+        self._removidos += 1
+
+    # --- Pesquisa ---
+
+    def sugerir(self, texto: str, limite: int = 8) -> list[Entrada]:
+        """
+        Devolve até `limite` sugestões para o texto escrito até agora.
+
+        Primeiro procura nomes em que uma palavra comece pelo texto (os que
+        começam logo na primeira palavra e têm maior peso vêm primeiro); se não
+        houver sugestões suficientes, completa com correspondências aproximadas
+        por trigramas.
+        """
+        consulta = normalizar(texto)
+        if not consulta:
+            return []
+        self.garantir_carregado()
+
+        with self._lock:
+            encontrados: dict[int, tuple] = {}
+            posicao = bisect_left(self._chaves, consulta)
+            # Percorre no máximo algumas vezes o limite pedido, para que um
+            # prefixo muito comum ("a") não obrigue a varrer o índice inteiro.
+            maximo = limite * 20
+            while posicao < len(self._chaves) and len(encontrados) < maximo:
+                chave = self._chaves[posicao]
+                if not chave.startswith(consulta):
+                    break
+                slot = self._chave_slot[posicao]
+                entrada = self._slots[slot]
+                if entrada is not None and slot not in encontrados:
+                    inicio = entrada.chave.startswith(consulta)
+                    encontrados[slot] = (0 if inicio else 1, -entrada.peso, len(entrada.label))
+                posicao += 1
+
+            ordenados = sorted(encontrados, key=encontrados.__getitem__)[:limite]
+            if len(ordenados) < limite and len(consulta) >= 3:
+                ordenados += self._aproximados(consulta, limite - len(ordenados), set(ordenados))
+            return [self._slots[slot] for slot in ordenados]
+
+    def _aproximados(self, consulta, quantos, excluir):
+        grams = trigramas(consulta)
+        if not grams:
+            return []
+        contagem = Counter()
+        considerados = 0
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings is not None and len(postings) > MAX_POSTINGS:
+                continue
+            considerados += 1
+            if postings is not None:
+                contagem.update(postings)
+
+        minimo = LIMIAR_SEMELHANCA * considerados
+        candidatos = []
+        for slot, comuns in contagem.items():
+            if comuns < minimo or slot in excluir:
+                continue
+            entrada = self._slots[slot]
+            if entrada is None:
+                continue
+            candidatos.append((-comuns, -entrada.peso, len(entrada.label), slot))
+        candidatos.sort()
+        return [c[-1] for c in candidatos[:quantos]]
+
+    def estatisticas(self) -> dict:
+        return {
+            "entradas": len(self._slot_por_objeto),
+            "chaves": len(self._chaves),
+            "trigramas": len(self._postings),
+            "removidos": self._removidos,
+        }
+
+
+# Instância partilhada por todos os pedidos do processo.
+indice = IndiceAutocomplete()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Cache de respostas para leituras anónimas do catálogo.
+
+As chaves incluem uma "versão do catálogo" guardada na própria cache. Em vez
+de apagar entradas uma a uma, qualquer escrita em filmes, géneros ou reviews
+incrementa a versão (ver `signals.py`) e todas as respostas anteriores deixam
+de ser encontradas, expirando sozinhas ao fim de `CATALOGO_CACHE_TTL` segundos.
+
+A versão vive na cache `default`, que tem de ser partilhada por todos os
+processos (ver `checks.py` e `CACHES` nas settings): numa cache em memória,
+uma escrita só mudaria a versão do processo que a fez. Os contadores de
+hits/misses são de cada processo: contá-los na cache partilhada custaria
+uma escrita por leitura.
+
+O incremento é feito em `transaction.on_commit`: se fosse feito antes do
+commit, um pedido concorrente poderia guardar dados antigos já com a versão
+nova, e esses dados nunca seriam invalidados.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+CHAVE_VERSAO = "catalogo:versao"
+
+SAFE_METHODS = ("GET", "HEAD")
+
+# Cabeçalhos guardados com a resposta, para que um HIT continue a responder a
+# pedidos condicionais (ver `conditional.py`) sem ir à base de dados.
+CABECALHOS_GUARDADOS = ("ETag", "Last-Modified")
+
+
+def _ttl() -> int:
+    return getattr(settings, "CATALOGO_CACHE_TTL", 300)
+
+
+def ler_versao(chave: str) -> int:
+    """Versão guardada em `chave` (do catálogo, do grafo de elenco, do modelo de recomendações)."""
+    versao = cache.get(chave)
+    if versao is None:
+        # Se a chave se perder (expulsa da cache ou após reinício), recomeça a
+        # partir do relógio e não de 1, para não reutilizar versões antigas.
+        cache.add(chave, int(time.time() * 1000), None)
+        versao = cache.get(chave)
+    return versao
+
+
+def incrementar_versao(chave: str) -> None:
+    try:
+        cache.incr(chave)
+    except ValueError:
+        ler_versao(chave)
+    else:
+        # Sem `incr` nativo (p. ex. cache em base de dados), o incremento é um
+        # `set` com o TIMEOUT por omissão; a versão não deve expirar.
+        cache.touch(chave, None)
+
+
+def versao_catalogo() -> int:
+    return ler_versao(CHAVE_VERSAO)
+
+
+def _incrementar_versao() -> None:
+    incrementar_versao(CHAVE_VERSAO)
+
+
+def invalidar_catalogo() -> None:
+    """Invalida todas as respostas em cache quando a transação atual terminar."""
+    transaction.on_commit(_incrementar_versao)
+
+
+_contadores = Counter()
+_contadores_lock = threading.Lock()
+
+
+def _contar(nome: str) -> None:
+    with _contadores_lock:
+        _contadores[nome] += 1
+
+
+def reiniciar_estatisticas() -> None:
+    with _contadores_lock:
+        _contadores.clear()
+
+
+def estatisticas() -> dict:
+    """Versão do catálogo e hits/misses deste processo."""
+    with _contadores_lock:
+        hits, misses = _contadores["hits"], _contadores["misses"]
+    pedidos = hits + misses
+    return {
+        "versao": cache.get(CHAVE_VERSAO),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / pedidos, 4) if pedidos else None,
+    }
+
+
+class CatalogoCacheMixin:
+    """
+    Mixin para viewsets: serve `cache_actions` a partir da cache quando o
+    pedido é seguro (`GET`/`HEAD`) e anónimo. As respostas autenticadas nunca
+    são guardadas nem servidas da cache.
+    """
+    cache_actions = ("list", "retrieve")
+
+    def _usa_cache(self, request) -> bool:
+        return (
+            request.method in SAFE_METHODS
+            and self.action in self.cache_actions
+            and not request.user.is_authenticated
+        )
+
+    def _chave_cache(self, request) -> str:
+        # O host entra na chave porque os links de paginação são absolutos.
+        pedido = f"{request.get_host()}{request.get_full_path()}"
+        resumo = hashlib.sha1(pedido.encode("utf-8")).hexdigest()
+        return f"catalogo:v{versao_catalogo()}:{self.basename}:{self.action}:{resumo}"
+
+    def responder_com_cache(self, request, handler, *args, **kwargs):
+        if not self._usa_cache(request):
+            return handler(request, *args, **kwargs)
+
+        chave = self._chave_cache(request)
+        guardado = cache.get(chave)
+        if guardado is not None:
+            _contar("hits")
+            codigo, dados, cabecalhos = guardado
+            response = None
+            if "ETag" in cabecalhos:
+                response = get_conditional_response(
+                    request._request,
+                    etag=cabecalhos["ETag"],
+                    last_modified=parse_http_date_safe(cabecalhos.get("Last-Modified", "")),
+                )
+            if response is None:
+                response = Response(dados, status=codigo)
+            for nome, valor in cabecalhos.items():
+                response[nome] = valor
+            response["X-Cache"] = "HIT"
+            return response
+
+        _contar("misses")
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cabecalhos = {nome: response[nome] for nome in CABECALHOS_GUARDADOS if response.has_header(nome)}
+            cache.set(chave, (response.status_code, response.data, cabecalhos), _ttl())
+        response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.responder_com_cache(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.responder_com_cache(request, super().retrieve, *args, **kwargs)
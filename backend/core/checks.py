@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Verificações de sistema da aplicação 'core' (`manage.py check`).
+
+As caches desta aplicação (respostas do catálogo, listas pessoais e as
+versões do grafo de elenco e das recomendações) são invalidadas mudando
+valores guardados na cache do Django. Com uma cache em memória, cada
+processo tem a sua: uma escrita só invalida o processo que a fez e os
+outros continuam a servir dados antigos. Num deploy (`check --deploy`),
+isso é um erro.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+CACHES_POR_PROCESSO = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches, deploy=True)
+def cache_partilhada(app_configs, **kwargs):
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend not in CACHES_POR_PROCESSO:
+        return []
+    return [
+        Error(
+            f"A cache 'default' ({backend}) não é partilhada entre processos.",
+            hint=(
+                "Configure uma cache partilhada em CACHES (Redis, com REDIS_URL, ou memcached); "
+                "num único processo, silencie com SILENCED_SYSTEM_CHECKS = ['core.E001']."
+            ),
+            id="core.E001",
+        )
+    ]
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Pedidos condicionais (ETag / Last-Modified) para os recursos do catálogo.
+
+Os validadores são calculados a partir de `updated_at` sem carregar nem
+serializar os objetos:
+
+- detalhe: um único `SELECT id, updated_at ... WHERE slug = %s` (índice único);
+- lista: `MAX(updated_at)` e `COUNT(*)` sobre o queryset já filtrado, mais o
+  URL do pedido (página e filtros produzem ETags diferentes). Só é usado
+  quando a paginação já paga um `COUNT(*)`; em modo cursor a lista não leva
+  validadores, para que cada página continue a custar o mesmo.
+
+Se o cliente já tiver a versão atual, a resposta é um `304 Not Modified` e o
+serializer nunca chega a ser construído. Para que isto seja correto, qualquer
+alteração visível na resposta tem de mudar `updated_at` (ver os sinais de
+`Filme.generos` e de `Genero` em `signals.py`).
+"""
+from __future__ import annotations
+
+import hashlib
+from calendar import timegm
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def _timestamp(dt) -> int | None:
+    return timegm(dt.utctimetuple()) if dt else None
+
+
+def _definir_validadores(response, etag, last_modified):
+    if etag:
+        response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Mixin para viewsets com um campo `updated_at`: acrescenta ETag e
+    Last-Modified a `list`/`retrieve` e responde 304 quando os validadores
+    do cliente ainda são válidos.
+    """
+    conditional_field = "updated_at"
+
+    def resposta_personalizada(self, request) -> bool:
+        """
+        Indica se a resposta depende do utilizador (por exemplo, com o estado
+        das suas listas). Essas respostas não levam validadores, porque o
+        `updated_at` dos filmes não muda quando as listas mudam.
+        """
+        return False
+
+    def _validadores_detalhe(self, request, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        linha = (
+            self.get_queryset()
+            .prefetch_related(None)
+            .filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+            .values_list("pk", self.conditional_field)
+            .first()
+        )
+        if linha is None:
+            return None, None
+        pk, alterado = linha
+        etag = quote_etag(f"{pk}-{alterado.timestamp():.6f}")
+        return f"W/{etag}", _timestamp(alterado)
+
+    def _validadores_lista(self, request):
+        agregados = (
+            self.filter_queryset(self.get_queryset())
+            .prefetch_related(None)
+            .order_by()
+            .aggregate(ultimo=Max(self.conditional_field), total=Count("pk"))
+        )
+        ultimo = agregados["ultimo"]
+        base = f"{request.get_full_path()}|{agregados['total']}|{ultimo.timestamp() if ultimo else ''}"
+        etag = quote_etag(hashlib.sha1(base.encode("utf-8")).hexdigest())
+        return f"W/{etag}", _timestamp(ultimo)
+
+    def _responder_condicional(self, request, validadores, handler, *args, **kwargs):
+        etag, last_modified = validadores
+        if etag is None:
+            return handler(request, *args, **kwargs)
+        nao_modificado = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if nao_modificado is not None:
+            return _definir_validadores(nao_modificado, etag, last_modified)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            _definir_validadores(response, etag, last_modified)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.resposta_personalizada(request):
+            return super().retrieve(request, *args, **kwargs)
+        validadores = self._validadores_detalhe(request, **kwargs)
+        return self._responder_condicional(request, validadores, super().retrieve, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        faz_count = getattr(self.paginator, "faz_count", None)
+        if (faz_count is not None and not faz_count(request)) or self.resposta_personalizada(request):
+            return super().list(request, *args, **kwargs)
+        validadores = self._validadores_lista(request)
+        return self._responder_condicional(request, validadores, super().list, *args, **kwargs)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Graus de separação entre pessoas, pelo grafo dos créditos (`Elenco`).
+
+O grafo é bipartido (pessoas e filmes): duas pessoas estão ligadas quando
+entram no mesmo filme. Percorrê-lo com o ORM custaria uma query por salto, por
+isso é carregado uma vez para memória, numa única passagem por
+`Elenco` (`values_list().iterator()` + `np.fromiter`), em dois índices CSR:
+
+- pessoa → filmes: os filmes da pessoa `i` são
+  `pessoa_filmes[pessoa_indptr[i]:pessoa_indptr[i + 1]]`;
+- filme → pessoas: o mesmo, no sentido inverso.
+
+Pessoas e filmes são numerados de 0 a n − 1 (`pessoa_ids` e `filme_ids`
+guardam os pks, ordenados). Um milhão de créditos ocupa cerca de 13 MB
+(ver o comando `benchmark_grafo_elenco`).
+
+`GrafoElenco.caminho` faz uma pesquisa em largura bidirecional: expande, nível a
+nível, o lado com a fronteira mais pequena até as duas pesquisas se
+encontrarem. Cada nível é expandido de uma vez, com operações vetorizadas
+sobre toda a fronteira, em vez de nó a nó.
+
+Cada processo guarda o grafo da versão atual (`grafo_elenco`); qualquer
+escrita em `Elenco` muda a versão (ver `signals.py`) e o grafo é recarregado
+no pedido seguinte. A versão vive na cache partilhada por todos os processos
+(ver `checks.py`), por isso uma escrita num worker chega aos outros.
+"""
+from __future__ import annotations
+
+import threading
+
+import numpy as np
+
+from django.db import transaction
+
+from .cache import incrementar_versao, ler_versao
+from .models.elenco import Elenco
+
+CHUNK_LEITURA = 20000
+CHAVE_VERSAO = "elenco:versao"
+
+# Marcas nos vetores de antecessores da pesquisa.
+NAO_VISTO = -2
+RAIZ = -1
+
+_CREDITO = np.dtype([("pessoa", np.int64), ("filme", np.int64)])
+
+
+def versao_grafo() -> int:
+    return ler_versao(CHAVE_VERSAO)
+
+
+def _incrementar_versao() -> None:
+    incrementar_versao(CHAVE_VERSAO)
+
+
+def invalidar() -> None:
+    """Faz os processos recarregarem o grafo quando a transação atual terminar."""
+    transaction.on_commit(_incrementar_versao)
+
+
+def _csr(origens: np.ndarray, destinos: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+    ordem = np.argsort(origens, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(origens, minlength=n), out=indptr[1:])
+    return indptr, destinos[ordem].astype(np.int32)
+
+
+def _vizinhos(indptr: np.ndarray, indices: np.ndarray, nos: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Todas as arestas que saem de `nos`, como `(origens, destinos)`."""
+    inicios = indptr[nos]
+    tamanhos = indptr[nos + 1] - inicios
+    total = int(tamanhos.sum())
+    if not total:
+        vazio = np.empty(0, dtype=np.int32)
+        return vazio, vazio
+    # Posição de cada aresta em `indices`: o início da sua linha mais o deslocamento dentro dela.
+    deslocamentos = np.arange(total) - np.repeat(np.cumsum(tamanhos) - tamanhos, tamanhos)
+    return np.repeat(nos, tamanhos), indices[np.repeat(inicios, tamanhos) + deslocamentos]
+
+
+def _primeiros(origens: np.ndarray, destinos: np.ndarray, antecessores: np.ndarray) -> np.ndarray:
+    """Marca os destinos ainda por visitar (com a primeira origem de cada); devolve-os."""
+    novos = antecessores[destinos] == NAO_VISTO
+    destinos, posicoes = np.unique(destinos[novos], return_index=True)
+    antecessores[destinos] = origens[novos][posicoes]
+    return destinos
+
+
+class _Pesquisa:
+    """O estado de um dos lados da pesquisa bidirecional."""
+
+    def __init__(self, grafo: "GrafoElenco", origem: int):
+        self.grafo = grafo
+        self.filme_da_pessoa = np.full(len(grafo.pessoa_ids), NAO_VISTO, dtype=np.int32)
+        self.pessoa_do_filme = np.full(len(grafo.filme_ids), NAO_VISTO, dtype=np.int32)
+        self.distancia = np.full(len(grafo.pessoa_ids), -1, dtype=np.int32)
+        self.filme_da_pessoa[origem] = RAIZ
+        self.distancia[origem] = 0
+        self.fronteira = np.array([origem], dtype=np.int32)
+        self.nivel = 0
+
+    def expandir(self) -> None:
+        g = self.grafo
+        pessoas, filmes = _vizinhos(g.pessoa_indptr, g.pessoa_filmes, self.fronteira)
+        filmes = _primeiros(pessoas, filmes, self.pessoa_do_filme)
+        filmes, pessoas = _vizinhos(g.filme_indptr, g.filme_pessoas, filmes)
+        self.fronteira = _primeiros(filmes, pessoas, self.filme_da_pessoa)
+        self.nivel += 1
+        self.distancia[self.fronteira] = self.nivel
+
+    def ate(self, pessoa: int) -> list[int]:
+        """Índices `[pessoa, filme, pessoa, ..., pessoa]`, da origem até `pessoa`."""
+        caminho = [pessoa]
+        while self.filme_da_pessoa[pessoa] != RAIZ:
+            filme = int(self.filme_da_pessoa[pessoa])
+            pessoa = int(self.pessoa_do_filme[filme])
+            caminho += [filme, pessoa]
+        caminho.reverse()
+        return caminho
+
+
+class GrafoElenco:
+    """Grafo pessoa–filme em CSR (ver o docstring do módulo)."""
+
+    def __init__(self, pessoas: np.ndarray, filmes: np.ndarray):
+        """`pessoas[i]` entrou em `filmes[i]` (pks; pares repetidos contam uma vez)."""
+        self.pessoa_ids, pessoa = np.unique(pessoas, return_inverse=True)
+        self.filme_ids, filme = np.unique(filmes, return_inverse=True)
+        # A mesma pessoa pode ter vários papéis no mesmo filme: uma aresta só.
+        pares = np.unique(pessoa.astype(np.int64) * len(self.filme_ids) + filme)
+        pessoa, filme = pares // max(len(self.filme_ids), 1), pares % max(len(self.filme_ids), 1)
+        self.pessoa_indptr, self.pessoa_filmes = _csr(pessoa, filme, len(self.pessoa_ids))
+        self.filme_indptr, self.filme_pessoas = _csr(filme, pessoa, len(self.filme_ids))
+
+    @classmethod
+    def carregar(cls) -> "GrafoElenco":
+        linhas = Elenco.objects.order_by().values_list("pessoa_id", "filme_id").iterator(CHUNK_LEITURA)
+        creditos = np.fromiter(linhas, dtype=_CREDITO)
+        return cls(creditos["pessoa"], creditos["filme"])
+
+    @property
+    def arestas(self) -> int:
+        return len(self.pessoa_filmes)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (
+            self.pessoa_ids, self.filme_ids, self.pessoa_indptr, self.pessoa_filmes, self.filme_indptr, self.filme_pessoas,
+        ))
+
+    def _indice(self, pessoa_id: int) -> int | None:
+        i = int(np.searchsorted(self.pessoa_ids, pessoa_id))
+        return i if i < len(self.pessoa_ids) and self.pessoa_ids[i] == pessoa_id else None
+
+    def caminho(self, origem_id: int, destino_id: int, max_graus: int | None = None) -> list[int] | None:
+        """
+        Caminho mais curto entre duas pessoas, como pks alternados
+        `[pessoa, filme, pessoa, ..., pessoa]`, ou `None` se não houver ligação
+        (ou se for mais longa do que `max_graus` filmes).
+        """
+        origem, destino = self._indice(origem_id), self._indice(destino_id)
+        if origem is None or destino is None:
+            return None
+        if origem == destino:
+            return [origem_id]
+
+        lados = (_Pesquisa(self, origem), _Pesquisa(self, destino))
+        while all(len(lado.fronteira) for lado in lados):
+            if max_graus is not None and lados[0].nivel + lados[1].nivel >= max_graus:
+                return None
+            # Expande o lado com menos pessoas na fronteira.
+            a, b = sorted(lados, key=lambda lado: len(lado.fronteira))
+            a.expandir()
+            encontro = a.fronteira[b.distancia[a.fronteira] >= 0]
+            if len(encontro):
+                # O caminho mais curto passa pela pessoa de encontro mais perto do outro lado.
+                pessoa = int(encontro[np.argmin(b.distancia[encontro])])
+                inicio, fim = lados[0].ate(pessoa), lados[1].ate(pessoa)
+                if max_graus is not None and (len(inicio) + len(fim) - 2) // 2 > max_graus:
+                    return None
+                indices = inicio + fim[-2::-1]
+                return [
+                    int(self.filme_ids[i] if posicao % 2 else self.pessoa_ids[i])
+                    for posicao, i in enumerate(indices)
+                ]
+        return None
+
+
+class _GrafoAtual:
+    """Grafo da versão atual, partilhado pelo processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao = None
+        self._grafo = None
+
+    def atual(self) -> GrafoElenco:
+        versao = versao_grafo()
+        if self._versao != versao:
+            with self._lock:
+                if self._versao != versao:
+                    self._grafo = GrafoElenco.carregar()
+                    self._versao = versao
+        return self._grafo
+
+
+grafo_elenco = _GrafoAtual()
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Filtros do catálogo e contagens de facetas pré-calculadas.
+
+As contagens vivem em `ContagemFaceta` (género × década × faixa de avaliação)
+e são mantidas incrementalmente: cada filme guarda em `faceta_decada` e
+`faceta_faixa` a combinação em que está contado, pelo que sincronizar um filme
+é comparar essa combinação com a atual e aplicar -1/+1 às linhas afetadas.
+Assim, responder a um pedido de facetas lê apenas a tabela de contagens (no
+máximo algumas centenas de linhas) em vez de agrupar a tabela M2M
+`Filme.generos` inteira.
+
+As contagens têm a granularidade da tabela: um intervalo de anos ou de
+avaliações conta as décadas e faixas inteiras que toca.
+"""
+from __future__ import annotations
+
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterable
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Floor, Greatest, Least
+from rest_framework.exceptions import ValidationError
+
+from .models.faceta import ContagemFaceta
+from .models.filme import Filme
+
+FAIXA_MAX = 10
+
+FilmeGenero = Filme.generos.through
+
+
+def decada(ano: int | None) -> int:
+    return (ano // 10) * 10 if ano else 0
+
+
+def faixa(rating: float | None) -> int:
+    return max(0, min(math.floor(rating or 0), FAIXA_MAX))
+
+
+# Expressões SQL equivalentes a `decada()` e `faixa()`, usadas na reconstrução.
+DECADA_SQL = Coalesce(F("ano_lancamento"), Value(0)) / Value(10) * Value(10)
+FAIXA_SQL = Least(
+    Greatest(Cast(Floor(F("media_rating")), models.IntegerField()), Value(0)),
+    Value(FAIXA_MAX),
+)
+
+
+# --- Manutenção incremental ---
+
+def _ajustar(generos_ids: Iterable[int], chave: tuple[int, int], delta: int, total: bool = True) -> None:
+    """
+    Soma `delta` às linhas de `chave` para cada género (e para a linha de
+    total, se `total`). Normalmente é um único `UPDATE`; as linhas que ainda não
+    existem são criadas já com o valor `delta`.
+    """
+    decada_, faixa_ = chave
+    generos_ids = set(generos_ids)
+    alvo = Q(genero_id__in=generos_ids)
+    if total:
+        alvo |= Q(genero__isnull=True)
+    linhas = ContagemFaceta.objects.filter(alvo, decada=decada_, faixa_rating=faixa_)
+    atualizadas = linhas.update(total=F("total") + delta)
+    esperadas = len(generos_ids) + (1 if total else 0)
+    if atualizadas == esperadas or delta < 0:
+        return
+
+    existentes = set(linhas.values_list("genero_id", flat=True))
+    em_falta = [g for g in generos_ids if g not in existentes]
+    if total and None not in existentes:
+        em_falta.append(None)
+    for genero_id in em_falta:
+        try:
+            with transaction.atomic():
+                ContagemFaceta.objects.create(genero_id=genero_id, decada=decada_, faixa_rating=faixa_, total=delta)
+        except IntegrityError:
+            # Criada entretanto por outro pedido: basta incrementá-la.
+            ContagemFaceta.objects.filter(
+                genero_id=genero_id, decada=decada_, faixa_rating=faixa_,
+            ).update(total=F("total") + delta)
+
+
+def sincronizar_filme(filme_id: int) -> tuple[int, int] | None:
+    """
+    Garante que o filme está contado na combinação década/faixa atual e
+    devolve-a (`None` se o filme já não existir).
+
+    É idempotente e custa uma leitura quando nada mudou; pode ser chamada de
+    qualquer caminho que altere `ano_lancamento` ou `media_rating`, incluindo
+    `QuerySet.update()`.
+    """
+    with transaction.atomic():
+        estado = (
+            Filme.objects.select_for_update()
+            .filter(pk=filme_id)
+            .values("ano_lancamento", "media_rating", "faceta_decada", "faceta_faixa")
+            .first()
+        )
+        if estado is None:
+            return None
+        nova = (decada(estado["ano_lancamento"]), faixa(estado["media_rating"]))
+        antiga = None
+        if estado["faceta_decada"] is not None:
+            antiga = (estado["faceta_decada"], estado["faceta_faixa"])
+        if nova == antiga:
+            return nova
+
+        generos = list(FilmeGenero.objects.filter(filme_id=filme_id).values_list("genero_id", flat=True))
+        if antiga is not None:
+            _ajustar(generos, antiga, -1)
+        _ajustar(generos, nova, +1)
+        Filme.objects.filter(pk=filme_id).update(faceta_decada=nova[0], faceta_faixa=nova[1])
+    return nova
+
+
+def remover_filme(filme_id: int) -> None:
+    """Desconta um filme prestes a ser apagado (chamar antes do `DELETE`)."""
+    # A combinação é lida da base de dados: a instância em memória pode não
+    # refletir a última sincronização, que é feita com `update()`.
+    chave = Filme.objects.filter(pk=filme_id).values_list("faceta_decada", "faceta_faixa").first()
+    if chave is None or chave[0] is None:
+        return
+    generos = FilmeGenero.objects.filter(filme_id=filme_id).values_list("genero_id", flat=True)
+    _ajustar(list(generos), chave, -1)
+
+
+def ajustar_generos(filme_ids: Iterable[int], generos_ids: Iterable[int], delta: int) -> None:
+    """Aplica `delta` às linhas de género quando a relação `Filme.generos` muda."""
+    generos_ids = list(generos_ids)
+    if not generos_ids:
+        return
+    chaves = Counter(
+        Filme.objects.filter(pk__in=list(filme_ids), faceta_decada__isnull=False)
+        .values_list("faceta_decada", "faceta_faixa")
+    )
+    for chave, n in chaves.items():
+        _ajustar(generos_ids, chave, delta * n, total=False)
+
+
+def reconstruir() -> None:
+    """
+    Recalcula a tabela de contagens e as combinações de todos os filmes.
+
+    Para depois de importações em massa (que não passam pelos sinais) ou para
+    corrigir desvios. É a única operação que agrupa a tabela M2M.
+    """
+    with transaction.atomic():
+        Filme.objects.update(faceta_decada=DECADA_SQL, faceta_faixa=FAIXA_SQL)
+        totais = (
+            Filme.objects.order_by()
+            .values("faceta_decada", "faceta_faixa")
+            .annotate(n=Count("id"))
+        )
+        por_genero = (
+            FilmeGenero.objects.order_by()
+            .values("genero_id", "filme__faceta_decada", "filme__faceta_faixa")
+            .annotate(n=Count("id"))
+        )
+        linhas = [
+            ContagemFaceta(genero_id=None, decada=t["faceta_decada"], faixa_rating=t["faceta_faixa"], total=t["n"])
+            for t in totais
+        ] + [
+            ContagemFaceta(
+                genero_id=g["genero_id"], decada=g["filme__faceta_decada"],
+                faixa_rating=g["filme__faceta_faixa"], total=g["n"],
+            )
+            for g in por_genero
+        ]
+        ContagemFaceta.objects.all().delete()
+        ContagemFaceta.objects.bulk_create(linhas, batch_size=1000)
+
+
+# --- Filtros e leitura ---
+
+@dataclass
+class FiltroCatalogo:
+    genero: str | None = None
+    ano_min: int | None = None
+    ano_max: int | None = None
+    rating_min: float | None = None
+    rating_max: float | None = None
+
+    @classmethod
+    def from_query_params(cls, params) -> "FiltroCatalogo":
+        erros = {}
+
+        def ler(nome, tipo):
+            valor = params.get(nome)
+            if valor in (None, ""):
+                return None
+            try:
+                convertido = tipo(valor)
+                # `float()` aceita "nan" e "inf", que não cabem numa faixa.
+                if not math.isfinite(convertido):
+                    raise ValueError(valor)
+                return convertido
+            except ValueError:
+                erros[nome] = f"Valor inválido: {valor!r}."
+                return None
+
+        filtro = cls(
+            genero=params.get("genero") or None,
+            ano_min=ler("ano_min", int),
+            ano_max=ler("ano_max", int),
+            rating_min=ler("rating_min", float),
+            rating_max=ler("rating_max", float),
+        )
+        if erros:
+            raise ValidationError(erros)
+        return filtro
+
+    def aplicar(self, queryset):
+        """Filtra um queryset de `Filme` com os valores exatos pedidos."""
+        if self.genero:
+            queryset = queryset.filter(generos__slug=self.genero)
+        if self.ano_min is not None:
+            queryset = queryset.filter(ano_lancamento__gte=self.ano_min)
+        if self.ano_max is not None:
+            queryset = queryset.filter(ano_lancamento__lte=self.ano_max)
+        if self.rating_min is not None:
+            queryset = queryset.filter(media_rating__gte=self.rating_min)
+        if self.rating_max is not None:
+            queryset = queryset.filter(media_rating__lte=self.rating_max)
+        return queryset
+
+    # Restrições sobre `ContagemFaceta`, à granularidade da tabela.
+
+    def _q_decadas(self):
+        q = Q()
+        if self.ano_min is not None or self.ano_max is not None:
+            # Filmes sem ano (década 0) ficam de fora de qualquer intervalo.
+            q &= Q(decada__gt=0)
+        if self.ano_min is not None:
+            q &= Q(decada__gte=decada(self.ano_min))
+        if self.ano_max is not None:
+            q &= Q(decada__lte=decada(self.ano_max))
+        return q
+
+    def _q_faixas(self):
+        q = Q()
+        if self.rating_min is not None:
+            q &= Q(faixa_rating__gte=faixa(self.rating_min))
+        if self.rating_max is not None:
+            q &= Q(faixa_rating__lte=faixa(self.rating_max))
+        return q
+
+    def _q_genero(self):
+        if self.genero:
+            return Q(genero__slug=self.genero)
+        return Q(genero__isnull=True)
+
+
+def contar_facetas(filtro: FiltroCatalogo) -> dict:
+    """
+    Devolve as contagens de cada valor de faceta. Cada faceta é contada com os
+    outros filtros aplicados mas não com o seu próprio, para que o cliente possa
+    mostrar quantos filmes teria ao mudar esse filtro.
+    """
+    linhas = ContagemFaceta.objects.order_by()
+
+    generos = (
+        linhas.filter(filtro._q_decadas(), filtro._q_faixas(), genero__isnull=False)
+        .values("genero__slug", "genero__nome")
+        .annotate(total=Sum("total"))
+        .filter(total__gt=0)
+        .order_by("genero__nome")
+    )
+    decadas = (
+        linhas.filter(filtro._q_genero(), filtro._q_faixas())
+        .values("decada")
+        .annotate(total=Sum("total"))
+        .filter(total__gt=0)
+        .order_by("decada")
+    )
+    faixas = (
+        linhas.filter(filtro._q_genero(), filtro._q_decadas())
+        .values("faixa_rating")
+        .annotate(total=Sum("total"))
+        .filter(total__gt=0)
+        .order_by("faixa_rating")
+    )
+    return {
+        "generos": [
+            {"slug": g["genero__slug"], "nome": g["genero__nome"], "total": g["total"]} for g in generos
+        ],
+        "decadas": [{"decada": d["decada"], "total": d["total"]} for d in decadas],
+        "ratings": [{"faixa": f["faixa_rating"], "total": f["total"]} for f in faixas],
+    }
@@ -0,0 +1,491 @@
+# -*- coding: utf-8 -*-
+"""
+Acesso às páginas do IMDb para o comando `fetch_imdb_top250`.
+
+`ClienteIMDb` faz os pedidos com uma única `requests.Session`, cujo adaptador
+mantém até `concorrencia` ligações abertas por host e é partilhado pelas
+threads de `obter_varios`. Cada pedido:
+
+- espera pela sua vez num limitador de taxa (`LimiteTaxa`, um token bucket
+  partilhado por todas as threads), para nunca ultrapassar `taxa` pedidos
+  por segundo, qualquer que seja o paralelismo;
+- tem um timeout próprio (ligação e leitura);
+- é repetido, com espera exponencial, em erros de rede e respostas 429/5xx
+  (respeitando o `Retry-After`, quando o servidor o envia).
+
+O paralelismo é limitado pelo tamanho do pool de threads. A leitura do HTML
+(`ler_top250`, `ler_detalhe`) é independente do acesso à rede; ver os
+leitores disponíveis mais abaixo e o comando `benchmark_parser_imdb`.
+
+Com uma `CacheHTTP`, as respostas ficam guardadas em disco: uma cópia ainda
+fresca (mais nova do que `ttl` segundos) é servida sem nenhum pedido; uma
+mais antiga é revalidada com `If-None-Match`/`If-Modified-Since` e um `304`
+reaproveita o corpo guardado. Em modo `offline` (o `--replay` do comando),
+as páginas vêm só do disco e uma página em falta é um erro, sem rede.
+"""
+from __future__ import annotations
+
+import hashlib
+import html as html_lib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+IMDB_URL = "https://www.imdb.com"
+CAMINHO_TOP_250 = "/chart/top/"
+
+CABECALHOS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+CONCORRENCIA_PADRAO = 8
+TAXA_PADRAO = 5.0
+TIMEOUT_PADRAO = 10.0
+TENTATIVAS_PADRAO = 3
+BACKOFF_PADRAO = 0.5
+# Maior pausa antes de uma nova tentativa. Um `Retry-After` acima disto faz
+# desistir do pedido (devolve-se a resposta 429/503) em vez de prender a thread.
+ESPERA_MAXIMA_PADRAO = 60.0
+# Uma página guardada há menos tempo do que isto é usada sem perguntar ao servidor.
+TTL_CACHE_PADRAO = 6 * 3600.0
+
+# Respostas que valem uma nova tentativa.
+CODIGOS_REPETIR = {429, 500, 502, 503, 504}
+
+
+def get_high_res_poster_url(image_url: str) -> str:
+    if not image_url:
+        return ""
+    return re.sub(r'\._V1_.*\.jpg', '._V1_.jpg', image_url)
+
+
+class LimiteTaxa:
+    """
+    Token bucket: acumula `taxa` fichas por segundo, até `capacidade`; cada
+    pedido gasta uma ficha e espera quando não há nenhuma. Seguro entre threads.
+    Com `taxa <= 0` não limita nada.
+    """
+
+    def __init__(self, taxa: float, capacidade: float = 1.0,
+                 relogio: Callable[[], float] = time.monotonic, dormir: Callable[[float], None] = time.sleep):
+        self.taxa = taxa
+        self.capacidade = max(capacidade, 1.0)
+        self._relogio = relogio
+        self._dormir = dormir
+        self._fichas = self.capacidade
+        self._ultimo = relogio()
+        self._lock = threading.Lock()
+
+    def adquirir(self) -> None:
+        if self.taxa <= 0:
+            return
+        while True:
+            with self._lock:
+                agora = self._relogio()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                # Tolerância para os arredondamentos da soma de frações de ficha.
+                if self._fichas >= 1 - 1e-9:
+                    self._fichas = max(self._fichas - 1, 0.0)
+                    return
+                espera = (1 - self._fichas) / self.taxa
+            self._dormir(espera)
+
+
+class CacheHTTP:
+    """
+    Cache de respostas HTTP em disco, endereçada pelo conteúdo.
+
+    - `corpos/ab/abcdef...`: cada corpo distinto, uma única vez, com o nome
+      igual ao seu SHA-256 (páginas iguais em URLs diferentes partilham o ficheiro);
+    - `indice/<sha1 do URL>.json`: para cada URL, o hash do corpo, os
+      validadores (`ETag`, `Last-Modified`) e quando foi descarregado ou revalidado.
+
+    As escritas são atómicas (ficheiro temporário + `os.replace`), por isso
+    várias threads ou execuções podem partilhar o diretório.
+    """
+
+    def __init__(self, diretorio, ttl: float = 0.0):
+        self.diretorio = Path(diretorio)
+        self.ttl = ttl
+
+    def _indice(self, url: str) -> Path:
+        return self.diretorio / "indice" / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.json"
+
+    def _corpo(self, resumo: str) -> Path:
+        return self.diretorio / "corpos" / resumo[:2] / resumo
+
+    @staticmethod
+    def _escrever(caminho: Path, dados: bytes) -> None:
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=caminho.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(descritor, "wb") as ficheiro:
+                ficheiro.write(dados)
+            os.replace(temporario, caminho)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+
+    def ler(self, url: str) -> dict | None:
+        try:
+            entrada = json.loads(self._indice(url).read_text("utf-8"))
+        except (OSError, ValueError):
+            return None
+        return entrada if self._corpo(entrada["corpo"]).exists() else None
+
+    def fresca(self, entrada: dict) -> bool:
+        return time.time() - entrada["guardado_em"] < self.ttl
+
+    @staticmethod
+    def validadores(entrada: dict | None) -> dict:
+        cabecalhos = {}
+        if entrada and entrada.get("etag"):
+            cabecalhos["If-None-Match"] = entrada["etag"]
+        if entrada and entrada.get("last_modified"):
+            cabecalhos["If-Modified-Since"] = entrada["last_modified"]
+        return cabecalhos
+
+    def guardar(self, url: str, response: requests.Response) -> None:
+        conteudo = response.content
+        resumo = hashlib.sha256(conteudo).hexdigest()
+        corpo = self._corpo(resumo)
+        if not corpo.exists():
+            self._escrever(corpo, conteudo)
+        self._gravar_entrada(url, {
+            "url": url,
+            "corpo": resumo,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_type": response.headers.get("Content-Type", "text/html; charset=utf-8"),
+            "encoding": response.encoding or "utf-8",
+        })
+
+    def renovar(self, url: str, entrada: dict) -> None:
+        """Regista que a cópia guardada foi confirmada pelo servidor (`304`)."""
+        self._gravar_entrada(url, entrada)
+
+    def _gravar_entrada(self, url: str, entrada: dict) -> None:
+        entrada = {**entrada, "guardado_em": time.time()}
+        self._escrever(self._indice(url), json.dumps(entrada).encode("utf-8"))
+
+    def resposta(self, entrada: dict) -> requests.Response:
+        """Reconstrói uma resposta `200` a partir da cópia guardada."""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entrada["url"]
+        response._content = self._corpo(entrada["corpo"]).read_bytes()
+        response.encoding = entrada.get("encoding") or "utf-8"
+        response.headers["Content-Type"] = entrada.get("content_type", "")
+        response.headers["X-Cache"] = "HIT"
+        return response
+
+
+class ClienteIMDb:
+    """Cliente HTTP para o IMDb, com pool de ligações, limite de taxa, timeouts e novas tentativas."""
+
+    def __init__(
+        self,
+        base_url: str = IMDB_URL,
+        concorrencia: int = CONCORRENCIA_PADRAO,
+        taxa: float = TAXA_PADRAO,
+        timeout: float = TIMEOUT_PADRAO,
+        tentativas: int = TENTATIVAS_PADRAO,
+        backoff: float = BACKOFF_PADRAO,
+        espera_maxima: float = ESPERA_MAXIMA_PADRAO,
+        cache: CacheHTTP | None = None,
+        offline: bool = False,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache
+        self.offline = offline
+        self.concorrencia = max(concorrencia, 1)
+        self.timeout = timeout
+        self.tentativas = max(tentativas, 1)
+        self.backoff = backoff
+        self.espera_maxima = max(espera_maxima, 0.0)
+        self.limite = LimiteTaxa(taxa)
+        self.session = requests.Session()
+        self.session.headers.update(CABECALHOS)
+        # As novas tentativas são feitas aqui (passando pelo limitador), não pelo urllib3.
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=self.concorrencia, max_retries=0)
+        self.session.mount("http://", adaptador)
+        self.session.mount("https://", adaptador)
+
+    def url(self, caminho: str) -> str:
+        return f"{self.base_url}{caminho}"
+
+    def _espera(self, tentativa: int, response: requests.Response | None = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return float(retry_after)
+        # Espera exponencial com jitter, para as threads não repetirem em sincronia.
+        return min(self.backoff * (2 ** tentativa) * (0.5 + random.random() / 2), self.espera_maxima)
+
+    def obter(self, url: str) -> requests.Response:
+        """
+        GET com limite de taxa, timeout e novas tentativas. Devolve a última
+        resposta (mesmo que seja um erro HTTP) ou propaga o último erro de rede.
+        Passa primeiro pela cache em disco, se houver.
+        """
+        entrada = self.cache.ler(url) if self.cache is not None else None
+        if entrada is not None and (self.offline or self.cache.fresca(entrada)):
+            return self.cache.resposta(entrada)
+        if self.offline:
+            raise requests.ConnectionError(f"Sem cópia guardada de {url} (modo offline).")
+
+        response = self._pedir(url, CacheHTTP.validadores(entrada))
+        if response.status_code == 304 and entrada is not None:
+            self.cache.renovar(url, entrada)
+            return self.cache.resposta(entrada)
+        if response.status_code == 200 and self.cache is not None:
+            self.cache.guardar(url, response)
+        return response
+
+    def _pedir(self, url: str, cabecalhos: dict) -> requests.Response:
+        for tentativa in range(self.tentativas):
+            ultima = tentativa == self.tentativas - 1
+            self.limite.adquirir()
+            try:
+                response = self.session.get(url, timeout=self.timeout, headers=cabecalhos)
+            except (requests.ConnectionError, requests.Timeout):
+                if ultima:
+                    raise
+                time.sleep(self._espera(tentativa))
+                continue
+            if response.status_code in CODIGOS_REPETIR and not ultima:
+                espera = self._espera(tentativa, response)
+                if espera > self.espera_maxima:
+                    return response
+                response.close()
+                time.sleep(espera)
+                continue
+            return response
+        raise AssertionError("inalcançável")
+
+    def obter_varios(self, itens: Iterable, tarefa: Callable) -> Iterator[tuple]:
+        """
+        Corre `tarefa(self, item)` para cada item em até `concorrencia` threads.
+        Produz `(item, resultado, erro)` pela ordem em que terminam.
+        """
+        with ThreadPoolExecutor(max_workers=self.concorrencia, thread_name_prefix="imdb") as executor:
+            futuros = {executor.submit(tarefa, self, item): item for item in itens}
+            for futuro in as_completed(futuros):
+                erro = futuro.exception()
+                yield futuros[futuro], (None if erro else futuro.result()), erro
+
+    def fechar(self) -> None:
+        self.session.close()
+
+
+# --- Leitura das páginas ---
+#
+# Dois leitores para cada página:
+#
+# - "json": os dados estruturados que o IMDb embute no HTML (o JSON de
+#   `__NEXT_DATA__` e o JSON-LD de schema.org), extraídos com uma expressão
+#   regular e `json.loads`, sem construir a árvore do documento;
+# - "bs4": os seletores CSS sobre a árvore do BeautifulSoup, sempre com o
+#   `html.parser` da biblioteca padrão (o resultado e os tempos medidos por
+#   `benchmark_parser_imdb` não dependem do que estiver instalado).
+#
+# "auto" usa o primeiro e recorre ao segundo quando a página não traz os
+# dados estruturados (ou o seu formato muda).
+
+LEITORES = ("auto", "json", "bs4")
+
+_SCRIPT_NEXT_DATA = re.compile(r'<script[^>]*\bid="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+_SCRIPT_JSON_LD = re.compile(r'<script[^>]*\btype="application/ld\+json"[^>]*>(.*?)</script>', re.S)
+_POSICAO_NO_TITULO = re.compile(r"^\d+\.\s+")
+_MARCA_BACKDROP = 'data-testid="hero-media__backdrop"'
+_IMG_SRC = re.compile(r'<img\b[^>]*?\bsrc="([^"]+)"')
+# O `<img>` da imagem de fundo vem logo a seguir à marca do seu contentor.
+_JANELA_BACKDROP = 2000
+
+_CONSTRUTOR_BS4 = "html.parser"
+
+
+def _sopa(html: str) -> BeautifulSoup:
+    return BeautifulSoup(html, _CONSTRUTOR_BS4)
+
+
+def _next_data(html: str) -> dict:
+    encontrado = _SCRIPT_NEXT_DATA.search(html)
+    if encontrado is None:
+        return {}
+    try:
+        dados = json.loads(encontrado.group(1))
+    except ValueError:
+        return {}
+    return dados if isinstance(dados, dict) else {}
+
+
+def _json_ld(html: str, tipo: str) -> dict:
+    for encontrado in _SCRIPT_JSON_LD.finditer(html):
+        try:
+            dados = json.loads(encontrado.group(1))
+        except ValueError:
+            continue
+        for objeto in dados if isinstance(dados, list) else [dados]:
+            if isinstance(objeto, dict) and objeto.get("@type") == tipo:
+                return objeto
+    return {}
+
+
+def _caminho(dados, *chaves):
+    """`dados[k1][k2]...`, ou `None` se algum nível faltar."""
+    for chave in chaves:
+        if isinstance(dados, dict):
+            dados = dados.get(chave)
+        elif isinstance(dados, list) and isinstance(chave, int) and -len(dados) <= chave < len(dados):
+            dados = dados[chave]
+        else:
+            return None
+    return dados
+
+
+def _texto(valor) -> str:
+    # O JSON-LD do IMDb traz entidades HTML (`&apos;`, `&amp;`) dentro das strings.
+    return html_lib.unescape(valor).strip() if isinstance(valor, str) else ""
+
+
+def ler_top250_json(html: str) -> list[dict]:
+    """Lê a lista do Top 250 a partir de `__NEXT_DATA__`; lista vazia se não estiver lá."""
+    arestas = _caminho(_next_data(html), "props", "pageProps", "pageData", "chartTitles", "edges") or []
+    filmes = []
+    for aresta in arestas:
+        no = _caminho(aresta, "node") or {}
+        try:
+            imdb_id = no["id"]
+            filmes.append({
+                "imdb_id": imdb_id,
+                "titulo": _texto(_caminho(no, "titleText", "text")),
+                "ano_lancamento": int(_caminho(no, "releaseYear", "year")),
+                "media_rating": float(_caminho(no, "ratingsSummary", "aggregateRating")),
+                "caminho": f"/title/{imdb_id}/",
+            })
+        except (KeyError, TypeError, ValueError):
+            continue
+    return filmes
+
+
+def ler_top250_bs4(html: str) -> list[dict]:
+    """Lê a lista do Top 250 com os seletores CSS da página."""
+    soup = _sopa(html)
+    filmes = []
+    for movie_item in soup.select("li.ipc-metadata-list-summary-item"):
+        try:
+            title_link_elem = movie_item.select_one("a.ipc-title-link-wrapper")
+            title = title_link_elem.select_one("h3.ipc-title__text").text.strip()
+            href = title_link_elem["href"]
+            year_elem = movie_item.select_one("div.cli-title-metadata span.cli-title-metadata-item")
+            rating_elem = movie_item.select_one("span.ipc-rating-star--imdb span.ipc-rating-star--rating")
+            imdb_id = href.split("/")[2]
+            filmes.append({
+                "imdb_id": imdb_id,
+                # O título da lista vem numerado ("1. The Shawshank Redemption").
+                "titulo": _POSICAO_NO_TITULO.sub("", title),
+                "ano_lancamento": int(year_elem.text.strip()),
+                "media_rating": float(rating_elem.text.strip().replace(",", ".")),
+                # Sem o `?ref_=...`, que muda entre visitas (e estragaria a cache).
+                "caminho": f"/title/{imdb_id}/",
+            })
+        except (AttributeError, KeyError, IndexError, TypeError, ValueError):
+            continue
+    return filmes
+
+
+def _backdrop_html(html: str) -> str:
+    """O `src` da imagem de fundo (`hero-media__backdrop`), sem construir a árvore."""
+    inicio = html.find(_MARCA_BACKDROP)
+    if inicio < 0:
+        return ""
+    encontrado = _IMG_SRC.search(html, inicio, inicio + _JANELA_BACKDROP)
+    return html_lib.unescape(encontrado.group(1)) if encontrado else ""
+
+
+def ler_detalhe_json(html: str) -> dict:
+    """
+    Lê a sinopse, o poster e a imagem de fundo dos dados estruturados da
+    página de detalhes (a imagem de fundo, se lá não estiver, do `<img>` do
+    seu contentor). Devolve só os campos encontrados (vazio, se não houver
+    dados estruturados).
+    """
+    acima = _caminho(_next_data(html), "props", "pageProps", "aboveTheFoldData") or {}
+    filme = _json_ld(html, "Movie")
+    detalhe = {}
+    descricao = _texto(_caminho(acima, "plot", "plotText", "plainText")) or _texto(filme.get("description"))
+    if descricao:
+        detalhe["descricao"] = descricao
+    poster = _caminho(acima, "primaryImage", "url") or filme.get("image")
+    if isinstance(poster, str) and poster:
+        detalhe["poster"] = get_high_res_poster_url(poster)
+    if detalhe:
+        # A imagem de fundo é a miniatura do vídeo principal.
+        backdrop = _caminho(acima, "primaryVideos", "edges", 0, "node", "thumbnail", "url") or _backdrop_html(html)
+        if isinstance(backdrop, str) and backdrop:
+            detalhe["backdrop"] = get_high_res_poster_url(backdrop)
+    return detalhe
+
+
+def ler_detalhe_bs4(html: str) -> dict:
+    """Lê a sinopse, o poster e a imagem de fundo com os seletores CSS da página."""
+    detail_soup = _sopa(html)
+    detalhe = {"descricao": "", "poster": "", "backdrop": ""}
+
+    description_elem = detail_soup.select_one('span[data-testid="plot-xl"]')
+    if description_elem:
+        detalhe["descricao"] = description_elem.text.strip()
+
+    poster_elem = detail_soup.select_one('div[data-testid="hero-media__poster"] img')
+    if poster_elem and poster_elem.get("src"):
+        detalhe["poster"] = get_high_res_poster_url(poster_elem["src"])
+
+    backdrop_elem = detail_soup.select_one('div[data-testid="hero-media__backdrop"] img')
+    if backdrop_elem and backdrop_elem.get("src"):
+        detalhe["backdrop"] = get_high_res_poster_url(backdrop_elem["src"])
+    return detalhe
+
+
+def ler_top250(html: str, leitor: str = "auto") -> list[dict]:
+    """
+    Lê a lista do Top 250. Cada filme é um dicionário com `imdb_id`, `titulo`,
+    `ano_lancamento`, `media_rating` e `caminho` (da página de detalhes).
+    Itens que não se conseguem ler são ignorados.
+    """
+    if leitor == "bs4":
+        return ler_top250_bs4(html)
+    filmes = ler_top250_json(html)
+    if filmes or leitor == "json":
+        return filmes
+    return ler_top250_bs4(html)
+
+
+def ler_detalhe(html: str, leitor: str = "auto") -> dict:
+    """Lê a sinopse, o poster e a imagem de fundo da página de detalhes de um filme."""
+    if leitor == "bs4":
+        return ler_detalhe_bs4(html)
+    detalhe = ler_detalhe_json(html)
+    if detalhe or leitor == "json":
+        return detalhe
+    return ler_detalhe_bs4(html)
+
+
+def obter_detalhe(cliente: ClienteIMDb, filme: dict, leitor: str = "auto") -> dict:
+    """Tarefa de `obter_varios`: descarrega e lê a página de detalhes de um filme do Top 250."""
+    response = cliente.obter(cliente.url(filme["caminho"]))
+    response.raise_for_status()
+    return ler_detalhe(response.text, leitor)
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+Carga do catálogo a partir dos ficheiros de dados do IMDb
+(https://datasets.imdbws.com/): `title.basics.tsv.gz` e `title.ratings.tsv.gz`.
+
+Os ficheiros têm milhões de linhas, por isso nada é carregado para memória:
+
+- cada ficheiro é lido linha a linha, descomprimido em streaming
+  (`gzip.open`), e cada linha partida por tabs (os ficheiros não usam aspas;
+  `\\N` é o valor nulo);
+- os dois ficheiros vêm ordenados por `tconst`, por isso as avaliações são
+  juntadas aos títulos num merge-join: os dois iteradores avançam juntos e
+  nunca há mais do que uma linha de cada um em memória;
+- os filmes são gravados em lotes por `importacao.Importador` (upsert por
+  `imdb_id`, só com os campos que mudaram, e sem tocar na `media_rating`
+  dos filmes que já têm reviews); os géneros são criados à medida que
+  aparecem e as ligações filme–género inseridas em massa.
+
+Depois de cada lote (filmes e géneros numa transação) fica gravado um
+checkpoint com o último `tconst`: uma carga interrompida recomeça no lote
+seguinte. Como as ligações aos géneros não passam pelos sinais, as facetas e
+o índice de sugestões são reconstruídos uma vez, no fim.
+
+Os créditos (`title.principals.tsv.gz`, com os nomes de `name.basics.tsv.gz`)
+são carregados depois dos filmes, por `carregar_creditos`. Os ids do IMDb
+são resolvidos em memória, em dicionários `número → pk` lidos uma vez, e
+nunca com uma query por linha:
+
+1. uma passagem pelos créditos junta os `nconst` das pessoas ainda sem
+   `Pessoa` que entram em filmes do catálogo;
+2. uma passagem por `name.basics` cria essas pessoas em lotes. Uma pessoa
+   criada à mão (sem `imdb_id`) com o slug do nome é reaproveitada, em vez
+   de duplicada, se o nome for único no ficheiro; com homónimos, fica por
+   associar (e é contada em `pessoas_homonimas`);
+3. uma segunda passagem pelos créditos grava as linhas de `Elenco` em lotes,
+   com `bulk_create(ignore_conflicts=True)` contra a restrição única
+   `(filme, pessoa, papel)`: repetir uma carga não duplica nada.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterable, Iterator
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from . import costars, ratings
+from .importacao import Importador
+from .autocomplete import indice as indice_autocomplete
+from .cache import invalidar_catalogo
+from .models.elenco import Elenco
+from .models.filme import Filme
+from .models.pessoa import Pessoa
+from .models.taxonomia import Genero
+
+NULO = "\\N"
+TIPOS_PADRAO = ("movie",)
+LOTE_PADRAO = 5000
+CHUNK_LEITURA = 20000
+
+FilmeGenero = Filme.generos.through
+
+
+class ErroDataset(ValueError):
+    """Ficheiro com colunas em falta ou fora da ordem por `tconst`."""
+
+
+@dataclass
+class ResultadoCarga:
+    lidos: int = 0
+    criados: int = 0
+    atualizados: int = 0
+    inalterados: int = 0
+    ultimo: str | None = None
+
+
+def _abrir(caminho: str):
+    if caminho.endswith(".gz"):
+        return gzip.open(caminho, "rt", encoding="utf-8", newline="")
+    return open(caminho, encoding="utf-8", newline="")
+
+
+def ler_tsv(caminho: str, colunas: Iterable[str]) -> Iterator[list[str | None]]:
+    """Produz, por linha, os valores das `colunas` pedidas (`None` nos nulos)."""
+    with _abrir(caminho) as ficheiro:
+        cabecalho = ficheiro.readline().rstrip("\r\n").split("\t")
+        try:
+            posicoes = [cabecalho.index(coluna) for coluna in colunas]
+        except ValueError as e:
+            raise ErroDataset(f"{caminho}: coluna em falta ({e}).") from None
+        for linha in ficheiro:
+            campos = linha.rstrip("\r\n").split("\t")
+            yield [None if campos[p] == NULO else campos[p] for p in posicoes]
+
+
+def numero(tconst: str) -> int:
+    # A ordem dos ficheiros é numérica: "tt9999999" vem antes de "tt10000000".
+    return int(tconst[2:])
+
+
+def _ordenado(linhas: Iterator[list], caminho: str) -> Iterator[tuple[int, list]]:
+    anterior = -1
+    for linha in linhas:
+        atual = numero(linha[0])
+        if atual <= anterior:
+            raise ErroDataset(f"{caminho}: as linhas não estão ordenadas por tconst ({linha[0]}).")
+        anterior = atual
+        yield atual, linha
+
+
+def _avaliacoes(caminho: str | None) -> Iterator[tuple[int, list]]:
+    if caminho is None:
+        return iter(())
+    return _ordenado(ler_tsv(caminho, ("tconst", "averageRating")), caminho)
+
+
+def registos(
+    basics: str,
+    avaliacoes: str | None = None,
+    tipos: Iterable[str] = TIPOS_PADRAO,
+    depois_de: str | None = None,
+) -> Iterator[dict]:
+    """
+    Produz um registo por título de um dos `tipos`, com a avaliação do IMDb
+    quando existe (sem ela, a avaliação guardada fica como está; num filme
+    com reviews, `Importador` nunca a escreve) e a lista de géneros. Com
+    `depois_de`, salta os títulos até esse `tconst`, inclusive.
+    """
+    tipos = frozenset(tipos)
+    limite = numero(depois_de) if depois_de else -1
+    colunas = ("tconst", "titleType", "primaryTitle", "startYear", "genres")
+    pendentes = _avaliacoes(avaliacoes)
+    avaliacao = next(pendentes, None)
+    for n, (tconst, tipo, titulo, ano, generos) in _ordenado(ler_tsv(basics, colunas), basics):
+        if tipo not in tipos or n <= limite:
+            continue
+        while avaliacao is not None and avaliacao[0] < n:
+            avaliacao = next(pendentes, None)
+        registo = {
+            "imdb_id": tconst,
+            "titulo": (titulo or tconst)[:250],
+            "ano_lancamento": int(ano) if ano else None,
+            "generos": generos.split(",") if generos else [],
+        }
+        if avaliacao is not None and avaliacao[0] == n and avaliacao[1][1] is not None:
+            registo["media_rating"] = float(avaliacao[1][1])
+        yield registo
+
+
+class _Generos:
+    """Mapa nome → pk dos géneros, criando os que faltam."""
+
+    def __init__(self):
+        self._ids = dict(Genero.objects.values_list("nome", "pk"))
+
+    def ids(self, nomes: Iterable[str]) -> dict[str, int]:
+        novos = {nome for nome in nomes if nome not in self._ids}
+        if novos:
+            Genero.objects.bulk_create(
+                [Genero(nome=nome, slug=slugify(nome)) for nome in sorted(novos)],
+                ignore_conflicts=True,
+            )
+            self._ids.update(Genero.objects.filter(nome__in=novos).values_list("nome", "pk"))
+            # Um nome novo cujo slug já é de outro género fica ligado a esse género.
+            por_slug = {slugify(nome): nome for nome in novos if nome not in self._ids}
+            for slug, pk in Genero.objects.filter(slug__in=por_slug).values_list("slug", "pk"):
+                self._ids[por_slug[slug]] = pk
+        return self._ids
+
+
+class Checkpoint:
+    """Progresso de uma carga num ficheiro JSON, escrito atomicamente."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+
+    def ler(self) -> dict | None:
+        try:
+            with open(self.caminho, encoding="utf-8") as ficheiro:
+                return json.load(ficheiro)
+        except FileNotFoundError:
+            return None
+
+    def guardar(self, dados: dict) -> None:
+        temporario = f"{self.caminho}.tmp"
+        with open(temporario, "w", encoding="utf-8") as ficheiro:
+            json.dump(dados, ficheiro)
+        os.replace(temporario, self.caminho)
+
+    def apagar(self) -> None:
+        try:
+            os.remove(self.caminho)
+        except FileNotFoundError:
+            pass
+
+
+def _gravar_lote(importador: Importador, generos: _Generos, lote: list[dict]) -> None:
+    with transaction.atomic():
+        ids = importador.gravar(lote)
+        mapa = generos.ids({nome for registo in lote for nome in registo["generos"]})
+        FilmeGenero.objects.bulk_create(
+            [
+                FilmeGenero(filme_id=ids[registo["imdb_id"]], genero_id=mapa[nome])
+                for registo in lote
+                for nome in set(registo["generos"])
+                if nome in mapa
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def carregar(
+    basics: str,
+    avaliacoes: str | None = None,
+    tipos: Iterable[str] = TIPOS_PADRAO,
+    lote: int = LOTE_PADRAO,
+    checkpoint: Checkpoint | None = None,
+    ao_gravar_lote: Callable[[ResultadoCarga], None] | None = None,
+) -> ResultadoCarga:
+    """
+    Carrega os títulos de `basics` (e as avaliações de `avaliacoes`) em lotes
+    de `lote` filmes. Com um `checkpoint` que já tenha progresso deste
+    ficheiro, continua a partir daí; no fim, o checkpoint é apagado.
+
+    `ao_gravar_lote(resultado)` é chamado depois de cada lote gravado.
+    """
+    resultado = ResultadoCarga()
+    guardado = checkpoint.ler() if checkpoint is not None else None
+    if guardado is not None:
+        if guardado.get("basics") != os.path.abspath(basics):
+            raise ErroDataset(f"O checkpoint {checkpoint.caminho} é de outro ficheiro ({guardado.get('basics')}).")
+        resultado = ResultadoCarga(**guardado["resultado"])
+
+    importador = Importador()
+    generos = _Generos()
+    titulos = registos(basics, avaliacoes, tipos, depois_de=resultado.ultimo)
+
+    def gravar(pendentes):
+        contagens = importador.resultado
+        antes = (contagens.criados, contagens.atualizados, contagens.inalterados)
+        _gravar_lote(importador, generos, pendentes)
+        resultado.lidos += len(pendentes)
+        resultado.criados += contagens.criados - antes[0]
+        resultado.atualizados += contagens.atualizados - antes[1]
+        resultado.inalterados += contagens.inalterados - antes[2]
+        resultado.ultimo = pendentes[-1]["imdb_id"]
+        if checkpoint is not None:
+            checkpoint.guardar({"basics": os.path.abspath(basics), "resultado": asdict(resultado)})
+        if ao_gravar_lote is not None:
+            ao_gravar_lote(resultado)
+
+    pendentes = []
+    for registo in titulos:
+        pendentes.append(registo)
+        if len(pendentes) >= lote:
+            gravar(pendentes)
+            pendentes = []
+    if pendentes:
+        gravar(pendentes)
+
+    # Também cobre os lotes gravados antes de uma interrupção.
+    ratings.propagar_todos()
+    if checkpoint is not None:
+        checkpoint.apagar()
+    return resultado
+
+
+# --- Créditos ---
+
+@dataclass
+class ResultadoCreditos:
+    creditos: int = 0  # linhas de `Elenco` novas
+    pessoas_criadas: int = 0
+    pessoas_associadas: int = 0
+    pessoas_homonimas: int = 0  # criadas à mão, por associar: o nome não é único no IMDb
+    sem_pessoa: int = 0
+
+
+def papel(categoria: str | None) -> str:
+    # "actor" → "Actor", "production_designer" → "Production designer".
+    return (categoria or "").replace("_", " ").capitalize()
+
+
+def _ids_imdb(queryset) -> dict[int, int]:
+    linhas = queryset.exclude(imdb_id=None).order_by().values_list("imdb_id", "pk").iterator(CHUNK_LEITURA)
+    return {numero(imdb_id): pk for imdb_id, pk in linhas}
+
+
+def _creditos(principals: str, filmes: dict[int, int]) -> Iterator[tuple[int, int, str, int]]:
+    """Produz `(filme_pk, nconst, papel, ordem)` dos créditos de filmes do catálogo."""
+    colunas = ("tconst", "ordering", "nconst", "category")
+    for tconst, ordem, nconst, categoria in ler_tsv(principals, colunas):
+        filme = filmes.get(numero(tconst))
+        if filme is not None:
+            yield filme, numero(nconst), papel(categoria), max(int(ordem or 1) - 1, 0)
+
+
+class _Pessoas:
+    """Mapa `nconst` (número) → pk das pessoas, criando as que faltam."""
+
+    def __init__(self):
+        self.ids = _ids_imdb(Pessoa.objects.all())
+        # Pessoas criadas à mão, que podem ficar com o `imdb_id` de quem tem o mesmo slug.
+        self._sem_imdb = dict(Pessoa.objects.filter(imdb_id=None).values_list("slug", "pk"))
+
+    def criar(self, names: str, necessarias: set[int], lote: int, resultado: ResultadoCreditos) -> None:
+        novas, associadas = [], []
+        # Linhas com o slug de uma pessoa criada à mão: só se sabe se o nome é
+        # único no ficheiro depois de o ler todo.
+        homonimos: dict[str, list[tuple[str, str, bool]]] = {}
+        antes = Pessoa.objects.count()
+
+        def gravar():
+            if novas:
+                Pessoa.objects.bulk_create(novas, ignore_conflicts=True)
+                criadas = Pessoa.objects.filter(imdb_id__in=[p.imdb_id for p in novas]).values_list("imdb_id", "pk")
+                self.ids.update((numero(imdb_id), pk) for imdb_id, pk in criadas)
+            if associadas:
+                Pessoa.objects.bulk_update(associadas, ["imdb_id"])
+                resultado.pessoas_associadas += len(associadas)
+            novas.clear()
+            associadas.clear()
+
+        def nova(nconst, nome, slug):
+            novas.append(Pessoa(nome=nome, slug=f"{slug[:230]}-{nconst}".lstrip("-"), imdb_id=nconst))
+            if len(novas) + len(associadas) >= lote:
+                gravar()
+
+        for nconst, nome in ler_tsv(names, ("nconst", "primaryName")):
+            n = numero(nconst)
+            necessaria = n in necessarias and n not in self.ids
+            if not necessaria and not self._sem_imdb:
+                continue
+            nome = (nome or nconst)[:250]
+            slug = slugify(nome)
+            if slug in self._sem_imdb:
+                homonimos.setdefault(slug, []).append((nconst, nome, necessaria))
+            elif necessaria:
+                nova(nconst, nome, slug)
+
+        for slug, linhas in homonimos.items():
+            if len(linhas) > 1:
+                # Várias pessoas do IMDb com o nome de uma criada à mão: não se
+                # adivinha qual é; a criada à mão fica por associar.
+                resultado.pessoas_homonimas += 1
+            for nconst, nome, necessaria in linhas:
+                if not necessaria:
+                    continue
+                if len(linhas) == 1:
+                    pk = self._sem_imdb.pop(slug)
+                    associadas.append(Pessoa(pk=pk, imdb_id=nconst))
+                    self.ids[numero(nconst)] = pk
+                else:
+                    nova(nconst, nome, slug)
+        gravar()
+        # Com `ignore_conflicts` (um slug já usado), nem todas as pessoas novas entram.
+        resultado.pessoas_criadas += Pessoa.objects.count() - antes
+
+
+def carregar_creditos(principals: str, names: str, lote: int = LOTE_PADRAO) -> ResultadoCreditos:
+    """
+    Carrega os créditos de `principals` dos filmes que já estão no catálogo,
+    criando as pessoas com os nomes de `names`. Créditos de pessoas que não
+    estão em `names` ficam de fora (contados em `sem_pessoa`).
+    """
+    resultado = ResultadoCreditos()
+    antes = Elenco.objects.count()
+    filmes = _ids_imdb(Filme.objects.all())
+    pessoas = _Pessoas()
+
+    necessarias = {n for _, n, _, _ in _creditos(principals, filmes) if n not in pessoas.ids}
+    if necessarias:
+        with transaction.atomic():
+            pessoas.criar(names, necessarias, lote, resultado)
+    del necessarias
+
+    pendentes = []
+    for filme, n, nome_papel, ordem in _creditos(principals, filmes):
+        pessoa = pessoas.ids.get(n)
+        if pessoa is None:
+            resultado.sem_pessoa += 1
+            continue
+        pendentes.append(Elenco(filme_id=filme, pessoa_id=pessoa, papel=nome_papel, ordem_credito=ordem))
+        if len(pendentes) >= lote:
+            Elenco.objects.bulk_create(pendentes, ignore_conflicts=True)
+            pendentes = []
+    Elenco.objects.bulk_create(pendentes, ignore_conflicts=True)
+    # Com `ignore_conflicts` não se sabe quantas linhas de cada lote entraram.
+    resultado.creditos = Elenco.objects.count() - antes
+
+    # Nada disto passou pelos sinais: nem as pessoas (índice de sugestões) nem os créditos (grafo).
+    if resultado.creditos:
+        costars.invalidar()
+    if resultado.pessoas_criadas or resultado.pessoas_associadas:
+        indice_autocomplete.invalidar()
+    invalidar_catalogo()
+    return resultado
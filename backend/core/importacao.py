@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Escrita em massa de filmes importados de fontes externas (IMDb), por `imdb_id`.
+
+Em vez de um `get_or_create` e de um `save()` completo por filme, os
+registos são tratados em lotes:
+
+1. uma query lê os filmes do lote que já existem (só as colunas importadas);
+2. cada registo é comparado com a linha atual: os novos são inseridos, os que
+   mudaram são atualizados apenas nos campos que mudaram e os restantes não
+   custam nenhuma escrita;
+3. as escritas são `INSERT ... ON CONFLICT (imdb_id) DO UPDATE`
+   (`bulk_create(update_conflicts=True)`), uma por cada conjunto distinto de
+   campos alterados no lote.
+
+Um registo só atualiza os campos que traz: um campo em falta (por exemplo,
+a sinopse de uma página que não foi possível descarregar) mantém o valor
+guardado. A avaliação do IMDb só é escrita em `media_rating` enquanto o filme
+não tiver reviews; a partir daí, `media_rating` é a média das reviews,
+mantida por `ratings.py`.
+
+Como `bulk_create` não emite sinais, o índice de pesquisa, as facetas, o
+índice de sugestões e a cache do catálogo são atualizados no fim, uma vez
+para a importação inteira.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterable
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from . import ratings, search
+from .autocomplete import indice as indice_autocomplete
+from .models.filme import Filme
+
+# Campos que uma importação pode escrever.
+CAMPOS_IMPORTADOS = ("titulo", "ano_lancamento", "media_rating", "descricao", "poster", "backdrop")
+
+LOTE_PADRAO = 1000
+
+
+@dataclass
+class ResultadoImportacao:
+    criados: int = 0
+    atualizados: int = 0
+    inalterados: int = 0
+
+
+def slug_importado(titulo: str, ano, imdb_id: str) -> str:
+    # O `imdb_id` torna o slug único; o título é cortado para caber no campo.
+    return f"{slugify(titulo)[:200]}-{ano}-{imdb_id}".lstrip("-")
+
+
+def _gravar_lote(registos: dict[str, dict], score_novo: float) -> dict[str, tuple[str, tuple]]:
+    """
+    Grava um lote (`{imdb_id: registo}`); devolve, por `imdb_id`, o estado
+    (`"criado"`, `"atualizado"` ou `"inalterado"`) e os campos escritos.
+    """
+    existentes = {
+        linha["imdb_id"]: linha
+        for linha in Filme.objects.filter(imdb_id__in=list(registos))
+        .values("slug", "imdb_id", "reviews_count", *CAMPOS_IMPORTADOS)
+    }
+    grupos: dict[tuple, list[Filme]] = {}
+    estados = {}
+    for imdb_id, registo in registos.items():
+        valores = {campo: registo[campo] for campo in CAMPOS_IMPORTADOS if campo in registo}
+        atual = existentes.get(imdb_id)
+        if atual is None:
+            slug = registo.get("slug") or slug_importado(valores.get("titulo", ""), valores.get("ano_lancamento"), imdb_id)
+            filme = Filme(imdb_id=imdb_id, slug=slug, score=score_novo, **valores)
+            # Um filme criado entretanto por outro processo é atualizado em tudo o que o registo traz.
+            grupos.setdefault(tuple(valores), []).append(filme)
+            estados[imdb_id] = ("criado", tuple(valores))
+            continue
+        if atual.pop("reviews_count"):
+            # Com reviews, `media_rating` é a média delas (ver `ratings.py`).
+            valores.pop("media_rating", None)
+        alterados = tuple(campo for campo, valor in valores.items() if atual[campo] != valor)
+        if not alterados:
+            estados[imdb_id] = ("inalterado", ())
+            continue
+        # O INSERT só chega a acontecer se a linha desaparecer entretanto; leva os valores atuais.
+        grupos.setdefault(alterados, []).append(Filme(**{**atual, **valores}))
+        estados[imdb_id] = ("atualizado", alterados)
+
+    for campos, filmes in grupos.items():
+        Filme.objects.bulk_create(
+            filmes,
+            update_conflicts=True,
+            unique_fields=["imdb_id"],
+            update_fields=[*campos, "updated_at"],
+        )
+    return estados
+
+
+class Importador:
+    """
+    Grava registos de filmes lote a lote (cada lote na sua transação, ou na
+    transação de quem chama) e, em `concluir`, faz uma única vez o trabalho
+    que os sinais fariam filme a filme.
+
+    A memória usada não cresce com o tamanho da importação: dos filmes
+    escritos só se guardam os ids enquanto couberem numa sincronização de
+    facetas filme a filme; a partir daí, as facetas são reconstruídas no fim.
+    """
+
+    def __init__(self, ao_gravar=None):
+        self.resultado = ResultadoImportacao()
+        self._ao_gravar = ao_gravar
+        self._score_novo = ratings.calcular_score(0, 0)
+        self._escritos: set[int] | None = set()
+        self._sugestoes_alteradas = False
+
+    def gravar(self, registos: Iterable[dict]) -> dict[str, int]:
+        """
+        Grava um lote de registos (repetidos ficam com o último). Devolve
+        `{imdb_id: pk}` de todos os filmes do lote, escritos ou não.
+        """
+        pendentes = {registo["imdb_id"]: registo for registo in registos}
+        if not pendentes:
+            return {}
+        with transaction.atomic():
+            estados = _gravar_lote(pendentes, self._score_novo)
+            reindexar = {
+                imdb_id for imdb_id, (estado, campos) in estados.items()
+                if estado == "criado" or {"titulo", "descricao"}.intersection(campos)
+            }
+            ids, filmes_indice = {}, []
+            linhas = Filme.objects.filter(imdb_id__in=list(pendentes)).values_list("imdb_id", "pk", "titulo", "descricao")
+            for imdb_id, pk, titulo, descricao in linhas:
+                ids[imdb_id] = pk
+                if imdb_id in reindexar:
+                    filmes_indice.append(Filme(pk=pk, titulo=titulo, descricao=descricao))
+            search.indexar_filmes(filmes_indice)
+
+        for imdb_id, (estado, campos) in estados.items():
+            if estado == "criado":
+                self.resultado.criados += 1
+            elif estado == "atualizado":
+                self.resultado.atualizados += 1
+            else:
+                self.resultado.inalterados += 1
+            if estado != "inalterado":
+                self._sugestoes_alteradas |= estado == "criado" or "titulo" in campos
+                if self._escritos is not None:
+                    self._escritos.add(ids[imdb_id])
+            if self._ao_gravar is not None:
+                self._ao_gravar(pendentes[imdb_id], estado)
+        if self._escritos is not None and len(self._escritos) > ratings.MAX_SINCRONIZACOES_FACETAS:
+            self._escritos = None
+        return ids
+
+    def concluir(self) -> ResultadoImportacao:
+        """Facetas, índice de sugestões e cache do catálogo, depois do último lote."""
+        if self._escritos is None:
+            ratings.propagar_todos()
+        elif self._escritos:
+            ratings.propagar(self._escritos)
+            if self._sugestoes_alteradas:
+                transaction.on_commit(indice_autocomplete.invalidar)
+        return self.resultado
+
+
+def gravar_filmes(registos: Iterable[dict], lote: int = LOTE_PADRAO, ao_gravar=None) -> ResultadoImportacao:
+    """
+    Cria ou atualiza filmes a partir de registos com `imdb_id` e alguns dos
+    `CAMPOS_IMPORTADOS` (e, opcionalmente, `slug` para os filmes novos),
+    numa única transação.
+
+    `ao_gravar(registo, estado)` é chamado para cada registo gravado, com o
+    estado `"criado"`, `"atualizado"` ou `"inalterado"`.
+    """
+    importador = Importador(ao_gravar)
+    with transaction.atomic():
+        pendentes = []
+        for registo in registos:
+            pendentes.append(registo)
+            if len(pendentes) >= lote:
+                importador.gravar(pendentes)
+                pendentes = []
+        importador.gravar(pendentes)
+        return importador.concluir()
@@ -0,0 +1,17 @@
+# backend/core/management/commands/atualizar_scores.py
+from django.core.management.base import BaseCommand
+
+from backend.core import ratings
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula a média global das avaliações (o prior do score bayesiano) e o score de todos os filmes. '
+        'Para correr periodicamente (por exemplo, uma vez por dia).'
+    )
+
+    def handle(self, *args, **options):
+        media_c = ratings.atualizar_scores()
+        self.stdout.write(self.style.SUCCESS(
+            f'Scores atualizados (média global {media_c:.3f}, {ratings.votos_minimos()} votos mínimos).'
+        ))
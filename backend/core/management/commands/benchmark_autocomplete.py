@@ -0,0 +1,101 @@
+# backend/core/management/commands/benchmark_autocomplete.py
+import threading
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.core.autocomplete import IndiceAutocomplete
+
+# Sílabas para gerar nomes com prefixos e trigramas partilhados, como num catálogo real.
+SILABAS = [
+    'ba', 'ca', 'da', 'fe', 'go', 'la', 'ma', 'ne', 'pa', 'ri', 'sa', 'ta', 'vo', 'xi', 'zu',
+    'bri', 'cla', 'dro', 'fla', 'gra', 'pre', 'tro', 'ster', 'man', 'lin', 'son', 'dor',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a latência das sugestões do autocomplete num índice sintético (sem base de dados), '
+        'com o índice estável e durante um recarregamento feito noutro thread.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entradas', type=int, default=200_000,
+                            help='Número de nomes no índice (padrão: 200000).')
+        parser.add_argument('--consultas', type=int, default=5000,
+                            help='Pesquisas em cada cenário (padrão: 5000).')
+        parser.add_argument('--semente', type=int, default=0)
+
+    def _nomes(self, rng, n):
+        palavras = rng.integers(1, 4, size=n)
+        silabas = rng.integers(0, len(SILABAS), size=(n, 3, 3))
+        for i in range(n):
+            yield ' '.join(
+                ''.join(SILABAS[s] for s in silabas[i, p, :rng.integers(1, 4)]).capitalize()
+                for p in range(palavras[i])
+            )
+
+    def _consultas(self, rng, nomes, n):
+        consultas = []
+        for nome in rng.choice(nomes, size=n):
+            palavra = rng.choice(nome.split())
+            texto = palavra[:rng.integers(1, len(palavra) + 1)]
+            # Um quarto das pesquisas com um erro de escrita, para o caminho por trigramas.
+            if len(texto) >= 4 and rng.random() < 0.25:
+                posicao = rng.integers(0, len(texto))
+                texto = texto[:posicao] + texto[posicao + 1:]
+            consultas.append(texto)
+        return consultas
+
+    def _medir(self, indice, consultas):
+        tempos = np.empty(len(consultas))
+        for i, texto in enumerate(consultas):
+            inicio = time.perf_counter()
+            indice.sugerir(texto)
+            tempos[i] = time.perf_counter() - inicio
+        return tempos * 1000
+
+    def _escrever(self, cenario, tempos):
+        self.stdout.write(
+            f'{cenario:<18} mediana {np.median(tempos):.3f} ms, p95 {np.percentile(tempos, 95):.3f} ms, '
+            f'p99 {np.percentile(tempos, 99):.3f} ms, máximo {tempos.max():.3f} ms'
+        )
+
+    def handle(self, *args, **options):
+        n = options['entradas']
+        if n < 1 or options['consultas'] < 1:
+            raise CommandError('--entradas e --consultas têm de ser positivos.')
+        rng = np.random.default_rng(options['semente'])
+        nomes = list(self._nomes(rng, n))
+        filmes = [(i, nome, f'filme-{i}', float(rng.random() * 5)) for i, nome in enumerate(nomes, start=1)]
+        consultas = self._consultas(rng, nomes, options['consultas'])
+
+        indice = IndiceAutocomplete(max_entradas=n, ttl=3600)
+        inicio = time.perf_counter()
+        indice.carregar(filmes=iter(filmes), pessoas=iter(()))
+        self.stdout.write(
+            f'Índice com {indice.estatisticas()["entradas"]} nomes carregado em '
+            f'{(time.perf_counter() - inicio) * 1000:.0f} ms.'
+        )
+        self._escrever('estável', self._medir(indice, consultas))
+
+        # O mesmo, com outro thread a reconstruir o índice sem parar.
+        parar = threading.Event()
+        recarregamentos = 0
+
+        def recarregar():
+            nonlocal recarregamentos
+            while not parar.is_set():
+                indice.carregar(filmes=iter(filmes), pessoas=iter(()))
+                recarregamentos += 1
+
+        thread = threading.Thread(target=recarregar)
+        thread.start()
+        try:
+            tempos = self._medir(indice, consultas)
+        finally:
+            parar.set()
+            thread.join()
+        self._escrever('a recarregar', tempos)
+        self.stdout.write(f'({recarregamentos} recarregamentos durante as pesquisas)')
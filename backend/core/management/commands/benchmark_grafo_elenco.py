@@ -0,0 +1,64 @@
+# backend/core/management/commands/benchmark_grafo_elenco.py
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.core.costars import GrafoElenco
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a construção do grafo de créditos e a pesquisa de graus de separação '
+        'num grafo sintético (sem base de dados).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--creditos', type=int, default=1_000_000,
+                            help='Número de créditos (arestas pessoa–filme) do grafo (padrão: 1000000).')
+        parser.add_argument('--creditos-por-filme', type=int, default=10,
+                            help='Média de créditos por filme (padrão: 10).')
+        parser.add_argument('--pessoas', type=int,
+                            help='Número de pessoas (padrão: um quarto dos créditos).')
+        parser.add_argument('--consultas', type=int, default=200,
+                            help='Pares de pessoas pesquisados (padrão: 200).')
+        parser.add_argument('--semente', type=int, default=0)
+
+    def handle(self, *args, **options):
+        n = options['creditos']
+        if n < 1 or options['creditos_por_filme'] < 1 or options['consultas'] < 1:
+            raise CommandError('--creditos, --creditos-por-filme e --consultas têm de ser positivos.')
+        n_filmes = max(n // options['creditos_por_filme'], 1)
+        n_pessoas = options['pessoas'] or max(n // 4, 1)
+        rng = np.random.default_rng(options['semente'])
+
+        # Poucas pessoas com muitos filmes e muitas com poucos, como num catálogo real.
+        pessoas = (n_pessoas * rng.random(n) ** 2).astype(np.int64) + 1
+        filmes = rng.integers(1, n_filmes + 1, size=n)
+
+        inicio = time.perf_counter()
+        grafo = GrafoElenco(pessoas, filmes)
+        construcao = time.perf_counter() - inicio
+        self.stdout.write(
+            f'Grafo: {len(grafo.pessoa_ids)} pessoas, {len(grafo.filme_ids)} filmes, {grafo.arestas} arestas, '
+            f'{grafo.nbytes / 2**20:.1f} MiB, construído em {construcao * 1000:.0f} ms.'
+        )
+
+        pares = rng.choice(grafo.pessoa_ids, size=(options['consultas'], 2))
+        tempos, graus = [], []
+        for origem, destino in pares:
+            inicio = time.perf_counter()
+            caminho = grafo.caminho(int(origem), int(destino))
+            tempos.append(time.perf_counter() - inicio)
+            if caminho is not None:
+                graus.append(len(caminho) // 2)
+
+        tempos = np.array(tempos) * 1000
+        self.stdout.write(
+            f'{len(pares)} pesquisas: mediana {np.median(tempos):.2f} ms, p95 {np.percentile(tempos, 95):.2f} ms, '
+            f'máximo {tempos.max():.2f} ms.'
+        )
+        if graus:
+            self.stdout.write(
+                f'{len(graus)} ligadas, {np.mean(graus):.2f} graus em média (máximo {max(graus)}).'
+            )
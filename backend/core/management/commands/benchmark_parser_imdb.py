@@ -0,0 +1,78 @@
+# backend/core/management/commands/benchmark_parser_imdb.py
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.core import imdb
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o tempo e a memória de cada leitor de páginas do IMDb (dados estruturados e seletores CSS) '
+        'sobre as páginas guardadas numa cache do fetch_imdb_top250 (--cache-dir) ou numa pasta de ficheiros .html.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('diretorio', help='Diretório da cache HTTP ou pasta com páginas .html.')
+        parser.add_argument('--repeticoes', type=int, default=5, help='Leituras de cada página por leitor (padrão: 5).')
+        parser.add_argument('--leitores', nargs='+', choices=[l for l in imdb.LEITORES if l != 'auto'],
+                            default=['json', 'bs4'], help='Leitores a comparar (padrão: json bs4).')
+
+    def _paginas(self, diretorio):
+        """Produz `(tipo, html)`, com o tipo `top250` ou `detalhe`, conforme o URL ou o conteúdo."""
+        indice = diretorio / 'indice'
+        if indice.is_dir():
+            cache = imdb.CacheHTTP(diretorio)
+            for caminho in sorted(indice.glob('*.json')):
+                url = json.loads(caminho.read_text('utf-8'))['url']
+                entrada = cache.ler(url)
+                if entrada is not None:
+                    yield ('top250' if '/chart/' in url else 'detalhe'), cache.resposta(entrada).text
+            return
+        for caminho in sorted(diretorio.glob('**/*.html')):
+            html = caminho.read_text('utf-8', errors='replace')
+            yield ('top250' if 'chartTitles' in html or 'cli-title-metadata' in html else 'detalhe'), html
+
+    def handle(self, *args, **options):
+        diretorio = Path(options['diretorio'])
+        if not diretorio.is_dir():
+            raise CommandError(f'O diretório "{diretorio}" não existe.')
+        paginas = list(self._paginas(diretorio))
+        if not paginas:
+            raise CommandError('Nenhuma página encontrada.')
+        repeticoes = max(options['repeticoes'], 1)
+        funcoes = {
+            'top250': {'json': imdb.ler_top250_json, 'bs4': imdb.ler_top250_bs4},
+            'detalhe': {'json': imdb.ler_detalhe_json, 'bs4': imdb.ler_detalhe_bs4},
+        }
+
+        self.stdout.write(f'{len(paginas)} páginas, {repeticoes} leituras cada.')
+        self.stdout.write(f'{"tipo":<8} {"leitor":<6} {"páginas":>7} {"ms/pág (mediana)":>17} {"ms/pág (máx.)":>14} {"pico KiB (médio)":>17} {"lidas":>6}')
+        for tipo in ('top250', 'detalhe'):
+            htmls = [html for t, html in paginas if t == tipo]
+            if not htmls:
+                continue
+            for leitor in options['leitores']:
+                funcao = funcoes[tipo][leitor]
+                tempos, picos, lidas = [], [], 0
+                for html in htmls:
+                    amostras = []
+                    for _ in range(repeticoes):
+                        inicio = time.perf_counter()
+                        resultado = funcao(html)
+                        amostras.append(time.perf_counter() - inicio)
+                    tempos.append(statistics.median(amostras))
+                    lidas += bool(resultado)
+                    # A memória é medida à parte: o tracemalloc abranda a leitura.
+                    tracemalloc.start()
+                    funcao(html)
+                    picos.append(tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+                self.stdout.write(
+                    f'{tipo:<8} {leitor:<6} {len(htmls):>7} {statistics.median(tempos) * 1000:>17.2f} '
+                    f'{max(tempos) * 1000:>14.2f} {statistics.mean(picos) / 1024:>17.1f} {lidas:>6}'
+                )
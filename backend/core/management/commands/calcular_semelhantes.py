@@ -0,0 +1,26 @@
+# backend/core/management/commands/calcular_semelhantes.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.core import similarity
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula os filmes semelhantes (semelhança de cosseno entre as interações dos utilizadores: '
+        'favoritos, watchlist e reviews) e substitui a tabela de vizinhos. Para correr periodicamente.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=similarity.K_PADRAO,
+                            help=f'Vizinhos guardados por filme (padrão: {similarity.K_PADRAO}).')
+        parser.add_argument('--bloco', type=int, default=similarity.BLOCO_PADRAO,
+                            help=f'Filmes por bloco do produto de matrizes; limita a memória usada (padrão: {similarity.BLOCO_PADRAO}).')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        escritas = similarity.calcular(k=max(options['k'], 1), bloco=max(options['bloco'], 1))
+        self.stdout.write(self.style.SUCCESS(
+            f'{escritas} pares de filmes semelhantes guardados em {time.monotonic() - inicio:.1f}s.'
+        ))
@@ -1,106 +1,116 @@
 # backend/core/management/commands/fetch_imdb_top250.py
+import os
+from functools import partial
+
 import requests
-import time
-import re
-from bs4 import BeautifulSoup
-from django.core.management.base import BaseCommand
-from django.utils.text import slugify
-from backend.core.models.filme import Filme
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from backend.core import imdb, importacao
 
-def get_high_res_poster_url(image_url: str) -> str:
-    if not image_url:
-        return ""
-    return re.sub(r'\._V1_.*\.jpg', '._V1_.jpg', image_url)
+# Mantido aqui por compatibilidade com quem o importava deste módulo.
+get_high_res_poster_url = imdb.get_high_res_poster_url
 
 class Command(BaseCommand):
     help = 'Procura os 250 filmes melhores classificados do IMDb, incluindo sinopse e poster de alta qualidade.'
 
-    IMDB_URL = 'https://www.imdb.com'
-    TOP_250_URL = f'{IMDB_URL}/chart/top/'
+    IMDB_URL = imdb.IMDB_URL
+    TOP_250_URL = f'{IMDB_URL}{imdb.CAMINHO_TOP_250}'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=imdb.CONCORRENCIA_PADRAO,
+                            help=f'Páginas de detalhes descarregadas em paralelo (padrão: {imdb.CONCORRENCIA_PADRAO}).')
+        parser.add_argument('--rate', type=float, default=imdb.TAXA_PADRAO,
+                            help=f'Máximo de pedidos por segundo, somando todas as threads; 0 desliga o limite (padrão: {imdb.TAXA_PADRAO}).')
+        parser.add_argument('--timeout', type=float, default=imdb.TIMEOUT_PADRAO,
+                            help=f'Timeout de cada pedido, em segundos (padrão: {imdb.TIMEOUT_PADRAO}).')
+        parser.add_argument('--retries', type=int, default=imdb.TENTATIVAS_PADRAO,
+                            help=f'Tentativas por pedido em erros de rede e respostas 429/5xx (padrão: {imdb.TENTATIVAS_PADRAO}).')
+        parser.add_argument('--max-wait', type=float, default=imdb.ESPERA_MAXIMA_PADRAO,
+                            help=f'Maior pausa entre tentativas, em segundos; um Retry-After maior faz desistir do pedido (padrão: {imdb.ESPERA_MAXIMA_PADRAO:g}).')
+        parser.add_argument('--batch-size', type=int, default=importacao.LOTE_PADRAO,
+                            help=f'Filmes por lote de escrita (padrão: {importacao.LOTE_PADRAO}).')
+        parser.add_argument('--base-url', default=self.IMDB_URL,
+                            help='URL base do IMDb (por exemplo, um servidor local nos testes).')
+        parser.add_argument('--cache-dir', default=getattr(settings, 'IMDB_CACHE_DIR', None),
+                            help='Diretório da cache HTTP em disco (por omissão, IMDB_CACHE_DIR; sem ele, não há cache).')
+        parser.add_argument('--cache-ttl', type=float, default=imdb.TTL_CACHE_PADRAO,
+                            help=f'Segundos durante os quais uma página guardada é usada sem revalidar (padrão: {imdb.TTL_CACHE_PADRAO:g}).')
+        parser.add_argument('--parser', choices=imdb.LEITORES, default='auto',
+                            help='Como ler as páginas: dados estruturados (json), seletores CSS (bs4) ou o primeiro com o segundo como alternativa (auto, o padrão).')
+        parser.add_argument('--replay', metavar='DIR',
+                            help='Lê as páginas guardadas neste diretório de cache, sem aceder à rede.')
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Iniciando o scraper para o Top 250 do IMDb...'))
-        
-        session = requests.Session()
-        session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept-Language': 'en-US,en;q=0.9',
-        })
 
+        if options['replay']:
+            if not os.path.isdir(options['replay']):
+                raise CommandError(f'O diretório "{options["replay"]}" não existe.')
+            cache, offline = imdb.CacheHTTP(options['replay']), True
+        elif options['cache_dir']:
+            cache, offline = imdb.CacheHTTP(options['cache_dir'], ttl=options['cache_ttl']), False
+        else:
+            cache, offline = None, False
+
+        cliente = imdb.ClienteIMDb(
+            base_url=options['base_url'],
+            concorrencia=options['concurrency'],
+            taxa=0 if offline else options['rate'],
+            timeout=options['timeout'],
+            tentativas=options['retries'],
+            espera_maxima=options['max_wait'],
+            cache=cache,
+            offline=offline,
+        )
+        try:
+            self._importar(cliente, options)
+        finally:
+            cliente.fechar()
+
+    def _importar(self, cliente, options):
         try:
-            response = session.get(self.TOP_250_URL)
+            response = cliente.obter(cliente.url(imdb.CAMINHO_TOP_250))
             response.raise_for_status()
         except requests.RequestException as e:
             self.stderr.write(self.style.ERROR(f'Erro ao aceder à lista do IMDb: {e}'))
             return
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        movie_items = soup.select('li.ipc-metadata-list-summary-item')
-
-        if not movie_items:
+        filmes = imdb.ler_top250(response.text, options['parser'])
+        if not filmes:
             self.stderr.write(self.style.ERROR('Não foi possível encontrar a lista de filmes. O layout do IMDb pode ter mudado.'))
             return
 
-        created_count = 0
-        updated_count = 0
-
-        for movie_item in movie_items:
-            try:
-                title_link_elem = movie_item.select_one('a.ipc-title-link-wrapper')
-                title_h3 = title_link_elem.select_one('h3.ipc-title__text')
-                title = title_h3.text.strip()
-                
-                href = title_link_elem['href']
-                imdb_id = href.split('/')[2]
-                detail_url = f"{self.IMDB_URL}{href}"
-
-                year_elem = movie_item.select_one('div.cli-title-metadata span.cli-title-metadata-item')
-                year = int(year_elem.text.strip())
-
-                rating_elem = movie_item.select_one('span.ipc-rating-star--imdb span.ipc-rating-star--rating')
-                rating = float(rating_elem.text.strip().replace(',', '.'))
-
-                description, poster_url, backdrop_url = "", "", ""
-                try:
-                    self.stdout.write(f'  - Visitando página de detalhes para "{title}"...')
-                    time.sleep(0.2)
-                    detail_response = session.get(detail_url)
-                    if detail_response.status_code == 200:
-                        detail_soup = BeautifulSoup(detail_response.text, 'html.parser')
-                        
-                        description_elem = detail_soup.select_one('span[data-testid="plot-xl"]')
-                        if description_elem: description = description_elem.text.strip()
-                        
-                        # NOVO SELETOR: Procura pela imagem principal na secção "hero"
-                        poster_elem = detail_soup.select_one('div[data-testid="hero-media__poster"] img')
-                        if poster_elem:
-                            poster_url = get_high_res_poster_url(poster_elem['src'])
-
-                        backdrop_elem = detail_soup.select_one('div[data-testid="hero-media__backdrop"] img')
-                        if backdrop_elem:
-                            backdrop_url = get_high_res_poster_url(backdrop_elem['src'])
-
-                except requests.RequestException as e:
-                    self.stderr.write(self.style.WARNING(f'    [!] Falha ao buscar detalhes para "{title}": {e}'))
-
-                filme, created = Filme.objects.get_or_create(
-                    imdb_id=imdb_id,
-                    defaults={'titulo': title, 'ano_lancamento': year, 'slug': slugify(f"{title}-{year}-{imdb_id}")}
-                )
-                
-                filme.media_rating = rating
-                filme.poster = poster_url
-                filme.backdrop = backdrop_url
-                filme.descricao = description
-                filme.save()
-
-                if created: created_count += 1
-                else: updated_count += 1
-                
-                self.stdout.write(self.style.SUCCESS(f'  {"[+]" if created else "[~]"} Processado: {filme.titulo} ({filme.ano_lancamento})'))
-
-            except Exception as e:
-                self.stderr.write(self.style.ERROR(f'  [!] Erro fatal ao processar um item: {e}'))
+        self.stdout.write(f'  - A visitar {len(filmes)} páginas de detalhes ({cliente.concorrencia} em paralelo)...')
+        detalhes = {}
+        for filme, detalhe, erro in cliente.obter_varios(filmes, partial(imdb.obter_detalhe, leitor=options['parser'])):
+            if erro is not None:
+                self.stderr.write(self.style.WARNING(f'    [!] Falha ao buscar detalhes para "{filme["titulo"]}": {erro}'))
                 continue
-
-        self.stdout.write(self.style.SUCCESS(f'\nScraping concluído! {created_count} novos filmes adicionados, {updated_count} filmes atualizados.'))
\ No newline at end of file
+            detalhes[filme['imdb_id']] = detalhe
+
+        # Sem página de detalhes, os campos que dela vêm ficam como estão.
+        registos = [
+            {
+                'imdb_id': dados['imdb_id'],
+                'titulo': dados['titulo'],
+                'ano_lancamento': dados['ano_lancamento'],
+                'media_rating': dados['media_rating'],
+                **detalhes.get(dados['imdb_id'], {}),
+            }
+            for dados in filmes
+        ]
+        marcas = {'criado': '[+]', 'atualizado': '[~]', 'inalterado': '[=]'}
+
+        def ao_gravar(registo, estado):
+            self.stdout.write(self.style.SUCCESS(
+                f'  {marcas[estado]} Processado: {registo["titulo"]} ({registo["ano_lancamento"]})'
+            ))
+
+        # As escritas ficam nesta thread, pela ordem do Top 250, em lotes.
+        resultado = importacao.gravar_filmes(registos, lote=options['batch_size'], ao_gravar=ao_gravar)
+        created_count, updated_count = resultado.criados, resultado.atualizados
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\nScraping concluído! {created_count} novos filmes adicionados, {updated_count} filmes atualizados, '
+            f'{resultado.inalterados} sem alterações.'
+        ))
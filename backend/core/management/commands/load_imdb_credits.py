@@ -0,0 +1,43 @@
+# backend/core/management/commands/load_imdb_credits.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.core import imdb_datasets
+
+
+class Command(BaseCommand):
+    help = (
+        'Carrega o elenco e a equipa dos filmes do catálogo a partir dos ficheiros de dados do IMDb '
+        '(title.principals.tsv.gz e name.basics.tsv.gz), criando as pessoas em falta. '
+        'Correr depois de load_imdb_datasets; repetir a carga não duplica créditos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('principals', help='Caminho do title.principals.tsv.gz (ou .tsv).')
+        parser.add_argument('names', help='Caminho do name.basics.tsv.gz (ou .tsv).')
+        parser.add_argument('--batch-size', type=int, default=imdb_datasets.LOTE_PADRAO,
+                            help=f'Linhas por lote de escrita (padrão: {imdb_datasets.LOTE_PADRAO}).')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size tem de ser pelo menos 1.')
+        inicio = time.monotonic()
+        try:
+            resultado = imdb_datasets.carregar_creditos(options['principals'], options['names'], lote=options['batch_size'])
+        except (OSError, imdb_datasets.ErroDataset) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Créditos carregados em {time.monotonic() - inicio:.1f}s: {resultado.creditos} créditos novos, '
+            f'{resultado.pessoas_criadas} pessoas criadas, {resultado.pessoas_associadas} associadas ao IMDb.'
+        ))
+        if resultado.pessoas_homonimas:
+            self.stdout.write(self.style.WARNING(
+                f'  {resultado.pessoas_homonimas} pessoas criadas à mão ficaram por associar ao IMDb: '
+                f'há várias pessoas com o mesmo nome no ficheiro de nomes.'
+            ))
+        if resultado.sem_pessoa:
+            self.stdout.write(self.style.WARNING(
+                f'  {resultado.sem_pessoa} créditos ignorados por a pessoa não estar no ficheiro de nomes.'
+            ))
@@ -0,0 +1,61 @@
+# backend/core/management/commands/load_imdb_datasets.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.core import imdb_datasets
+
+
+class Command(BaseCommand):
+    help = (
+        'Carrega filmes dos ficheiros de dados do IMDb (title.basics.tsv.gz e, opcionalmente, '
+        'title.ratings.tsv.gz), lidos em streaming e gravados em lotes. Uma carga interrompida '
+        'continua a partir do último lote gravado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('basics', help='Caminho do title.basics.tsv.gz (ou .tsv).')
+        parser.add_argument('--ratings', help='Caminho do title.ratings.tsv.gz; sem ele, as avaliações guardadas ficam como estão.')
+        parser.add_argument('--types', default=','.join(imdb_datasets.TIPOS_PADRAO),
+                            help='Valores de titleType a carregar, separados por vírgulas (padrão: movie).')
+        parser.add_argument('--batch-size', type=int, default=imdb_datasets.LOTE_PADRAO,
+                            help=f'Filmes por lote de escrita (padrão: {imdb_datasets.LOTE_PADRAO}).')
+        parser.add_argument('--checkpoint',
+                            help='Ficheiro do checkpoint (padrão: o caminho do basics com o sufixo .checkpoint.json).')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignora um checkpoint existente e começa do início.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size tem de ser pelo menos 1.')
+        tipos = [tipo.strip() for tipo in options['types'].split(',') if tipo.strip()]
+        checkpoint = imdb_datasets.Checkpoint(options['checkpoint'] or f"{options['basics']}.checkpoint.json")
+        if options['restart']:
+            checkpoint.apagar()
+        elif checkpoint.ler() is not None:
+            self.stdout.write(f'  - A continuar a carga a partir de {checkpoint.caminho}.')
+
+        inicio = time.monotonic()
+
+        def ao_gravar_lote(resultado):
+            self.stdout.write(
+                f'  - {resultado.lidos} filmes gravados (último: {resultado.ultimo}, '
+                f'{time.monotonic() - inicio:.0f}s)'
+            )
+
+        try:
+            resultado = imdb_datasets.carregar(
+                options['basics'],
+                options['ratings'],
+                tipos=tipos,
+                lote=options['batch_size'],
+                checkpoint=checkpoint,
+                ao_gravar_lote=ao_gravar_lote,
+            )
+        except (OSError, imdb_datasets.ErroDataset) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Carga concluída em {time.monotonic() - inicio:.1f}s: {resultado.criados} novos filmes, '
+            f'{resultado.atualizados} atualizados, {resultado.inalterados} sem alterações.'
+        ))
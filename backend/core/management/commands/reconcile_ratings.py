@@ -0,0 +1,38 @@
+# backend/core/management/commands/reconcile_ratings.py
+from django.core.management.base import BaseCommand
+
+from backend.core import ratings
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara rating_sum, reviews_count, o histograma e media_rating de cada filme com as suas reviews '
+        'e corrige os desvios em bloco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas lista os filmes com desvios, sem os corrigir.',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recalcula os agregados de todos os filmes com uma única agregação das reviews.',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            ratings.recalcular(None)
+            self.stdout.write(self.style.SUCCESS('Agregados de todos os filmes recalculados.'))
+            return
+        ids = ratings.reconciliar(corrigir=not options['dry_run'])
+        if not ids:
+            self.stdout.write(self.style.SUCCESS('Nenhum desvio encontrado.'))
+            return
+        amostra = ', '.join(str(pk) for pk in ids[:20])
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(ids)} filmes com desvios: {amostra}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(ids)} filmes corrigidos: {amostra}'))
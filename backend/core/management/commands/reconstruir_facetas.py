@@ -0,0 +1,15 @@
+# backend/core/management/commands/reconstruir_facetas.py
+from django.core.management.base import BaseCommand
+
+from backend.core import facets
+from backend.core.models.faceta import ContagemFaceta
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a tabela de contagens de facetas (género × década × faixa de avaliação) do catálogo.'
+
+    def handle(self, *args, **options):
+        facets.reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f'Facetas reconstruídas: {ContagemFaceta.objects.count()} combinações.'
+        ))
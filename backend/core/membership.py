@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Estado das listas pessoais (watchlist e favoritos) para vários filmes de uma vez.
+
+As páginas com carrosséis precisam de marcar dezenas de filmes; em vez de um
+pedido (e duas queries) por filme, `estado_listas` responde para todos.
+
+Os ids dos filmes de cada lista de cada utilizador ficam na cache do Django
+como um `array('I')` ordenado (4 bytes por filme), pesquisado com `bisect`.
+A cache (Redis, ver `CACHES` nas settings) é lida em bloco (`get_many`,
+uma só ida à cache) e só vai à base de dados quando uma lista ainda não está
+carregada; a partir daí, verificar o estado de qualquer número de filmes não
+custa nenhuma query.
+
+Cada escrita descarta a lista alterada da cache, depois do commit (pelos
+sinais de `Watchlist` e `Favorito`, ver `signals.py`), e a próxima leitura
+volta a carregá-la da base de dados. Alterar a cópia em cache (ler, mudar e
+voltar a gravar) perderia uma de duas escritas concorrentes do mesmo
+utilizador. A cache tem de ser partilhada pelos processos (ver `checks.py`);
+`LISTAS_CACHE_TTL` limita o tempo que uma entrada desatualizada (por uma
+corrida entre um carregamento e uma escrita) pode durar.
+
+`adicionar` e `remover` alteram as listas com uma única instrução SQL
+(`INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING` e
+`DELETE ... RETURNING`), seguras contra pedidos concorrentes e idempotentes:
+devolvem só os filmes que mudaram de facto. Como não passam pelos sinais,
+descartam elas próprias a cache.
+"""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models.filme import Filme
+from .models.listas import Watchlist, Favorito
+
+ESTADO_VAZIO = {"in_watchlist": False, "is_favorite": False}
+
+# Limite de filmes por pedido de estado em lote.
+MAX_FILMES_POR_PEDIDO = 100
+
+# Maior id de filme aceite num pedido: cabe no `array('I')` da cache e numa
+# coluna `integer`; ids acima disto só podiam dar erro na base de dados.
+MAX_ID_FILME = 2**31 - 1
+
+WATCHLIST = "watchlist"
+FAVORITOS = "favoritos"
+
+MODELOS = {WATCHLIST: Watchlist, FAVORITOS: Favorito}
+
+
+def _ttl() -> int:
+    return getattr(settings, "LISTAS_CACHE_TTL", 300)
+
+
+def _chave(utilizador_id: int, lista: str) -> str:
+    return f"listas:{utilizador_id}:{lista}"
+
+
+def _carregar(utilizador_id: int, lista: str) -> array:
+    return array(
+        "I",
+        MODELOS[lista].objects.filter(utilizador_id=utilizador_id)
+        .order_by("filme_id")
+        .values_list("filme_id", flat=True),
+    )
+
+
+def ids_das_listas(utilizador_id: int) -> dict[str, array]:
+    """Devolve `{lista: array ordenado de ids}`, carregando as listas em falta."""
+    chaves = {lista: _chave(utilizador_id, lista) for lista in MODELOS}
+    guardados = cache.get_many(chaves.values())
+    listas, em_falta = {}, {}
+    for lista, chave in chaves.items():
+        ids = guardados.get(chave)
+        if ids is None:
+            ids = em_falta[chave] = _carregar(utilizador_id, lista)
+        listas[lista] = ids
+    if em_falta:
+        cache.set_many(em_falta, _ttl())
+    return listas
+
+
+def contem(ids: array, filme_id: int) -> bool:
+    posicao = bisect_left(ids, filme_id)
+    return posicao < len(ids) and ids[posicao] == filme_id
+
+
+def registar_alteracao(utilizador_id: int, lista: str, filme_ids: Iterable[int]) -> None:
+    """Descarta a lista em cache quando a transação atual terminar, se algum filme mudou."""
+    if list(filme_ids):
+        chave = _chave(utilizador_id, lista)
+        transaction.on_commit(lambda: cache.delete(chave))
+
+
+def estado_listas(utilizador, filme_ids: Iterable[int]) -> dict[int, dict]:
+    """Devolve `{filme_id: {"in_watchlist": bool, "is_favorite": bool}}`."""
+    ids = set(filme_ids)
+    if not ids or not utilizador.is_authenticated:
+        return {pk: dict(ESTADO_VAZIO) for pk in ids}
+
+    listas = ids_das_listas(utilizador.pk)
+    return {
+        pk: {
+            "in_watchlist": contem(listas[WATCHLIST], pk),
+            "is_favorite": contem(listas[FAVORITOS], pk),
+        }
+        for pk in ids
+    }
+
+
+def estado_listas_por_slug(utilizador, slugs: Iterable[str]) -> dict[str, dict]:
+    """Como `estado_listas`, mas indexado por slug (resolvidos numa única query)."""
+    slugs = set(slugs)
+    if not slugs or not utilizador.is_authenticated:
+        return {slug: dict(ESTADO_VAZIO) for slug in slugs}
+
+    ids = dict(Filme.objects.filter(slug__in=slugs).values_list("slug", "id"))
+    estado = estado_listas(utilizador, ids.values())
+    return {slug: estado[ids[slug]] if slug in ids else dict(ESTADO_VAZIO) for slug in slugs}
+
+
+# --- Escrita ---
+
+_INSERIR = """
+    INSERT INTO {tabela} ({utilizador}, {filme}, {criado})
+    SELECT %s, f.{pk}, %s FROM {filmes} f WHERE {condicao}
+    ON CONFLICT ({utilizador}, {filme}) DO NOTHING
+    RETURNING {filme}
+"""
+
+_REMOVER = """
+    DELETE FROM {tabela}
+    WHERE {utilizador} = %s AND {filme} IN (SELECT f.{pk} FROM {filmes} f WHERE {condicao})
+    RETURNING {filme}
+"""
+
+
+def _sql(modelo, modelo_sql: str, por_slug: bool, n: int) -> str:
+    q = connection.ops.quote_name
+    pk = q(Filme._meta.pk.column)
+    if por_slug:
+        condicao = f"f.{q(Filme._meta.get_field('slug').column)} = %s"
+    else:
+        condicao = f"f.{pk} IN ({', '.join(['%s'] * n)})"
+    return modelo_sql.format(
+        tabela=q(modelo._meta.db_table),
+        utilizador=q(modelo._meta.get_field("utilizador").column),
+        filme=q(modelo._meta.get_field("filme").column),
+        criado=q(modelo._meta.get_field("created_at").column),
+        filmes=q(Filme._meta.db_table),
+        pk=pk,
+        condicao=condicao,
+    )
+
+
+def _suporta_returning() -> bool:
+    return connection.features.can_return_rows_from_bulk_insert
+
+
+def _alvo(filme_ids, slug) -> tuple[bool, list]:
+    if slug is not None:
+        return True, [slug]
+    return False, sorted({int(pk) for pk in filme_ids})
+
+
+def adicionar(utilizador_id: int, lista: str, filme_ids: Iterable[int] = (), slug: str | None = None) -> list[int]:
+    """
+    Adiciona filmes (por ids ou por um slug) à lista; devolve os ids que
+    entraram agora. Filmes que não existem ou que já estavam na lista são
+    ignorados.
+    """
+    modelo = MODELOS[lista]
+    por_slug, valores = _alvo(filme_ids, slug)
+    if not valores:
+        return []
+    if _suporta_returning():
+        agora = connection.ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(_sql(modelo, _INSERIR, por_slug, len(valores)), [utilizador_id, agora, *valores])
+            adicionados = [linha[0] for linha in cursor.fetchall()]
+    else:
+        # Sem `RETURNING` (SQLite < 3.35): os mesmos resultados, em três queries.
+        filmes = Filme.objects.filter(slug=valores[0]) if por_slug else Filme.objects.filter(pk__in=valores)
+        candidatos = set(filmes.values_list("pk", flat=True))
+        existentes = set(
+            modelo.objects.filter(utilizador_id=utilizador_id, filme_id__in=candidatos).values_list("filme_id", flat=True)
+        )
+        adicionados = sorted(candidatos - existentes)
+        modelo.objects.bulk_create(
+            [modelo(utilizador_id=utilizador_id, filme_id=pk) for pk in adicionados], ignore_conflicts=True,
+        )
+    registar_alteracao(utilizador_id, lista, adicionados)
+    return adicionados
+
+
+def remover(utilizador_id: int, lista: str, filme_ids: Iterable[int] = (), slug: str | None = None) -> list[int]:
+    """Retira filmes (por ids ou por um slug) da lista; devolve os ids que saíram."""
+    modelo = MODELOS[lista]
+    por_slug, valores = _alvo(filme_ids, slug)
+    if not valores:
+        return []
+    if _suporta_returning():
+        with connection.cursor() as cursor:
+            cursor.execute(_sql(modelo, _REMOVER, por_slug, len(valores)), [utilizador_id, *valores])
+            removidos = [linha[0] for linha in cursor.fetchall()]
+    else:
+        linhas = modelo.objects.filter(utilizador_id=utilizador_id)
+        linhas = linhas.filter(filme__slug=valores[0]) if por_slug else linhas.filter(filme_id__in=valores)
+        removidos = list(linhas.values_list("filme_id", flat=True))
+        linhas.filter(filme_id__in=removidos).delete()
+    registar_alteracao(utilizador_id, lista, removidos)
+    return removidos
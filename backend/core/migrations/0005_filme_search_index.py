@@ -0,0 +1,55 @@
+from django.db import migrations
+
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE core_filme ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(descricao, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX idx_filme_search_vector ON core_filme USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS idx_filme_search_vector",
+    "ALTER TABLE core_filme DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_filme_fts USING fts5(
+        titulo, descricao, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    "INSERT INTO core_filme_fts (rowid, titulo, descricao) SELECT id, titulo, descricao FROM core_filme",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS core_filme_fts",
+]
+
+
+def _executar(schema_editor, por_motor):
+    for sql in por_motor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def criar_indice(apps, schema_editor):
+    _executar(schema_editor, {"postgresql": POSTGRES_FORWARD, "sqlite": SQLITE_FORWARD})
+
+
+def remover_indice(apps, schema_editor):
+    _executar(schema_editor, {"postgresql": POSTGRES_BACKWARD, "sqlite": SQLITE_BACKWARD})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_filme_listas_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Value
+from django.db.models.functions import Cast, Coalesce, Floor, Greatest, Least
+
+
+def contar_filmes_existentes(apps, schema_editor):
+    """Preenche as contagens para os filmes que já existiam (ver `facets.reconstruir`)."""
+    Filme = apps.get_model('core', 'Filme')
+    ContagemFaceta = apps.get_model('core', 'ContagemFaceta')
+    FilmeGenero = Filme.generos.through
+
+    Filme.objects.update(
+        faceta_decada=Coalesce(F('ano_lancamento'), Value(0)) / Value(10) * Value(10),
+        faceta_faixa=Least(Greatest(Cast(Floor(F('media_rating')), models.IntegerField()), Value(0)), Value(10)),
+    )
+    totais = Filme.objects.order_by().values('faceta_decada', 'faceta_faixa').annotate(n=Count('id'))
+    por_genero = (
+        FilmeGenero.objects.order_by()
+        .values('genero_id', 'filme__faceta_decada', 'filme__faceta_faixa')
+        .annotate(n=Count('id'))
+    )
+    ContagemFaceta.objects.bulk_create(
+        [ContagemFaceta(genero_id=None, decada=t['faceta_decada'], faixa_rating=t['faceta_faixa'], total=t['n']) for t in totais]
+        + [
+            ContagemFaceta(genero_id=g['genero_id'], decada=g['filme__faceta_decada'], faixa_rating=g['filme__faceta_faixa'], total=g['n'])
+            for g in por_genero
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_filme_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filme',
+            name='faceta_decada',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='filme',
+            name='faceta_faixa',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='ContagemFaceta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('decada', models.PositiveIntegerField(help_text='Primeiro ano da década (ex: 1990), ou 0 para filmes sem ano.', verbose_name='Década')),
+                ('faixa_rating', models.PositiveSmallIntegerField(help_text='Parte inteira de `media_rating` (0 a 10).', verbose_name='Faixa de Avaliação')),
+                ('total', models.IntegerField(default=0, help_text='Número de filmes nesta combinação.', verbose_name='Total')),
+                ('genero', models.ForeignKey(blank=True, help_text='O género contado, ou vazio para o total de todos os géneros.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='contagens_faceta', to='core.genero', verbose_name='Género')),
+            ],
+            options={
+                'verbose_name': 'Contagem de Faceta',
+                'verbose_name_plural': 'Contagens de Facetas',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('genero__isnull', False)), fields=('genero', 'decada', 'faixa_rating'), name='unique_faceta_genero_decada_faixa'), models.UniqueConstraint(condition=models.Q(('genero__isnull', True)), fields=('decada', 'faixa_rating'), name='unique_faceta_total_decada_faixa')],
+            },
+        ),
+        migrations.RunPython(contar_filmes_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_contagem_faceta'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='filme',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última Atualização'),
+        ),
+    ]
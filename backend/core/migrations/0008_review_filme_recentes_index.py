@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_filme_updated_at_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['filme', '-created_at', '-id'], name='idx_review_filme_recentes'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:28
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def somar_reviews_existentes(apps, schema_editor):
+    """Preenche os agregados a partir das reviews que já existiam (a média já estava calculada)."""
+    Filme = apps.get_model('core', 'Filme')
+    Review = apps.get_model('core', 'Review')
+
+    reviews = Review.objects.filter(filme_id=OuterRef('pk')).order_by().values('filme_id')
+    Filme.objects.filter(reviews__isnull=False).distinct().update(
+        rating_sum=Coalesce(Subquery(reviews.annotate(s=Sum('rating')).values('s')), 0, output_field=IntegerField()),
+        reviews_count=Coalesce(Subquery(reviews.annotate(n=Count('id')).values('n')), 0, output_field=IntegerField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_review_filme_recentes_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filme',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='A soma das avaliações de todas as reviews.', verbose_name='Soma das Avaliações'),
+        ),
+        migrations.AddField(
+            model_name='filme',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='O número total de avaliações recebidas.', verbose_name='Total de Avaliações'),
+        ),
+        migrations.RunPython(somar_reviews_existentes, migrations.RunPython.noop),
+    ]
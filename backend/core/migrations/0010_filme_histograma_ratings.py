@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:32
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def contar_estrelas_existentes(apps, schema_editor):
+    """Preenche os histogramas com uma única agregação agrupada das reviews."""
+    Filme = apps.get_model('core', 'Filme')
+    Review = apps.get_model('core', 'Review')
+
+    campos = [f'ratings_{estrela}' for estrela in range(1, 6)]
+    por_filme = (
+        Review.objects.order_by().values('filme_id')
+        .annotate(**{campo: Count('id', filter=Q(rating=estrela)) for estrela, campo in enumerate(campos, start=1)})
+    )
+    filmes = [Filme(pk=linha.pop('filme_id'), **linha) for linha in por_filme.iterator()]
+    Filme.objects.bulk_update(filmes, campos, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_filme_rating_sum_reviews_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filme',
+            name='ratings_1',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Avaliações de 1 Estrela'),
+        ),
+        migrations.AddField(
+            model_name='filme',
+            name='ratings_2',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Avaliações de 2 Estrelas'),
+        ),
+        migrations.AddField(
+            model_name='filme',
+            name='ratings_3',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Avaliações de 3 Estrelas'),
+        ),
+        migrations.AddField(
+            model_name='filme',
+            name='ratings_4',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Avaliações de 4 Estrelas'),
+        ),
+        migrations.AddField(
+            model_name='filme',
+            name='ratings_5',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Avaliações de 5 Estrelas'),
+        ),
+        migrations.RunPython(contar_estrelas_existentes, migrations.RunPython.noop),
+    ]
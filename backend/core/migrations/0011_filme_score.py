@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:34
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, FloatField, Sum, Value
+from django.db.models.functions import Cast
+
+
+def calcular_scores(apps, schema_editor):
+    """Score inicial de cada filme, com a média global atual (ver `ratings.atualizar_scores`)."""
+    Filme = apps.get_model('core', 'Filme')
+    totais = Filme.objects.aggregate(soma=Sum('rating_sum'), total=Sum('reviews_count'))
+    media_c = totais['soma'] / totais['total'] if totais['total'] else 0.0
+    m = max(1, getattr(settings, 'SCORE_VOTOS_MINIMOS', 10))
+    Filme.objects.update(
+        score=(Cast(F('rating_sum'), FloatField()) + Value(media_c * m)) / (F('reviews_count') + Value(m)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_filme_histograma_ratings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filme',
+            name='score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Score'),
+        ),
+        migrations.AddIndex(
+            model_name='filme',
+            index=models.Index(fields=['-score', 'id'], name='idx_filme_score_id'),
+        ),
+        migrations.RunPython(calcular_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_filme_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilmeSemelhante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicao', models.PositiveSmallIntegerField(verbose_name='Posição')),
+                ('similaridade', models.FloatField(verbose_name='Similaridade')),
+                ('filme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='semelhantes', to='core.filme', verbose_name='Filme')),
+                ('semelhante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.filme', verbose_name='Filme Semelhante')),
+            ],
+            options={
+                'verbose_name': 'Filme Semelhante',
+                'verbose_name_plural': 'Filmes Semelhantes',
+                'constraints': [models.UniqueConstraint(fields=('filme', 'posicao'), name='unique_semelhante_filme_posicao')],
+            },
+        ),
+    ]
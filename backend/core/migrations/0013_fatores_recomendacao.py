@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0012_filme_semelhante'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FatoresFilme',
+            fields=[
+                ('filme', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fatores_recomendacao', serialize=False, to='core.filme', verbose_name='Filme')),
+                ('vetor', models.BinaryField(verbose_name='Vetor de Fatores')),
+            ],
+            options={
+                'verbose_name': 'Fatores de Filme',
+                'verbose_name_plural': 'Fatores de Filmes',
+            },
+        ),
+        migrations.CreateModel(
+            name='FatoresUtilizador',
+            fields=[
+                ('utilizador', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fatores_recomendacao', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Utilizador')),
+                ('vetor', models.BinaryField(verbose_name='Vetor de Fatores')),
+            ],
+            options={
+                'verbose_name': 'Fatores de Utilizador',
+                'verbose_name_plural': 'Fatores de Utilizadores',
+            },
+        ),
+    ]
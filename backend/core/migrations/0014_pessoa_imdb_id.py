@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_fatores_recomendacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pessoa',
+            name='imdb_id',
+            field=models.CharField(blank=True, help_text="The person's identifier on IMDb (e.g., nm0000209).", max_length=20, null=True, unique=True, verbose_name='IMDb ID'),
+        ),
+    ]
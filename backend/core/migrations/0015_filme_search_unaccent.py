@@ -0,0 +1,64 @@
+from django.db import migrations
+
+# Configuração de pesquisa igual à 'simple', mas que tira os acentos (extensão
+# `unaccent`) antes de indexar cada palavra: "familia" encontra "família". A
+# forma `to_tsvector(regconfig, text)` é imutável, por isso pode gerar a coluna.
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE TEXT SEARCH CONFIGURATION cinemix_unaccent (COPY = simple)",
+    """
+    ALTER TEXT SEARCH CONFIGURATION cinemix_unaccent
+    ALTER MAPPING FOR asciiword, asciihword, hword_asciipart, word, hword, hword_part
+    WITH unaccent, simple
+    """,
+    "DROP INDEX IF EXISTS idx_filme_search_vector",
+    "ALTER TABLE core_filme DROP COLUMN search_vector",
+    """
+    ALTER TABLE core_filme ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('cinemix_unaccent', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('cinemix_unaccent', coalesce(descricao, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX idx_filme_search_vector ON core_filme USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS idx_filme_search_vector",
+    "ALTER TABLE core_filme DROP COLUMN search_vector",
+    """
+    ALTER TABLE core_filme ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(descricao, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX idx_filme_search_vector ON core_filme USING GIN (search_vector)",
+    "DROP TEXT SEARCH CONFIGURATION IF EXISTS cinemix_unaccent",
+]
+
+
+def _executar(schema_editor, sqls):
+    # Em SQLite, o FTS5 (`remove_diacritics 2`) já ignora os acentos.
+    if schema_editor.connection.vendor == "postgresql":
+        for sql in sqls:
+            schema_editor.execute(sql)
+
+
+def sem_acentos(apps, schema_editor):
+    _executar(schema_editor, POSTGRES_FORWARD)
+
+
+def com_acentos(apps, schema_editor):
+    _executar(schema_editor, POSTGRES_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_pessoa_imdb_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(sem_acentos, com_acentos),
+    ]
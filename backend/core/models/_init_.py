@@ -5,10 +5,13 @@ from .elenco import Elenco
 from .video import Video
 from .review import Review
 from .listas import Watchlist, Favorito
+from .faceta import ContagemFaceta
+from .recomendacao import FilmeSemelhante, FatoresUtilizador, FatoresFilme
 
 __all__ = [
     "Genero", "Etiqueta", "Pais", "Lingua", "Categoria",
     "Pessoa", "Realizador", "Ator",
     "Filme", "Elenco", "Video", "Review",
-    "Watchlist", "Favorito",
+    "Watchlist", "Favorito", "ContagemFaceta", "FilmeSemelhante",
+    "FatoresUtilizador", "FatoresFilme",
 ]
\ No newline at end of file
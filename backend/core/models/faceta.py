@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from django.db import models
+from django.db.models import Q
+
+class ContagemFaceta(models.Model):
+    """
+    Número de filmes por género × década × faixa de avaliação.
+
+    As linhas com `genero` vazio contam todos os filmes (independentemente do
+    género), para que as facetas de década e de avaliação não contem duas vezes
+    os filmes com vários géneros. A tabela é mantida por `backend.core.facets`.
+    """
+    genero = models.ForeignKey(
+        "core.Genero",
+        verbose_name="Género",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="contagens_faceta",
+        help_text="O género contado, ou vazio para o total de todos os géneros."
+    )
+    decada = models.PositiveIntegerField(
+        "Década",
+        help_text="Primeiro ano da década (ex: 1990), ou 0 para filmes sem ano."
+    )
+    faixa_rating = models.PositiveSmallIntegerField(
+        "Faixa de Avaliação",
+        help_text="Parte inteira de `media_rating` (0 a 10)."
+    )
+    total = models.IntegerField(
+        "Total",
+        default=0,
+        help_text="Número de filmes nesta combinação."
+    )
+
+    class Meta:
+        verbose_name = "Contagem de Faceta"
+        verbose_name_plural = "Contagens de Facetas"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["genero", "decada", "faixa_rating"],
+                condition=Q(genero__isnull=False),
+                name="unique_faceta_genero_decada_faixa",
+            ),
+            models.UniqueConstraint(
+                fields=["decada", "faixa_rating"],
+                condition=Q(genero__isnull=True),
+                name="unique_faceta_total_decada_faixa",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.genero or 'Todos'} / {self.decada} / {self.faixa_rating}: {self.total}"
@@ -47,6 +47,30 @@ class Filme(models.Model):
         db_index=True,
         help_text="A média de todas as avaliações dos utilizadores."
     )
+    # Soma e número das avaliações das reviews, mantidos por `backend.core.ratings`
+    # com incrementos atómicos; quando há reviews, `media_rating` é o quociente.
+    rating_sum = models.PositiveIntegerField(
+        "Soma das Avaliações",
+        default=0,
+        editable=False,
+        help_text="A soma das avaliações de todas as reviews."
+    )
+    reviews_count = models.PositiveIntegerField(
+        "Total de Avaliações",
+        default=0,
+        editable=False,
+        help_text="O número total de avaliações recebidas."
+    )
+    # Histograma das avaliações (quantas reviews deram 1, 2, ... 5 estrelas),
+    # mantido pelo mesmo caminho que os campos anteriores.
+    ratings_1 = models.PositiveIntegerField("Avaliações de 1 Estrela", default=0, editable=False)
+    ratings_2 = models.PositiveIntegerField("Avaliações de 2 Estrelas", default=0, editable=False)
+    ratings_3 = models.PositiveIntegerField("Avaliações de 3 Estrelas", default=0, editable=False)
+    ratings_4 = models.PositiveIntegerField("Avaliações de 4 Estrelas", default=0, editable=False)
+    ratings_5 = models.PositiveIntegerField("Avaliações de 5 Estrelas", default=0, editable=False)
+    # Média bayesiana das reviews (ver `backend.core.ratings`): ordena o
+    # ranking sem deixar um filme com poucas avaliações passar à frente.
+    score = models.FloatField("Score", default=0, editable=False)
     poster = models.URLField(
         "Poster",
         blank=True,
@@ -57,21 +81,60 @@ class Filme(models.Model):
         blank=True,
         help_text="URL para a imagem de fundo (backdrop)."
     )
+    # Combinação década/faixa em que o filme está contado em `ContagemFaceta`
+    # (vazio enquanto ainda não foi contado). Mantido por `backend.core.facets`.
+    faceta_decada = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    faceta_faixa = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
     # ... (relações com outras tabelas) ...
     generos = models.ManyToManyField("core.Genero", blank=True, related_name="filmes")
     
     created_at = models.DateTimeField("Data de Criação", auto_now_add=True)
-    updated_at = models.DateTimeField("Última Atualização", auto_now=True)
+    updated_at = models.DateTimeField("Última Atualização", auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = "Filme"
         verbose_name_plural = "Filmes"
         ordering = ["-media_rating", "titulo"]
+        indexes = [
+            # Índice composto que serve a paginação por cursor do catálogo
+            # (ver `backend.core.pagination.FilmeCursorPagination`).
+            models.Index(fields=["-media_rating", "titulo", "id"], name="idx_filme_rating_titulo_id"),
+            # Serve o ranking `/api/filmes/top/` (ver `TopCursorPagination`).
+            models.Index(fields=["-score", "id"], name="idx_filme_score_id"),
+        ]
+
+    # Campos mantidos diretamente na base de dados (com `update()` e expressões
+    # F) por outros módulos; quem grava um filme indica em `update_fields` o
+    # que mudou (o admin e a API fazem-no). Um `save()` completo de uma
+    # instância carregada antes dessas atualizações repunha valores antigos,
+    # por isso falha em vez de os gravar (ver `save`). `media_rating` não está
+    # aqui: sem reviews é a média do IMDb, editável à mão.
+    # Os testes exigem que todo o campo não editável esteja aqui.
+    CAMPOS_HISTOGRAMA = ("ratings_1", "ratings_2", "ratings_3", "ratings_4", "ratings_5")
+    CAMPOS_DERIVADOS = (
+        "faceta_decada", "faceta_faixa", "rating_sum", "reviews_count", "score",
+    ) + CAMPOS_HISTOGRAMA
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(f"{self.titulo}-{self.ano_lancamento}")
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            self._verificar_campos_derivados(kwargs.get("using"))
         super().save(*args, **kwargs)
 
+    def _verificar_campos_derivados(self, using=None) -> None:
+        na_base = (
+            type(self)._base_manager.using(using or self._state.db)
+            .filter(pk=self.pk).values(*self.CAMPOS_DERIVADOS).first()
+        )
+        if na_base is None:
+            return
+        diferentes = sorted(campo for campo, valor in na_base.items() if getattr(self, campo) != valor)
+        if diferentes:
+            raise ValueError(
+                f"save() completo de {self!r} mudaria campos derivados ({', '.join(diferentes)}): "
+                "a instância está desatualizada; use refresh_from_db() ou save(update_fields=...)."
+            )
+
     def __str__(self) -> str:
         return f"{self.titulo} ({self.ano_lancamento})"
@@ -32,6 +32,9 @@ class Watchlist(models.Model):
                 name="unique_watchlist_por_user_filme"
             )
         ]
+        indexes = [
+            models.Index(fields=["utilizador", "-created_at", "-id"], name="idx_watchlist_user_recentes"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.filme} in {self.utilizador}'s watchlist"
@@ -60,6 +63,9 @@ class Favorito(models.Model):
         verbose_name_plural = "Favorites"
         ordering = ["-created_at"]
         unique_together = [["utilizador", "filme"]]
+        indexes = [
+            models.Index(fields=["utilizador", "-created_at", "-id"], name="idx_favorito_user_recentes"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.filme} is a favorite of {self.utilizador}"
@@ -18,6 +18,14 @@ class Pessoa(models.Model):
         unique=True,
         help_text="URL-friendly identifier."
     )
+    imdb_id = models.CharField(
+        "IMDb ID",
+        max_length=20,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="The person's identifier on IMDb (e.g., nm0000209)."
+    )
     bio = models.TextField(
         "Biography",
         blank=True,
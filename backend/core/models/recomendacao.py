@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from django.conf import settings
+from django.db import models
+
+class FilmeSemelhante(models.Model):
+    """
+    Um dos vizinhos mais próximos de um filme, pela semelhança de cosseno entre
+    os utilizadores que interagiram com ambos (favoritos, watchlist e reviews).
+
+    A tabela é reescrita por inteiro pelo comando `calcular_semelhantes`
+    (ver `backend.core.similarity`); cada filme tem no máximo `k` linhas,
+    numeradas por `posicao` a partir de 0 (o mais semelhante).
+    """
+    filme = models.ForeignKey(
+        "core.Filme",
+        verbose_name="Filme",
+        on_delete=models.CASCADE,
+        related_name="semelhantes",
+    )
+    semelhante = models.ForeignKey(
+        "core.Filme",
+        verbose_name="Filme Semelhante",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    posicao = models.PositiveSmallIntegerField("Posição")
+    similaridade = models.FloatField("Similaridade")
+
+    class Meta:
+        verbose_name = "Filme Semelhante"
+        verbose_name_plural = "Filmes Semelhantes"
+        constraints = [
+            # Também é o índice que serve `/api/filmes/{slug}/similar/`.
+            models.UniqueConstraint(fields=["filme", "posicao"], name="unique_semelhante_filme_posicao"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.filme_id} ~ {self.semelhante_id} ({self.similaridade:.3f})"
+
+
+class FatoresUtilizador(models.Model):
+    """
+    Vetor de fatores latentes de um utilizador, aprendido pela fatorização de
+    matrizes de `backend.core.recommendations` (ALS com feedback implícito).
+
+    O vetor é guardado como bytes `float32` (little-endian), com o mesmo
+    número de fatores que os vetores dos filmes do mesmo treino.
+    """
+    utilizador = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        verbose_name="Utilizador",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="fatores_recomendacao",
+    )
+    vetor = models.BinaryField("Vetor de Fatores")
+
+    class Meta:
+        verbose_name = "Fatores de Utilizador"
+        verbose_name_plural = "Fatores de Utilizadores"
+
+    def __str__(self) -> str:
+        return f"Fatores do utilizador {self.utilizador_id}"
+
+
+class FatoresFilme(models.Model):
+    """Vetor de fatores latentes de um filme (ver `FatoresUtilizador`)."""
+    filme = models.OneToOneField(
+        "core.Filme",
+        verbose_name="Filme",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="fatores_recomendacao",
+    )
+    vetor = models.BinaryField("Vetor de Fatores")
+
+    class Meta:
+        verbose_name = "Fatores de Filme"
+        verbose_name_plural = "Fatores de Filmes"
+
+    def __str__(self) -> str:
+        return f"Fatores do filme {self.filme_id}"
@@ -51,6 +51,10 @@ class Review(models.Model):
         ordering = ["-created_at"]
         # Garante que um utilizador só pode fazer uma review por filme
         unique_together = ('filme', 'autor')
+        indexes = [
+            # Feed de reviews de um filme, mais recentes primeiro (paginação por cursor).
+            models.Index(fields=["filme", "-created_at", "-id"], name="idx_review_filme_recentes"),
+        ]
 
     def __str__(self) -> str:
         return f"Review de {self.autor.username} para {self.filme.titulo}"
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+Classes de paginação da API.
+
+`KeysetPagination` implementa paginação por cursor (keyset): em vez de
+`COUNT(*)` + `OFFSET`, cada página é obtida com um filtro lexicográfico sobre
+os valores da última linha da página anterior, pelo que a página N custa o
+mesmo que a página 1 desde que exista um índice composto com a mesma ordem.
+
+`OptionalKeysetPagination` mantém a paginação por número de página como
+comportamento por omissão e só muda para o modo cursor quando o cliente o
+pede com `?paginacao=cursor` (ou quando segue um link `next`/`previous`,
+que já contém o parâmetro `cursor`).
+"""
+from __future__ import annotations
+
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _codificar_valor(valor):
+    if isinstance(valor, datetime):
+        return {"dt": valor.isoformat()}
+    if isinstance(valor, date):
+        return {"d": valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {"dec": str(valor)}
+    return valor
+
+
+def _descodificar_valor(valor):
+    if isinstance(valor, dict):
+        if "dt" in valor:
+            return parse_datetime(valor["dt"])
+        if "d" in valor:
+            return date.fromisoformat(valor["d"])
+        if "dec" in valor:
+            return Decimal(valor["dec"])
+    return valor
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por cursor sobre uma ordenação composta.
+
+    `ordering` deve terminar numa coluna única (normalmente `id`) para que a
+    ordem seja total e o cursor nunca salte nem repita linhas. Os nomes dos
+    campos podem atravessar relações (`filme__titulo`), tal como em `order_by`.
+    """
+    ordering = ("-id",)
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Cursor inválido."
+    # URL a que os links `next`/`previous` se referem (por omissão, o do próprio pedido).
+    url_base = None
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, "keyset_ordering", None) or self.ordering
+
+    def faz_count(self, request):
+        """Indica se a página vai pagar um `COUNT(*)` (nunca, neste modo)."""
+        return False
+
+    def get_page_size(self, request):
+        try:
+            tamanho = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(tamanho, self.max_page_size))
+
+    # --- Cursor ---
+
+    def encode_cursor(self, valores, reverso=False):
+        payload = {"v": [_codificar_valor(v) for v in valores]}
+        if reverso:
+            payload["r"] = 1
+        raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, request, queryset):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            padding = "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            valores = [_descodificar_valor(v) for v in payload["v"]]
+            if len(valores) != len(self._ordering):
+                raise ValueError("número de valores diferente da ordenação")
+            # Um cursor adulterado pode trazer JSON válido do tipo errado; cada
+            # valor é convertido pelo campo da ordenação antes de chegar ao filtro.
+            valores = [
+                self._converter(self._campo(queryset, campo.lstrip("-")), valor)
+                for campo, valor in zip(self._ordering, valores)
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return valores, bool(payload.get("r"))
+
+    @staticmethod
+    def _campo(queryset, nome):
+        """Campo (do modelo ou de uma anotação) a que `nome` se refere."""
+        if nome in queryset.query.annotations:
+            return queryset.query.annotations[nome].output_field
+        modelo, partes = queryset.model, nome.split("__")
+        try:
+            for parte in partes[:-1]:
+                modelo = modelo._meta.get_field(parte).related_model
+            return modelo._meta.get_field(partes[-1])
+        except (AttributeError, FieldDoesNotExist):
+            raise ValueError(f"campo de ordenação desconhecido: {nome}")
+
+    @staticmethod
+    def _converter(campo, valor):
+        if valor is None:
+            if not campo.null:
+                raise ValueError(f"{campo.name} não aceita nulos")
+            return None
+        return campo.to_python(valor)
+
+    # --- Filtro lexicográfico ---
+
+    def _filtro_apos(self, valores, reverso):
+        """
+        Constrói `(a, b, c) > (va, vb, vc)` respeitando a direção de cada campo:
+        `a > va OR (a = va AND b > vb) OR (a = va AND b = vb AND c > vc)`.
+        """
+        filtro = Q()
+        iguais = {}
+        for campo, valor in zip(self._ordering, valores):
+            descendente = campo.startswith("-")
+            nome = campo.lstrip("-")
+            # Num cursor reverso (página anterior) todas as comparações invertem.
+            lookup = "lt" if descendente != reverso else "gt"
+            filtro |= Q(**iguais, **{f"{nome}__{lookup}": valor})
+            iguais[nome] = valor
+        return filtro
+
+    @staticmethod
+    def _inverter(campo):
+        return campo[1:] if campo.startswith("-") else f"-{campo}"
+
+    def _valores_da_linha(self, linha):
+        valores = []
+        for campo in self._ordering:
+            valor = linha
+            for parte in campo.lstrip("-").split("__"):
+                valor = getattr(valor, parte)
+            valores.append(valor)
+        return valores
+
+    # --- API do DRF ---
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self._ordering = tuple(self.get_ordering(request, queryset, view))
+        self.page_size = self.get_page_size(request)
+        valores, reverso = self.decode_cursor(request, queryset)
+
+        ordem = self._ordering
+        if reverso:
+            ordem = tuple(self._inverter(c) for c in ordem)
+        queryset = queryset.order_by(*ordem)
+        if valores is not None:
+            queryset = queryset.filter(self._filtro_apos(valores, reverso))
+
+        # Pede-se uma linha a mais só para saber se existe página seguinte.
+        linhas = list(queryset[: self.page_size + 1])
+        ha_mais = len(linhas) > self.page_size
+        linhas = linhas[: self.page_size]
+        if reverso:
+            linhas.reverse()
+            self.has_next = valores is not None
+            self.has_previous = ha_mais
+        else:
+            self.has_next = ha_mais
+            self.has_previous = valores is not None
+
+        self.page = linhas
+        return linhas
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = self.encode_cursor(self._valores_da_linha(self.page[-1]))
+        return replace_query_param(self.url_base or self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        cursor = self.encode_cursor(self._valores_da_linha(self.page[0]), reverso=True)
+        return replace_query_param(self.url_base or self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Cursor opaco devolvido nos links `next`/`previous`.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Número de resultados por página.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class OptionalKeysetPagination(BasePagination):
+    """
+    Paginação por número de página por omissão, com modo cursor opcional.
+
+    Os clientes existentes continuam a receber `count`/`next`/`previous`/`results`.
+    Quem precisar de percorrer o catálogo em profundidade envia
+    `?paginacao=cursor` e passa a receber páginas de custo constante.
+    """
+    mode_query_param = "paginacao"
+    keyset_class = KeysetPagination
+    page_number_class = PageNumberPagination
+
+    def _escolher(self, request):
+        self._delegado = self.keyset_class() if self._usa_cursor(request) else self.page_number_class()
+        return self._delegado
+
+    def _usa_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    def faz_count(self, request):
+        return not self._usa_cursor(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._escolher(request).paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        return self._delegado.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_class().get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        parametros = self.page_number_class().get_schema_operation_parameters(view)
+        parametros += self.keyset_class().get_schema_operation_parameters(view)
+        parametros.append({
+            "name": self.mode_query_param,
+            "required": False,
+            "in": "query",
+            "description": "Use `cursor` para paginação por cursor (sem COUNT/OFFSET).",
+            "schema": {"type": "string", "enum": ["cursor"]},
+        })
+        return parametros
+
+
+class FilmeCursorPagination(KeysetPagination):
+    """Ordem do catálogo: coincide com `Filme.Meta.ordering` e com `idx_filme_rating_titulo_id`."""
+    ordering = ("-media_rating", "titulo", "id")
+
+
+class ListaCursorPagination(KeysetPagination):
+    """Ordem das listas pessoais (watchlist e favoritos), mais recentes primeiro."""
+    ordering = ("-created_at", "-id")
+
+
+class TopCursorPagination(KeysetPagination):
+    """Ranking por score bayesiano: coincide com `idx_filme_score_id`."""
+    ordering = ("-score", "id")
+
+
+class ReviewCursorPagination(KeysetPagination):
+    """Feed de reviews de um filme: coincide com `idx_review_filme_recentes`."""
+    ordering = ("-created_at", "-id")
+
+
+class FilmografiaCursorPagination(KeysetPagination):
+    """
+    Filmografia de uma pessoa, pelo ano de lançamento (mais recentes primeiro;
+    filmes sem ano no fim). O ano vem do filme, por isso nenhum índice serve
+    esta ordem: os créditos da pessoa são encontrados pelo índice de
+    `Elenco.pessoa` e ordenados a cada página, o que custa pouco com as
+    dezenas (no máximo alguns milhares) de créditos de uma pessoa.
+    """
+    ordering = ("-ano_filme", "-filme_id", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Um ano em falta conta como 0: o filtro do cursor não compara com NULL.
+        queryset = queryset.annotate(ano_filme=Coalesce("filme__ano_lancamento", 0))
+        return super().paginate_queryset(queryset, request, view=view)
+
+
+class CatalogoPagination(OptionalKeysetPagination):
+    keyset_class = FilmeCursorPagination
+
+
+class ListaPagination(OptionalKeysetPagination):
+    keyset_class = ListaCursorPagination
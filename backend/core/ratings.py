@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""
+Agregados das avaliações de cada filme: `rating_sum`, `reviews_count`, o
+histograma de estrelas (`ratings_1` a `ratings_5`) e a `media_rating` derivada
+deles.
+
+Cada escrita numa `Review` aplica ao filme apenas a diferença que provocou
+(criar: +rating e +1; editar: nova - antiga; apagar: -rating e -1, mais o
+contador da estrela correspondente) numa única instrução `UPDATE` com
+expressões F, que também recalcula a média a partir dos valores já somados.
+Não há leitura prévia do filme nem agregação sobre as suas reviews, e
+escritas concorrentes no mesmo filme não se perdem.
+
+O trabalho que depende da nova média (facetas, índice de sugestões e cache do
+catálogo) é adiado para o fim da transação: os filmes afetados são recolhidos
+num lote e tratados uma única vez em `transaction.on_commit`, por muitas
+reviews que a transação escreva.
+
+Para importações em massa, `agregados_suspensos()` desliga o trabalho por
+linha e, à saída, recalcula todos os filmes afetados com um único
+`UPDATE ... FROM (SELECT ... GROUP BY filme_id)`.
+
+A mesma instrução mantém o `score` bayesiano de cada filme,
+`(rating_sum + C·m) / (reviews_count + m)`: a média das suas reviews puxada
+para a média global `C` com o peso de `m` avaliações fictícias
+(`SCORE_VOTOS_MINIMOS`). Um filme com uma única review de 5 estrelas fica
+assim perto de `C` e não à frente de filmes com milhares de avaliações. `C`
+vive na cache e é recalculada periodicamente por `atualizar_scores` (comando
+`atualizar_scores`), que também atualiza o `score` de todos os filmes.
+
+Os incrementos não corrigem desvios já existentes (reviews escritas com
+`bulk_create`/`update()`, gravações de instâncias desatualizadas, etc.);
+`reconciliar` deteta-os e repara-os em bloco (ver o comando
+`reconcile_ratings`).
+
+Os filmes sem reviews mantêm a `media_rating` que tiverem (por exemplo, a
+importada do IMDb); a partir da primeira review, a média passa a ser a das
+reviews.
+"""
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from collections import Counter
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Abs, Cast, Coalesce, Greatest
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from . import facets
+from .autocomplete import indice as indice_autocomplete, TIPO_FILME
+from .cache import invalidar_catalogo
+from .models.filme import Filme
+from .models.review import Review
+
+# Acima disto, reparar as facetas filme a filme custa mais do que reconstruí-las.
+MAX_SINCRONIZACOES_FACETAS = 500
+
+# Filmes por instrução no recálculo em bloco (limita o tamanho do `IN (...)`).
+LOTE_RECALCULO = 500
+
+_local = threading.local()
+
+# Estrela -> campo do histograma em `Filme`.
+HISTOGRAMA = dict(enumerate(Filme.CAMPOS_HISTOGRAMA, start=1))
+
+CHAVE_MEDIA_GLOBAL = "ratings:media_global"
+
+
+def media(soma, total):
+    """Expressão da média a partir de uma soma e de um número de avaliações."""
+    return Case(
+        When(GreaterThan(total, 0), then=Cast(soma, FloatField()) / total),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+# --- Score bayesiano ---
+
+def votos_minimos() -> int:
+    return max(1, getattr(settings, "SCORE_VOTOS_MINIMOS", 10))
+
+
+def _calcular_media_global() -> float:
+    totais = Filme.objects.aggregate(soma=Sum("rating_sum"), total=Sum("reviews_count"))
+    return totais["soma"] / totais["total"] if totais["total"] else 0.0
+
+
+def media_global() -> float:
+    """A média `C` de todas as avaliações, tal como foi calculada pela última vez."""
+    valor = cache.get(CHAVE_MEDIA_GLOBAL)
+    if valor is None:
+        valor = _calcular_media_global()
+        cache.set(CHAVE_MEDIA_GLOBAL, valor, None)
+    return valor
+
+
+def score(soma, total, media_c: float | None = None):
+    """Expressão do score bayesiano a partir de uma soma e de um número de avaliações."""
+    m = votos_minimos()
+    media_c = media_global() if media_c is None else media_c
+    return ExpressionWrapper(
+        (Cast(soma, FloatField()) + Value(media_c * m)) / (total + Value(m)),
+        output_field=FloatField(),
+    )
+
+
+def calcular_score(soma: int, total: int) -> float:
+    """O mesmo que `score`, em Python (para filmes ainda por gravar)."""
+    m = votos_minimos()
+    return (soma + media_global() * m) / (total + m)
+
+
+def atualizar_scores() -> float:
+    """
+    Recalcula a média global `C` a partir dos agregados dos filmes (sem ler
+    as reviews) e reescreve o `score` de todos os filmes numa instrução.
+    """
+    media_c = _calcular_media_global()
+    with transaction.atomic():
+        Filme.objects.update(score=score(F("rating_sum"), F("reviews_count"), media_c))
+        transaction.on_commit(invalidar_catalogo)
+    cache.set(CHAVE_MEDIA_GLOBAL, media_c, None)
+    return media_c
+
+
+# --- Incrementos ---
+
+def aplicar_delta(filme_id: int, adicionadas: Iterable[int] = (), removidas: Iterable[int] = ()) -> None:
+    """
+    Acrescenta ao filme as avaliações `adicionadas` e retira-lhe as
+    `removidas` (editar uma review é retirar a antiga e acrescentar a nova).
+    """
+    adicionadas, removidas = list(adicionadas), list(removidas)
+    soma = sum(adicionadas) - sum(removidas)
+    contagem = len(adicionadas) - len(removidas)
+    estrelas = Counter(r for r in adicionadas if r in HISTOGRAMA)
+    estrelas.subtract(r for r in removidas if r in HISTOGRAMA)
+    valores = {
+        HISTOGRAMA[estrela]: Greatest(F(HISTOGRAMA[estrela]) + delta, Value(0))
+        for estrela, delta in estrelas.items() if delta
+    }
+    if not soma and not contagem and not valores:
+        return
+    nova_soma = Greatest(F("rating_sum") + soma, Value(0))
+    novo_total = Greatest(F("reviews_count") + contagem, Value(0))
+    atualizados = Filme.objects.filter(pk=filme_id).update(
+        rating_sum=nova_soma,
+        reviews_count=novo_total,
+        media_rating=media(nova_soma, novo_total),
+        score=score(nova_soma, novo_total),
+        updated_at=timezone.now(),
+        **valores,
+    )
+    if atualizados:
+        marcar_alterados([filme_id])
+
+
+# --- Trabalho adiado para o commit ---
+
+class _Lote:
+    """Filmes alterados na transação atual, à espera do commit."""
+
+    def __init__(self):
+        self.ids: set[int] = set()
+
+    def executar(self):
+        # Cada filme marcado regista esta mesma chamada; a primeira a correr
+        # trata o lote inteiro e as seguintes já o encontram vazio. Assim não
+        # se depende de nenhuma chamada em particular: as que pertenciam a um
+        # savepoint desfeito são descartadas pelo Django e as outras bastam.
+        if getattr(_local, "lote", None) is self:
+            _local.lote = None
+        ids, self.ids = self.ids, set()
+        if ids:
+            propagar(ids)
+
+
+def marcar_alterados(filme_ids: Iterable[int]) -> None:
+    """Agenda `propagar` para estes filmes, uma vez por transação."""
+    lote = getattr(_local, "lote", None)
+    if lote is None:
+        lote = _local.lote = _Lote()
+    lote.ids.update(filme_ids)
+    transaction.on_commit(lote.executar)
+
+
+def propagar(filme_ids: Iterable[int]) -> None:
+    """
+    Leva uma mudança de `media_rating` feita com `update()` (que não passa
+    pelos sinais de `Filme`) às facetas, ao índice de sugestões e à cache.
+    """
+    filme_ids = sorted(filme_ids)
+    if len(filme_ids) > MAX_SINCRONIZACOES_FACETAS:
+        facets.reconstruir()
+    else:
+        for filme_id in filme_ids:
+            facets.sincronizar_filme(filme_id)
+    if indice_autocomplete.carregado:
+        for filme_id, rating in Filme.objects.filter(pk__in=filme_ids).values_list("pk", "media_rating"):
+            indice_autocomplete.atualizar_peso(TIPO_FILME, filme_id, rating)
+    invalidar_catalogo()
+
+
+# --- Reconciliação ---
+
+def _agregados_reais() -> dict:
+    """Expressões (subqueries correlacionadas) com o valor certo de cada agregado."""
+    reviews = Review.objects.filter(filme_id=OuterRef("pk")).order_by().values("filme_id")
+
+    def subquery(agregado):
+        return Coalesce(Subquery(reviews.annotate(v=agregado).values("v")), 0, output_field=IntegerField())
+
+    reais = {"rating_sum": subquery(Sum("rating")), "reviews_count": subquery(Count("id"))}
+    for estrela, campo in HISTOGRAMA.items():
+        reais[campo] = subquery(Count("id", filter=Q(rating=estrela)))
+    return reais
+
+
+def desvios(filmes=None):
+    """Filmes cujos agregados guardados não coincidem com as suas reviews."""
+    reais = _agregados_reais()
+    filmes = (filmes if filmes is not None else Filme.objects.all()).order_by()
+    filmes = filmes.annotate(**{f"real_{campo}": expressao for campo, expressao in reais.items()})
+    filmes = filmes.annotate(
+        media_delta=Abs(F("media_rating") - media(F("real_rating_sum"), F("real_reviews_count")))
+    )
+    diferente = Q(real_reviews_count__gt=0, media_delta__gt=1e-9)
+    for campo in reais:
+        diferente |= ~Q(**{campo: F(f"real_{campo}")})
+    return filmes.filter(diferente)
+
+
+def reconciliar(corrigir: bool = True) -> list[int]:
+    """
+    Procura filmes com agregados desviados e, se `corrigir`, repara-os com um
+    único `UPDATE` a partir das reviews. Devolve os ids encontrados.
+    """
+    with transaction.atomic():
+        ids = list(desvios().values_list("pk", flat=True))
+        if ids and corrigir:
+            reais = _agregados_reais()
+            Filme.objects.filter(pk__in=ids).update(
+                media_rating=media(reais["rating_sum"], reais["reviews_count"]),
+                score=score(reais["rating_sum"], reais["reviews_count"]),
+                updated_at=timezone.now(),
+                **reais,
+            )
+            marcar_alterados(ids)
+    return ids
+
+
+# --- Importações em massa ---
+
+def suspensos() -> set[int] | None:
+    """Conjunto de filmes afetados, se o trabalho por linha estiver suspenso."""
+    return getattr(_local, "suspensos", None)
+
+
+@contextmanager
+def agregados_suspensos():
+    """
+    Suspende a manutenção dos agregados pelos sinais de `Review` e, no fim,
+    recalcula de uma só vez os filmes afetados.
+
+    Os sinais limitam-se a recolher os filmes no conjunto devolvido; caminhos
+    que não passam pelos sinais (`bulk_create`, `update()`) devem acrescentar
+    eles próprios os ids:
+
+        with agregados_suspensos() as afetados:
+            Review.objects.bulk_create(reviews)
+            afetados.update(r.filme_id for r in reviews)
+
+    Blocos aninhados juntam-se ao mais exterior. Se o bloco terminar com uma
+    exceção, nada é recalculado.
+    """
+    exterior = suspensos()
+    if exterior is not None:
+        yield exterior
+        return
+    afetados: set[int] = set()
+    _local.suspensos = afetados
+    try:
+        yield afetados
+    finally:
+        _local.suspensos = None
+    recalcular(afetados)
+
+
+def _suporta_update_from() -> bool:
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 33, 0)
+    return False
+
+
+_RECALCULAR = """
+    UPDATE {filmes} SET
+        {soma} = s.soma,
+        {total} = s.total,
+        {media} = CASE
+            WHEN s.total > 0 THEN CAST(s.soma AS {real}) / s.total
+            WHEN {filmes}.{total} > 0 THEN 0
+            ELSE {filmes}.{media}
+        END,
+        {histograma_set},
+        {score} = (CAST(s.soma AS {real}) + %s) / (s.total + %s),
+        {atualizado} = %s
+    FROM (
+        SELECT f.{pk} AS filme_id, COALESCE(SUM(r.{rating}), 0) AS soma, COUNT(r.{review_pk}) AS total,
+            {histograma_select}
+        FROM {filmes} f LEFT JOIN {reviews} r ON r.{filme} = f.{pk}
+        {onde}
+        GROUP BY f.{pk}
+    ) s
+    WHERE {filmes}.{pk} = s.filme_id
+"""
+
+
+def recalcular(filme_ids: Iterable[int] | None) -> None:
+    """
+    Recalcula os agregados a partir das reviews, numa instrução por cada
+    `LOTE_RECALCULO` filmes; com `filme_ids=None`, recalcula o catálogo
+    inteiro numa única instrução (uma só agregação agrupada das reviews).
+
+    Um filme que deixou de ter reviews fica com média 0; um que nunca as teve
+    mantém a média que tinha (por exemplo, a importada do IMDb).
+    """
+    if filme_ids is None:
+        with transaction.atomic():
+            _recalcular_lote(None)
+            transaction.on_commit(propagar_todos)
+        return
+    filme_ids = sorted(set(filme_ids))
+    if not filme_ids:
+        return
+    with transaction.atomic():
+        for inicio in range(0, len(filme_ids), LOTE_RECALCULO):
+            _recalcular_lote(filme_ids[inicio:inicio + LOTE_RECALCULO])
+        marcar_alterados(filme_ids)
+
+
+def propagar_todos() -> None:
+    """Como `propagar`, depois de um recálculo do catálogo inteiro."""
+    facets.reconstruir()
+    indice_autocomplete.invalidar()
+    invalidar_catalogo()
+
+
+def _recalcular_lote(filme_ids: list[int] | None) -> None:
+    if _suporta_update_from():
+        _recalcular_update_from(filme_ids)
+        return
+    reais = _agregados_reais()
+    filmes = Filme.objects.all() if filme_ids is None else Filme.objects.filter(pk__in=filme_ids)
+    filmes.update(
+        media_rating=Case(
+            When(GreaterThan(reais["reviews_count"], 0), then=Cast(reais["rating_sum"], FloatField()) / reais["reviews_count"]),
+            When(reviews_count__gt=0, then=Value(0.0)),
+            default=F("media_rating"),
+            output_field=FloatField(),
+        ),
+        score=score(reais["rating_sum"], reais["reviews_count"]),
+        updated_at=timezone.now(),
+        **reais,
+    )
+
+
+def _recalcular_update_from(filme_ids: list[int] | None) -> None:
+    q = connection.ops.quote_name
+    campo = Filme._meta.get_field
+    rating = f"r.{q(Review._meta.get_field('rating').column)}"
+    sql = _RECALCULAR.format(
+        filmes=q(Filme._meta.db_table),
+        reviews=q(Review._meta.db_table),
+        pk=q(Filme._meta.pk.column),
+        review_pk=q(Review._meta.pk.column),
+        filme=q(Review._meta.get_field("filme").column),
+        rating=q(Review._meta.get_field("rating").column),
+        soma=q(campo("rating_sum").column),
+        total=q(campo("reviews_count").column),
+        media=q(campo("media_rating").column),
+        atualizado=q(campo("updated_at").column),
+        score=q(campo("score").column),
+        histograma_set=", ".join(f"{q(campo(c).column)} = s.n{e}" for e, c in HISTOGRAMA.items()),
+        histograma_select=", ".join(
+            f"SUM(CASE WHEN {rating} = {e} THEN 1 ELSE 0 END) AS n{e}" for e in HISTOGRAMA
+        ),
+        real="double precision" if connection.vendor == "postgresql" else "REAL",
+        onde="" if filme_ids is None else f"WHERE f.{q(Filme._meta.pk.column)} IN ({', '.join(['%s'] * len(filme_ids))})",
+    )
+    m = votos_minimos()
+    agora = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [media_global() * m, m, agora, *(filme_ids or ())])
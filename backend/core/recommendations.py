@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Recomendações personalizadas ("para si") por fatorização de matrizes.
+
+Treino (offline, comando `treinar_recomendacoes`): a matriz utilizador × filme
+de `similarity.matriz_interacoes` (favoritos, watchlist e reviews, pesadas
+pela avaliação) é fatorizada com ALS para feedback implícito (Hu, Koren e
+Volinsky): cada interação é uma preferência 1 com confiança `1 + alpha·peso`
+e tudo o resto é uma preferência 0 com confiança 1. Cada meia-iteração
+resolve, para todos os utilizadores (ou todos os filmes) de um bloco de uma
+vez, os sistemas `(YᵀY + Yᵀ(Cᵤ − I)Y + λI) xᵤ = YᵀCᵤ p(u)`: `YᵀY` é comum a
+todos, os termos `YᵀCᵤ p(u)` saem de um único produto esparso × denso e só a
+correção de cada linha depende das suas interações.
+
+Os vetores ficam em `FatoresUtilizador` e `FatoresFilme`, como bytes float32.
+Cada treino substitui as duas tabelas numa transação e muda a versão do
+modelo (`CHAVE_VERSAO`).
+
+Serviço (`/api/me/recommendations/`): cada processo guarda em memória a
+matriz de fatores dos filmes da versão atual (carregada numa query) e pontua
+todos os filmes com um único produto matriz × vetor. Os filmes das listas
+do utilizador e os que já avaliou ficam de fora. O resultado (só os ids)
+fica em cache por utilizador, acompanhado da versão do modelo e de uma
+assinatura das suas listas (`membership.py`, que descarta a lista em cache a
+cada escrita): quando o modelo ou as listas mudam, a assinatura deixa de
+bater certo e as recomendações são recalculadas. Uma review nova descarta-o
+diretamente (ver `signals.py`). A versão e as listas vivem na cache
+partilhada pelos processos (ver `checks.py`), por isso um novo treino ou uma
+escrita chegam a todos os workers.
+
+Utilizadores sem fatores (novos, ou sem interações no último treino)
+recebem o ranking do catálogo (`score`), sem os filmes das suas listas.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import membership
+from .cache import incrementar_versao, ler_versao
+from .models.filme import Filme
+from .models.recomendacao import FatoresFilme, FatoresUtilizador
+from .models.review import Review
+from .similarity import matriz_interacoes
+
+FATORES_PADRAO = 32
+ITERACOES_PADRAO = 15
+REGULARIZACAO_PADRAO = 0.1
+ALPHA_PADRAO = 20.0
+BLOCO_SOLVE = 1024
+LOTE_ESCRITA = 5000
+
+# Recomendações calculadas e guardadas por utilizador (o endpoint devolve um prefixo).
+MAX_RECOMENDACOES = 100
+
+CHAVE_VERSAO = "recomendacoes:versao"
+
+_DTYPE = np.dtype("<f4")
+
+
+def _ttl() -> int:
+    return getattr(settings, "RECOMENDACOES_CACHE_TTL", 6 * 3600)
+
+
+def _chave(utilizador_id: int) -> str:
+    return f"recomendacoes:{utilizador_id}"
+
+
+def versao_modelo() -> int:
+    return ler_versao(CHAVE_VERSAO)
+
+
+def _incrementar_versao() -> None:
+    incrementar_versao(CHAVE_VERSAO)
+
+
+# --- Treino ---
+
+def _resolver(confianca: sparse.csr_matrix, fixos: np.ndarray, regularizacao: float) -> np.ndarray:
+    """
+    Meia-iteração do ALS: calcula os fatores das linhas de `confianca`
+    (cujos valores são `alpha·peso`, isto é, `c − 1`) com os `fixos` das colunas.
+    """
+    n, f = confianca.shape[0], fixos.shape[1]
+    base = fixos.T @ fixos + regularizacao * np.eye(f, dtype=np.float32)
+    # Yᵀ Cᵤ p(u): as preferências são 1 exatamente nas interações, com peso 1 + (c − 1).
+    lados = confianca @ fixos + (confianca != 0).astype(np.float32) @ fixos
+    resultado = np.empty((n, f), dtype=np.float32)
+    for inicio in range(0, n, BLOCO_SOLVE):
+        fim = min(inicio + BLOCO_SOLVE, n)
+        sistemas = np.repeat(base[np.newaxis], fim - inicio, axis=0)
+        for i in range(inicio, fim):
+            de, ate = confianca.indptr[i], confianca.indptr[i + 1]
+            vizinhos = fixos[confianca.indices[de:ate]]
+            sistemas[i - inicio] += (vizinhos.T * confianca.data[de:ate]) @ vizinhos
+        resultado[inicio:fim] = np.linalg.solve(sistemas, lados[inicio:fim, :, np.newaxis])[:, :, 0]
+    return resultado
+
+
+def fatorizar(
+    matriz: sparse.csr_matrix,
+    fatores: int = FATORES_PADRAO,
+    iteracoes: int = ITERACOES_PADRAO,
+    regularizacao: float = REGULARIZACAO_PADRAO,
+    alpha: float = ALPHA_PADRAO,
+    semente: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Fatoriza a matriz utilizador × filme; devolve `(fatores_utilizadores, fatores_filmes)`."""
+    confianca = (matriz * alpha).astype(np.float32).tocsr()
+    confianca_t = confianca.T.tocsr()
+    rng = np.random.default_rng(semente)
+    filmes = (rng.standard_normal((matriz.shape[1], fatores)) * 0.01).astype(np.float32)
+    utilizadores = np.zeros((matriz.shape[0], fatores), dtype=np.float32)
+    for _ in range(iteracoes):
+        utilizadores = _resolver(confianca, filmes, regularizacao)
+        filmes = _resolver(confianca_t, utilizadores, regularizacao)
+    return utilizadores, filmes
+
+
+def _gravar(modelo, campo: str, ids: np.ndarray, vetores: np.ndarray) -> None:
+    vetores = vetores.astype(_DTYPE, copy=False)
+    for inicio in range(0, len(ids), LOTE_ESCRITA):
+        modelo.objects.bulk_create([
+            modelo(**{campo: int(pk)}, vetor=vetores[i].tobytes())
+            for i, pk in enumerate(ids[inicio:inicio + LOTE_ESCRITA], start=inicio)
+        ])
+
+
+def treinar(**opcoes) -> tuple[int, int]:
+    """
+    Treina o modelo e substitui os fatores guardados. Aceita as opções de
+    `fatorizar`. Devolve `(utilizadores, filmes)` com fatores.
+    """
+    matriz, utilizador_ids, filme_ids = matriz_interacoes()
+    if matriz.nnz:
+        fatores_utilizadores, fatores_filmes = fatorizar(matriz, **opcoes)
+    else:
+        fatores_utilizadores = fatores_filmes = np.empty((0, 0), dtype=np.float32)
+
+    with transaction.atomic():
+        FatoresUtilizador.objects.all().delete()
+        FatoresFilme.objects.all().delete()
+        _gravar(FatoresUtilizador, "utilizador_id", utilizador_ids, fatores_utilizadores)
+        _gravar(FatoresFilme, "filme_id", filme_ids, fatores_filmes)
+        transaction.on_commit(_incrementar_versao)
+    return len(utilizador_ids), len(filme_ids)
+
+
+# --- Serviço ---
+
+class _FatoresFilmes:
+    """Matriz de fatores dos filmes da versão atual, partilhada pelo processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao = None
+        self._modelo = (np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32))
+
+    def atual(self) -> tuple[np.ndarray, np.ndarray]:
+        """Devolve `(filme_ids, fatores)`, com os ids ordenados e uma linha de fatores por id."""
+        versao = versao_modelo()
+        if self._versao != versao:
+            with self._lock:
+                if self._versao != versao:
+                    self._modelo = self._carregar()
+                    self._versao = versao
+        return self._modelo
+
+    @staticmethod
+    def _carregar() -> tuple[np.ndarray, np.ndarray]:
+        linhas = list(FatoresFilme.objects.order_by("filme_id").values_list("filme_id", "vetor"))
+        ids = np.fromiter((pk for pk, _ in linhas), dtype=np.int64, count=len(linhas))
+        if not linhas:
+            return ids, np.empty((0, 0), dtype=np.float32)
+        dados = b"".join(bytes(vetor) for _, vetor in linhas)
+        return ids, np.frombuffer(dados, dtype=_DTYPE).reshape(len(linhas), -1)
+
+
+fatores_filmes = _FatoresFilmes()
+
+
+def _assinatura(listas: dict) -> str:
+    resumo = hashlib.sha1()
+    for lista in sorted(listas):
+        resumo.update(lista.encode())
+        resumo.update(listas[lista].tobytes())
+    return resumo.hexdigest()
+
+
+def _excluidos(utilizador_id: int, listas: dict) -> np.ndarray:
+    avaliados = Review.objects.filter(autor_id=utilizador_id).values_list("filme_id", flat=True)
+    partes = [np.asarray(lista, dtype=np.int64) for lista in listas.values()]
+    partes.append(np.fromiter(avaliados, dtype=np.int64))
+    return np.unique(np.concatenate(partes))
+
+
+def _pontuar(vetor: np.ndarray, excluidos: np.ndarray) -> list[int]:
+    ids, fatores = fatores_filmes.atual()
+    if not len(ids) or fatores.shape[1] != len(vetor):
+        return []
+    pontuacoes = fatores @ vetor
+    pontuacoes[np.isin(ids, excluidos, assume_unique=True)] = -np.inf
+    n = min(MAX_RECOMENDACOES, int(np.isfinite(pontuacoes).sum()))
+    if not n:
+        return []
+    melhores = np.argpartition(-pontuacoes, n - 1)[:n]
+    melhores = melhores[np.argsort(-pontuacoes[melhores], kind="stable")]
+    return ids[melhores].tolist()
+
+
+def _calcular(utilizador_id: int, listas: dict) -> tuple[bool, list[int]]:
+    excluidos = _excluidos(utilizador_id, listas)
+    vetor = FatoresUtilizador.objects.filter(utilizador_id=utilizador_id).values_list("vetor", flat=True).first()
+    if vetor is not None:
+        ids = _pontuar(np.frombuffer(bytes(vetor), dtype=_DTYPE), excluidos)
+        if ids:
+            return True, ids
+    ranking = (
+        Filme.objects.exclude(pk__in=excluidos.tolist())
+        .order_by("-score", "id")
+        .values_list("pk", flat=True)[:MAX_RECOMENDACOES]
+    )
+    return False, list(ranking)
+
+
+def recomendar(utilizador_id: int) -> tuple[bool, list[int]]:
+    """
+    Devolve `(personalizado, filme_ids)` por ordem de recomendação; quando
+    `personalizado` é falso, os ids vêm do ranking geral.
+    """
+    listas = membership.ids_das_listas(utilizador_id)
+    assinatura = (versao_modelo(), _assinatura(listas))
+    guardado = cache.get(_chave(utilizador_id))
+    if guardado is not None and guardado[0] == assinatura:
+        return guardado[1], guardado[2]
+    personalizado, ids = _calcular(utilizador_id, listas)
+    cache.set(_chave(utilizador_id), (assinatura, personalizado, ids), _ttl())
+    return personalizado, ids
+
+
+def esquecer(utilizador_id: int) -> None:
+    """Descarta as recomendações em cache de um utilizador quando a transação atual terminar."""
+    transaction.on_commit(lambda: cache.delete(_chave(utilizador_id)))
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Pesquisa de texto integral sobre os títulos e sinopses dos filmes.
+
+O índice depende do motor de base de dados em uso:
+
+- **PostgreSQL** (`USE_POSTGRES`): coluna `search_vector` do tipo `tsvector`,
+  gerada pela própria base de dados a partir de `titulo` (peso A) e `descricao`
+  (peso B), com um índice GIN. Como é uma coluna gerada, é mantida em cada
+  `INSERT`/`UPDATE`, incluindo `bulk_create` e `QuerySet.update`. A
+  configuração `cinemix_unaccent` (migração `0015_filme_search_unaccent`) tira
+  os acentos das palavras indexadas e dos termos pesquisados.
+- **SQLite**: tabela virtual FTS5 `core_filme_fts` com `rowid` igual ao `id`
+  do filme, mantida a partir de `Filme.save`/`delete` (ver `signals.py`), que
+  também ignora os acentos (`remove_diacritics`).
+
+A estrutura é criada pela migração `0005_filme_search_index`; `Filme` não
+declara nenhum campo para ela, para que o modelo continue igual em ambos os
+motores.
+"""
+from __future__ import annotations
+
+import re
+from typing import Iterable
+
+from django.db import connection
+from django.db.models import Q
+
+from .models.filme import Filme
+
+FTS_TABLE = "core_filme_fts"
+
+# Máximo de termos considerados numa pesquisa; protege o planeador de
+# consultas com milhares de termos vindos de um pedido malicioso.
+MAX_TERMOS = 8
+
+# Em PostgreSQL, só as primeiras `MAX_CANDIDATOS` correspondências (pela ordem
+# do índice GIN) são ordenadas por relevância: ordenar todas as linhas que
+# contêm um termo comum custaria uma leitura de milhares de vetores por pedido.
+MAX_CANDIDATOS = 2000
+
+_TERMO_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def termos(texto: str) -> list[str]:
+    """Divide o texto do utilizador em termos alfanuméricos, em minúsculas."""
+    return _TERMO_RE.findall((texto or "").lower())[:MAX_TERMOS]
+
+
+def _query_fts5(lista: list[str]) -> str:
+    # Cada termo vai entre aspas (sem operadores FTS5 vindos do utilizador);
+    # o último é tratado como prefixo, para pesquisas enquanto se escreve.
+    partes = [f'"{t}"' for t in lista[:-1]] + [f'"{lista[-1]}" *']
+    return " ".join(partes)
+
+
+def _query_tsquery(lista: list[str]) -> str:
+    return " & ".join(lista[:-1] + [f"{lista[-1]}:*"])
+
+
+def pesquisar_ids(texto: str, limite: int = 20) -> list[int]:
+    """
+    Devolve os ids dos filmes que correspondem a `texto`, do mais relevante
+    para o menos relevante. Só lê o índice de texto; os objetos `Filme` são
+    carregados depois, apenas para a página pedida.
+    """
+    lista = termos(texto)
+    if not lista:
+        return []
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                """
+                WITH q AS (SELECT to_tsquery('cinemix_unaccent', %s) AS q),
+                candidatos AS (
+                    SELECT id, search_vector FROM core_filme, q
+                    WHERE search_vector @@ q.q
+                    LIMIT %s
+                )
+                SELECT id FROM candidatos, q
+                ORDER BY ts_rank_cd(search_vector, q.q) DESC, id
+                LIMIT %s
+                """,
+                [_query_tsquery(lista), MAX_CANDIDATOS, limite],
+            )
+        elif connection.vendor == "sqlite":
+            # bm25() devolve valores menores para resultados mais relevantes;
+            # o título pesa dez vezes mais do que a sinopse.
+            cursor.execute(
+                f"""
+                SELECT rowid FROM {FTS_TABLE}
+                WHERE {FTS_TABLE} MATCH %s
+                ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), rowid
+                LIMIT %s
+                """,
+                [_query_fts5(lista), limite],
+            )
+        else:
+            filtro = Q()
+            for termo in lista:
+                filtro &= Q(titulo__icontains=termo) | Q(descricao__icontains=termo)
+            return list(Filme.objects.filter(filtro).values_list("id", flat=True)[:limite])
+        return [linha[0] for linha in cursor.fetchall()]
+
+
+def indexar_filmes(filmes: Iterable) -> None:
+    """
+    Atualiza o índice FTS5 para os filmes dados (objetos com `pk`, `titulo` e
+    `descricao`). Em PostgreSQL não faz nada: a coluna gerada já está atualizada.
+    """
+    if connection.vendor != "sqlite":
+        return
+    linhas = [(f.pk, f.titulo or "", f.descricao or "") for f in filmes]
+    if not linhas:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk, _, _ in linhas])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, titulo, descricao) VALUES (%s, %s, %s)",
+            linhas,
+        )
+
+
+def remover_filmes(filme_ids: Iterable[int]) -> None:
+    """Remove filmes apagados do índice FTS5."""
+    if connection.vendor != "sqlite":
+        return
+    ids = [(pk,) for pk in filme_ids]
+    if ids:
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", ids)
+
+
+def reconstruir_indice() -> None:
+    """
+    Reconstrói o índice FTS5 a partir da tabela `core_filme` numa única
+    instrução. Útil depois de importações em massa que não passam por `save()`.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, titulo, descricao) "
+            "SELECT id, titulo, descricao FROM core_filme"
+        )
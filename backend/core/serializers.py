@@ -5,9 +5,13 @@ from rest_framework import serializers
 
 from .models.taxonomia import Genero
 from .models.pessoa import Pessoa
+from .models.elenco import Elenco
+from .models.video import Video
 from .models.filme import Filme
 from .models.review import Review
 from .models.listas import Watchlist, Favorito
+from .models.recomendacao import FilmeSemelhante
+from .membership import ESTADO_VAZIO, MAX_FILMES_POR_PEDIDO, MAX_ID_FILME
 
 User = get_user_model()
 
@@ -21,6 +25,38 @@ class PessoaSerializer(serializers.ModelSerializer):
         model = Pessoa
         fields = ["id", "nome", "slug", "bio", "foto"]
 
+class PessoaMiniSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Pessoa
+        fields = ["id", "nome", "slug", "foto"]
+
+class CreditoSerializer(serializers.ModelSerializer):
+    """Um crédito de `/api/filmes/{slug}/creditos/`."""
+    pessoa = PessoaMiniSerializer(read_only=True)
+
+    class Meta:
+        model = Elenco
+        fields = ["pessoa", "papel", "ordem_credito"]
+
+class VideoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Video
+        fields = ["id", "titulo", "tipo", "site", "key", "url", "idioma"]
+
+class FilmeMiniSerializer(serializers.ModelSerializer):
+    """Os dados do cartão de um filme, sem géneros (evita uma query)."""
+    class Meta:
+        model = Filme
+        fields = ["id", "titulo", "slug", "ano_lancamento", "media_rating", "poster"]
+
+class FilmografiaSerializer(serializers.ModelSerializer):
+    """Um crédito da filmografia de `/api/pessoas/{slug}/`."""
+    filme = FilmeMiniSerializer(read_only=True)
+
+    class Meta:
+        model = Elenco
+        fields = ["filme", "papel", "ordem_credito"]
+
 class FilmeListSerializer(serializers.ModelSerializer):
     generos = GeneroSerializer(many=True, read_only=True)
     class Meta:
@@ -30,17 +66,58 @@ class FilmeListSerializer(serializers.ModelSerializer):
             "media_rating", "poster", "backdrop", "generos"
         ]
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Estado das listas do utilizador, quando a view o pede (`?include=status`).
+        estado = self.context.get("estado_listas")
+        if estado is not None:
+            data.update(estado.get(instance.pk, ESTADO_VAZIO))
+        return data
+
 class FilmeDetailSerializer(FilmeListSerializer):
+    # Quantas reviews deram cada número de estrelas: {"1": n1, ..., "5": n5}.
+    distribuicao_ratings = serializers.SerializerMethodField()
+
     class Meta(FilmeListSerializer.Meta):
         fields = FilmeListSerializer.Meta.fields + [
-            "descricao", "imdb_id", "created_at", "updated_at"
+            "descricao", "imdb_id", "reviews_count", "distribuicao_ratings", "created_at", "updated_at"
         ]
 
+    def get_distribuicao_ratings(self, obj):
+        return {str(estrela): getattr(obj, campo) for estrela, campo in enumerate(Filme.CAMPOS_HISTOGRAMA, start=1)}
+
 class FilmeWriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Filme
         fields = '__all__'
 
+    def update(self, instance, validated_data):
+        # Grava só os campos enviados: os agregados das reviews são mantidos
+        # na base de dados (ver `Filme.CAMPOS_DERIVADOS`).
+        relacoes = {
+            nome: validated_data.pop(nome) for nome in list(validated_data)
+            if instance._meta.get_field(nome).many_to_many
+        }
+        for nome, valor in validated_data.items():
+            setattr(instance, nome, valor)
+        instance.save(update_fields=[*validated_data, "updated_at"])
+        for nome, valor in relacoes.items():
+            getattr(instance, nome).set(valor)
+        return instance
+
+class FilmeSemelhanteSerializer(serializers.ModelSerializer):
+    """Um vizinho de `/api/filmes/{slug}/similar/`: os dados do cartão, sem géneros (evita uma query)."""
+    id = serializers.IntegerField(source="semelhante.id")
+    titulo = serializers.CharField(source="semelhante.titulo")
+    slug = serializers.CharField(source="semelhante.slug")
+    ano_lancamento = serializers.IntegerField(source="semelhante.ano_lancamento")
+    media_rating = serializers.FloatField(source="semelhante.media_rating")
+    poster = serializers.CharField(source="semelhante.poster")
+
+    class Meta:
+        model = FilmeSemelhante
+        fields = ["id", "titulo", "slug", "ano_lancamento", "media_rating", "poster", "similaridade"]
+
 class UserMiniSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -96,3 +173,31 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "username", "email", "is_staff"]
+
+class IdFilmeField(serializers.IntegerField):
+    """Id de filme vindo do cliente: inteiro positivo dentro do limite da cache; `true`/`false` não contam como 1/0."""
+
+    def __init__(self, **kwargs):
+        super().__init__(min_value=1, max_value=MAX_ID_FILME, **kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("invalid")
+        return super().to_internal_value(data)
+
+class EstadoListasLoteSerializer(serializers.Serializer):
+    """Corpo (ou query string) de `/api/filmes/status/`: ids e/ou slugs de filmes."""
+    ids = serializers.ListField(child=IdFilmeField(), required=False)
+    slugs = serializers.ListField(child=serializers.CharField(), required=False)
+
+    def validate(self, attrs):
+        total = len(attrs.get("ids", [])) + len(attrs.get("slugs", []))
+        if not total:
+            raise serializers.ValidationError('Indique "ids" ou "slugs".')
+        if total > MAX_FILMES_POR_PEDIDO:
+            raise serializers.ValidationError(f"No máximo {MAX_FILMES_POR_PEDIDO} filmes por pedido.")
+        return attrs
+
+class ListaLoteSerializer(serializers.Serializer):
+    """Corpo de `PUT/DELETE .../lote/`: `{"filmes": [ids]}`."""
+    filmes = serializers.ListField(child=IdFilmeField(), allow_empty=False, max_length=MAX_FILMES_POR_PEDIDO)
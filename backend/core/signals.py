@@ -7,58 +7,64 @@ notifiquem outras partes da aplicação (receptores) quando um evento ocorre.
 
 Neste ficheiro, definimos receptores que são acionados sempre que uma `Review`
 é guardada (`post_save`) ou apagada (`post_delete`). A função destes receptores
-é recalcular e atualizar os campos agregados `media_rating` e `reviews_count`
-no modelo `Filme` correspondente, mantendo assim os dados consistentes e
-otimizados para leitura.
+é aplicar aos campos agregados `rating_sum`, `reviews_count`, `media_rating` e
+ao histograma de estrelas do `Filme` correspondente a diferença provocada pela
+escrita (ver `ratings.py`), mantendo assim os dados consistentes e otimizados
+para leitura.
+
+Qualquer escrita em filmes, géneros, pessoas, créditos, vídeos ou reviews
+invalida também a cache de respostas do catálogo (`cache.py`), incrementando a
+sua versão; no caso das reviews, uma única vez por transação.
+
+Mantém ainda sincronizados com os filmes e as pessoas as contagens de facetas
+do catálogo (`facets.py`), o índice de pesquisa de texto (`search.py`), o
+índice de sugestões em memória (`autocomplete.py`) e, com os créditos, o
+grafo de graus de separação (`costars.py`).
+
+Por fim, as alterações à watchlist e aos favoritos descartam as listas em
+cache de cada utilizador (`membership.py`); as recomendações em
+cache (`recommendations.py`) dependem dessas listas e das reviews do autor.
 """
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.apps import apps
-from django.db.models import Avg, Count
+from django.utils import timezone
+
+from . import costars, facets, membership, ratings, recommendations, search
+from .cache import invalidar_catalogo
+from .autocomplete import indice as indice_autocomplete, TIPO_FILME, TIPO_PESSOA
 
 # --- Carregamento dinâmico dos modelos ---
 # `apps.get_model` é usado para obter as classes dos modelos de forma segura,
 # evitando importações circulares, especialmente durante a inicialização do Django.
 Filme = apps.get_model("core", "Filme")
 Review = apps.get_model("core", "Review")
+Genero = apps.get_model("core", "Genero")
+Pessoa = apps.get_model("core", "Pessoa")
+Elenco = apps.get_model("core", "Elenco")
+Video = apps.get_model("core", "Video")
+Watchlist = apps.get_model("core", "Watchlist")
+Favorito = apps.get_model("core", "Favorito")
 
 
-def _atualizar_agregados_filme(filme_id: int):
+@receiver(pre_save, sender=Review)
+def review_pre_save(sender, instance, update_fields=None, **kwargs):
     """
-    Função auxiliar para recalcular e atualizar os dados agregados de um Filme.
-
-    Esta função é chamada sempre que uma review é criada, atualizada ou apagada.
-    Ela executa uma única query à base de dados para obter a nova média de
-    classificações (rating) e o número total de reviews para um dado filme.
+    Receptor acionado antes de uma `Review` existente ser guardada.
 
-    Args:
-        filme_id: O ID do filme que precisa de ser atualizado.
+    Guarda o filme e a avaliação que a review tinha, lidos da base de dados
+    (a instância pode já não os refletir), para que `review_post_save` possa
+    aplicar apenas a diferença.
     """
-    try:
-        filme = Filme.objects.get(id=filme_id)
-    except Filme.DoesNotExist:
-        # Se o filme não for encontrado (caso raro), não há nada a fazer.
+    instance._rating_anterior = None
+    if instance._state.adding or instance.pk is None:
         return
-
-    # Executa uma query de agregação na tabela de Reviews.
-    # `aggregate` calcula a média (`Avg`) do campo 'rating' e a contagem (`Count`)
-    # de registos, tudo numa única operação na base de dados.
-    agregados = Review.objects.filter(filme_id=filme_id).aggregate(
-        media=Avg("rating"),
-        total=Count("id"),
+    if update_fields is not None and not {"rating", "filme"}.intersection(update_fields):
+        return
+    instance._rating_anterior = (
+        Review.objects.filter(pk=instance.pk).values_list("filme_id", "rating").first()
     )
 
-    # Atualiza os campos do objeto Filme em memória.
-    # Se não houver reviews, `media` será None, pelo que usamos `or 0.0`.
-    filme.media_rating = agregados["media"] or 0.0
-    filme.reviews_count = agregados["total"] or 0
-
-    # Guarda as alterações na base de dados.
-    # `update_fields` é uma otimização importante: especifica quais colunas
-    # devem ser atualizadas, evitando reescrever o registo inteiro e acionar
-    # desnecessariamente outros sinais ou lógica de `auto_now`.
-    filme.save(update_fields=["media_rating", "reviews_count", "updated_at"])
-
 
 @receiver(post_save, sender=Review)
 def review_post_save(sender, instance, created, **kwargs):
@@ -74,8 +80,30 @@ def review_post_save(sender, instance, created, **kwargs):
         created: Um booleano que é True se um novo registo foi criado.
         **kwargs: Argumentos adicionais do sinal.
     """
-    # Chama a função auxiliar para atualizar os dados do filme associado.
-    _atualizar_agregados_filme(instance.filme_id)
+    anterior = getattr(instance, "_rating_anterior", None)
+    if created:
+        recommendations.esquecer(instance.autor_id)
+    afetados = ratings.suspensos()
+    if afetados is not None:
+        # Importação em curso: os filmes são recalculados no fim do bloco.
+        afetados.add(instance.filme_id)
+        if anterior is not None:
+            afetados.add(anterior[0])
+        return
+    if created:
+        ratings.aplicar_delta(instance.filme_id, adicionadas=[instance.rating])
+    elif anterior is not None:
+        filme_anterior, rating_anterior = anterior
+        if filme_anterior == instance.filme_id:
+            if instance.rating != rating_anterior:
+                ratings.aplicar_delta(instance.filme_id, adicionadas=[instance.rating], removidas=[rating_anterior])
+        else:
+            # A review mudou de filme: sai de um e entra no outro.
+            ratings.aplicar_delta(filme_anterior, removidas=[rating_anterior])
+            ratings.aplicar_delta(instance.filme_id, adicionadas=[instance.rating])
+    if not created and (anterior is None or anterior == (instance.filme_id, instance.rating)):
+        # Os agregados não mudam, mas o detalhe com `?include=reviews` (em cache) mostra o texto.
+        invalidar_catalogo()
 
 
 @receiver(post_delete, sender=Review)
@@ -91,5 +119,202 @@ def review_post_delete(sender, instance, **kwargs):
         instance: A instância específica do modelo que foi apagada.
         **kwargs: Argumentos adicionais do sinal.
     """
-    # Chama a função auxiliar para atualizar os dados do filme associado.
-    _atualizar_agregados_filme(instance.filme_id)
+    recommendations.esquecer(instance.autor_id)
+    afetados = ratings.suspensos()
+    if afetados is not None:
+        afetados.add(instance.filme_id)
+        return
+    ratings.aplicar_delta(instance.filme_id, removidas=[instance.rating])
+
+
+@receiver(pre_save, sender=Filme)
+def filme_pre_save_score(sender, instance, **kwargs):
+    """Um filme novo entra no ranking com o score que as suas avaliações dão (sem reviews, a média global)."""
+    if instance._state.adding:
+        instance.score = ratings.calcular_score(instance.rating_sum, instance.reviews_count)
+
+
+# --- Cache de respostas do catálogo ---
+
+@receiver(post_save, sender=Filme)
+@receiver(post_delete, sender=Filme)
+@receiver(post_save, sender=Genero)
+@receiver(post_delete, sender=Genero)
+@receiver(m2m_changed, sender=Filme.generos.through)
+@receiver(post_save, sender=Pessoa)
+@receiver(post_delete, sender=Pessoa)
+@receiver(post_save, sender=Elenco)
+@receiver(post_delete, sender=Elenco)
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def catalogo_alterado(sender, **kwargs):
+    """Invalida as respostas do catálogo guardadas na cache."""
+    if kwargs.get("action", "post_").startswith("post_"):
+        invalidar_catalogo()
+
+
+# --- Validadores de pedidos condicionais (ETag / Last-Modified) ---
+
+@receiver(m2m_changed, sender=Filme.generos.through)
+def filme_generos_changed_updated_at(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Os géneros fazem parte da resposta de cada filme, mas mudar a relação M2M
+    não grava o `Filme`; atualiza-se `updated_at` para que o ETag mude.
+    """
+    if reverse and action == "pre_clear":
+        # Depois do `clear()` já não se sabe que filmes tinham o género.
+        instance._filmes_desligados = list(instance.filmes.values_list("pk", flat=True))
+        return
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        ids = [instance.pk]
+    elif action == "post_clear":
+        ids = getattr(instance, "_filmes_desligados", [])
+    else:
+        ids = pk_set
+    Filme.objects.filter(pk__in=ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Genero)
+def genero_post_save_updated_at(sender, instance, created, **kwargs):
+    """Renomear um género altera a resposta de todos os seus filmes."""
+    if not created:
+        Filme.objects.filter(generos=instance).update(updated_at=timezone.now())
+
+
+# --- Índice de pesquisa de texto ---
+
+_CAMPOS_PESQUISA = {"titulo", "descricao"}
+
+
+@receiver(post_save, sender=Filme)
+def filme_post_save_indice(sender, instance, update_fields=None, **kwargs):
+    """
+    Reindexa o filme quando o título ou a sinopse podem ter mudado.
+
+    Gravações parciais que não tocam nesses campos (por exemplo, só de
+    `media_rating`) não custam nada ao índice.
+    """
+    if update_fields is not None and not _CAMPOS_PESQUISA.intersection(update_fields):
+        return
+    search.indexar_filmes([instance])
+
+
+@receiver(post_delete, sender=Filme)
+def filme_post_delete_indice(sender, instance, **kwargs):
+    """Remove o filme apagado do índice de pesquisa."""
+    search.remover_filmes([instance.pk])
+
+
+# --- Índice de sugestões (autocomplete) ---
+
+@receiver(post_save, sender=Filme)
+def filme_post_save_autocomplete(sender, instance, update_fields=None, **kwargs):
+    """
+    Atualiza a sugestão do filme no índice em memória deste processo.
+
+    Quando só muda `media_rating`, atualiza-se apenas o peso usado para
+    ordenar as sugestões.
+    """
+    if update_fields is not None and not {"titulo", "slug"}.intersection(update_fields):
+        indice_autocomplete.atualizar_peso(TIPO_FILME, instance.pk, instance.media_rating)
+        return
+    indice_autocomplete.atualizar(TIPO_FILME, instance.pk, instance.titulo, instance.slug, instance.media_rating)
+
+
+@receiver(post_delete, sender=Filme)
+def filme_post_delete_autocomplete(sender, instance, **kwargs):
+    indice_autocomplete.remover(TIPO_FILME, instance.pk)
+
+
+@receiver(post_save, sender=Pessoa)
+def pessoa_post_save_autocomplete(sender, instance, **kwargs):
+    indice_autocomplete.atualizar(TIPO_PESSOA, instance.pk, instance.nome, instance.slug)
+
+
+@receiver(post_delete, sender=Pessoa)
+def pessoa_post_delete_autocomplete(sender, instance, **kwargs):
+    indice_autocomplete.remover(TIPO_PESSOA, instance.pk)
+
+
+# --- Grafo de créditos ---
+
+@receiver(post_save, sender=Elenco)
+@receiver(post_delete, sender=Elenco)
+def elenco_alterado_grafo(sender, **kwargs):
+    """O grafo de graus de separação (`costars.py`) é recarregado no pedido seguinte."""
+    costars.invalidar()
+
+
+# --- Contagens de facetas ---
+
+_CAMPOS_FACETA = {"ano_lancamento", "media_rating"}
+
+
+@receiver(post_save, sender=Filme)
+def filme_post_save_facetas(sender, instance, update_fields=None, **kwargs):
+    """Recolhe o filme na combinação década/faixa certa depois de cada gravação."""
+    if update_fields is not None and not _CAMPOS_FACETA.intersection(update_fields):
+        return
+    chave = facets.sincronizar_filme(instance.pk)
+    if chave is not None:
+        # A instância fica com a combinação gravada, para que um `save()`
+        # seguinte não a tome por desatualizada (ver `Filme.save`).
+        instance.faceta_decada, instance.faceta_faixa = chave
+
+
+@receiver(pre_delete, sender=Filme)
+def filme_pre_delete_facetas(sender, instance, **kwargs):
+    """
+    Desconta o filme antes de ser apagado; depois do `DELETE` já não seria
+    possível saber a que géneros pertencia.
+    """
+    facets.remover_filme(instance.pk)
+
+
+@receiver(m2m_changed, sender=Filme.generos.through)
+def filme_generos_changed_facetas(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Acompanha `filme.generos.add/remove/clear` (e o lado inverso,
+    `genero.filmes.*`), ajustando só as linhas de género.
+    """
+    through = Filme.generos.through
+    dono = "genero_id" if reverse else "filme_id"
+    outro = "filme_id" if reverse else "genero_id"
+
+    if action in ("pre_remove", "pre_clear"):
+        # Guarda os pares que existem de facto antes de serem removidos.
+        existentes = through.objects.filter(**{dono: instance.pk})
+        if action == "pre_remove":
+            existentes = existentes.filter(**{f"{outro}__in": pk_set})
+        instance._facetas_removidos = list(existentes.values_list(outro, flat=True))
+        return
+
+    if action == "post_add":
+        ids, delta = pk_set or (), +1
+    elif action in ("post_remove", "post_clear"):
+        ids, delta = getattr(instance, "_facetas_removidos", ()), -1
+    else:
+        return
+    if reverse:
+        facets.ajustar_generos(ids, [instance.pk], delta)
+    else:
+        facets.ajustar_generos([instance.pk], ids, delta)
+
+
+# --- Listas pessoais em cache ---
+
+@receiver(post_save, sender=Watchlist)
+@receiver(post_save, sender=Favorito)
+def lista_post_save_cache(sender, instance, created, **kwargs):
+    if created:
+        lista = membership.WATCHLIST if sender is Watchlist else membership.FAVORITOS
+        membership.registar_alteracao(instance.utilizador_id, lista, [instance.filme_id])
+
+
+@receiver(post_delete, sender=Watchlist)
+@receiver(post_delete, sender=Favorito)
+def lista_post_delete_cache(sender, instance, **kwargs):
+    lista = membership.WATCHLIST if sender is Watchlist else membership.FAVORITOS
+    membership.registar_alteracao(instance.utilizador_id, lista, [instance.filme_id])
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Filmes semelhantes, calculados offline a partir das interações dos utilizadores.
+
+Favoritos, watchlist e reviews formam uma matriz esparsa utilizador × filme
+(`scipy.sparse`, só as interações que existem), com um peso por tipo de
+interação (`PESOS`; nas reviews, proporcional à avaliação). Dois filmes são
+semelhantes quando as suas colunas apontam na mesma direção: a semelhança de
+cosseno é o produto das colunas normalizadas.
+
+O produto filme × filme completo não cabe em memória num catálogo grande, por
+isso é calculado em blocos de `bloco` filmes; de cada linha do bloco ficam só
+os `k` vizinhos mais fortes (`argpartition`, sem ordenar a linha inteira).
+As interações são lidas em streaming (`iterator()` + `np.fromiter`), sem
+criar um objeto Python por linha.
+
+O resultado substitui por inteiro a tabela `FilmeSemelhante`, de onde
+`/api/filmes/{slug}/similar/` lê os vizinhos de um filme com uma única query
+indexada. Corre pelo comando `calcular_semelhantes`.
+"""
+from __future__ import annotations
+
+from typing import Iterator
+
+import numpy as np
+from scipy import sparse
+
+from django.db import transaction
+
+from .cache import invalidar_catalogo
+from .models.listas import Favorito, Watchlist
+from .models.recomendacao import FilmeSemelhante
+from .models.review import Review
+
+# Peso de cada interação na matriz. Um utilizador que interage de várias formas
+# com o mesmo filme soma os pesos (as entradas repetidas somam-se no CSR).
+PESOS = {
+    "favorito": 2.0,
+    "watchlist": 1.0,
+    "review_por_estrela": 0.4,  # 1 estrela = 0.4 ... 5 estrelas = 2.0
+}
+
+K_PADRAO = 20
+BLOCO_PADRAO = 2000
+LOTE_ESCRITA = 5000
+CHUNK_LEITURA = 20000
+
+_INTERACAO = np.dtype([("utilizador", np.int64), ("filme", np.int64), ("peso", np.float32)])
+
+
+def _ler(linhas: Iterator[tuple]) -> np.ndarray:
+    return np.fromiter(linhas, dtype=_INTERACAO)
+
+
+def interacoes() -> np.ndarray:
+    """Todas as interações como um array estruturado `(utilizador, filme, peso)`."""
+    partes = [
+        _ler(
+            (u, f, PESOS["favorito"])
+            for u, f in Favorito.objects.order_by().values_list("utilizador_id", "filme_id").iterator(CHUNK_LEITURA)
+        ),
+        _ler(
+            (u, f, PESOS["watchlist"])
+            for u, f in Watchlist.objects.order_by().values_list("utilizador_id", "filme_id").iterator(CHUNK_LEITURA)
+        ),
+        _ler(
+            (u, f, r * PESOS["review_por_estrela"])
+            for u, f, r in Review.objects.order_by().values_list("autor_id", "filme_id", "rating").iterator(CHUNK_LEITURA)
+        ),
+    ]
+    return np.concatenate(partes)
+
+
+def matriz_interacoes(dados: np.ndarray | None = None) -> tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+    """
+    Constrói a matriz utilizador × filme. Devolve `(matriz, utilizador_ids,
+    filme_ids)`, onde a linha `i` é do utilizador `utilizador_ids[i]` e a
+    coluna `j` do filme `filme_ids[j]`.
+    """
+    if dados is None:
+        dados = interacoes()
+    utilizador_ids, linhas = np.unique(dados["utilizador"], return_inverse=True)
+    filme_ids, colunas = np.unique(dados["filme"], return_inverse=True)
+    matriz = sparse.csr_matrix(
+        (dados["peso"], (linhas, colunas)),
+        shape=(len(utilizador_ids), len(filme_ids)),
+        dtype=np.float32,
+    )
+    matriz.sum_duplicates()
+    return matriz, utilizador_ids, filme_ids
+
+
+def _normalizar_colunas(matriz: sparse.csr_matrix) -> sparse.csr_matrix:
+    normas = np.sqrt(np.asarray(matriz.multiply(matriz).sum(axis=0)).ravel())
+    normas[normas == 0] = 1.0
+    return (matriz @ sparse.diags((1.0 / normas).astype(np.float32))).tocsr()
+
+
+def vizinhos(matriz: sparse.csr_matrix, k: int = K_PADRAO, bloco: int = BLOCO_PADRAO) -> Iterator[tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Para cada coluna (filme) da matriz, produz `(coluna, colunas_vizinhas,
+    semelhancas)` com até `k` vizinhos, do mais para o menos semelhante.
+    Filmes sem nenhum vizinho não aparecem.
+    """
+    normalizada = _normalizar_colunas(matriz)
+    transposta = normalizada.T.tocsr()
+    total = transposta.shape[0]
+    for inicio in range(0, total, bloco):
+        produto = (transposta[inicio:inicio + bloco] @ normalizada).tocsr()
+        for i in range(produto.shape[0]):
+            coluna = inicio + i
+            de, ate = produto.indptr[i], produto.indptr[i + 1]
+            cols, sims = produto.indices[de:ate], produto.data[de:ate]
+            manter = (cols != coluna) & (sims > 0)
+            cols, sims = cols[manter], sims[manter]
+            if not len(cols):
+                continue
+            if len(cols) > k:
+                melhores = np.argpartition(-sims, k - 1)[:k]
+                cols, sims = cols[melhores], sims[melhores]
+            # Mais semelhante primeiro; empates pela coluna, para um resultado estável.
+            ordem = np.lexsort((cols, -sims))
+            yield coluna, cols[ordem], sims[ordem]
+
+
+def calcular(k: int = K_PADRAO, bloco: int = BLOCO_PADRAO) -> int:
+    """Recalcula e substitui a tabela de filmes semelhantes. Devolve o número de linhas escritas."""
+    dados = interacoes()
+    if not len(dados):
+        linhas = iter(())
+    else:
+        matriz, _, filme_ids = matriz_interacoes(dados)
+        linhas = (
+            FilmeSemelhante(
+                filme_id=int(filme_ids[coluna]),
+                semelhante_id=int(filme_ids[vizinho]),
+                posicao=posicao,
+                similaridade=round(float(semelhanca), 6),
+            )
+            for coluna, cols, sims in vizinhos(matriz, k=k, bloco=bloco)
+            for posicao, (vizinho, semelhanca) in enumerate(zip(cols, sims))
+        )
+
+    escritas = 0
+    with transaction.atomic():
+        FilmeSemelhante.objects.all().delete()
+        lote = []
+        for linha in linhas:
+            lote.append(linha)
+            if len(lote) >= LOTE_ESCRITA:
+                FilmeSemelhante.objects.bulk_create(lote)
+                escritas += len(lote)
+                lote = []
+        if lote:
+            FilmeSemelhante.objects.bulk_create(lote)
+            escritas += len(lote)
+        invalidar_catalogo()
+    return escritas
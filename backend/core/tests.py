@@ -18,6 +18,23 @@ from .models.review import Review
 # Esta é a forma recomendada pelo Django para referenciar o modelo de utilizador.
 User = get_user_model()
 
+
+class CatalogoTestCase(TestCase):
+    """
+    Base para os testes que usam a API do catálogo.
+
+    A cache de respostas e os seus contadores sobrevivem entre testes (a base
+    de dados não), por isso são limpos antes de cada um.
+    """
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .cache import reiniciar_estatisticas
+
+        cache.clear()
+        reiniciar_estatisticas()
+        super().setUp()
+
 class SignalTests(TestCase):
     """
     Conjunto de testes para os sinais (signals) relacionados com o modelo Review.
@@ -99,3 +116,2080 @@ class SignalTests(TestCase):
         # VERIFICAÇÃO: A média deve voltar a ser 10.0 e a contagem 1.
         self.assertEqual(self.filme.media_rating, 10.0)
         self.assertEqual(self.filme.reviews_count, 1)
+
+
+class CatalogoCursorPaginationTests(CatalogoTestCase):
+    """
+    Testes da paginação por cursor (keyset) do catálogo de filmes.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # Vários filmes com o mesmo rating e o mesmo título forçam o desempate
+        # pelos campos seguintes da ordenação (`titulo` e depois `id`).
+        for i in range(7):
+            Filme.objects.create(titulo=f"Filme {i % 3}", slug=f"filme-{i}", media_rating=float(i % 2))
+
+    def test_percorre_o_catalogo_sem_repetir_nem_saltar(self):
+        """
+        Seguir os links `next` devolve todos os filmes exatamente uma vez,
+        pela mesma ordem de `Filme.Meta.ordering` desempatada por `id`.
+        """
+        esperado = list(Filme.objects.order_by("-media_rating", "titulo", "id").values_list("slug", flat=True))
+
+        obtidos = []
+        url = "/api/filmes/?paginacao=cursor&page_size=3"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            obtidos += [f["slug"] for f in response.data["results"]]
+            url = response.data["next"]
+
+        self.assertEqual(obtidos, esperado)
+
+    def test_link_previous_devolve_a_pagina_anterior(self):
+        primeira = self.client.get("/api/filmes/?paginacao=cursor&page_size=3").data
+        segunda = self.client.get(primeira["next"]).data
+        anterior = self.client.get(segunda["previous"]).data
+        self.assertEqual(
+            [f["slug"] for f in anterior["results"]],
+            [f["slug"] for f in primeira["results"]],
+        )
+
+    def test_modo_cursor_nao_faz_count(self):
+        """
+        Cada página em modo cursor custa uma query para os filmes e outra
+        para o `prefetch_related('generos')`, sem `COUNT(*)`.
+        """
+        primeira = self.client.get("/api/filmes/?paginacao=cursor&page_size=2").data
+        with self.assertNumQueries(2):
+            self.client.get(primeira["next"])
+
+    def test_paginacao_por_numero_continua_a_ser_o_padrao(self):
+        response = self.client.get("/api/filmes/")
+        self.assertEqual(response.data["count"], 7)
+
+    def test_cursor_adulterado_devolve_404(self):
+        import base64
+        import json
+
+        for valores in (["abc", "F3", 4], [3.0, "F3", "x"], [None, "F3", 4], [3.0, "F3"], {"a": 1}):
+            cursor = base64.urlsafe_b64encode(json.dumps({"v": valores}).encode()).decode()
+            response = self.client.get(f"/api/filmes/?cursor={cursor}")
+            self.assertEqual(response.status_code, 404, valores)
+        self.assertEqual(self.client.get("/api/filmes/?cursor=nao-e-base64").status_code, 404)
+
+
+class PesquisaFilmesTests(CatalogoTestCase):
+    """
+    Testes do endpoint `/api/filmes/search/` e da manutenção do índice de texto.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.padrinho = Filme.objects.create(
+            titulo="O Padrinho", slug="o-padrinho",
+            descricao="A saga da família Corleone.",
+        )
+        self.outro = Filme.objects.create(
+            titulo="Cidade de Deus", slug="cidade-de-deus",
+            descricao="Um jovem fotógrafo cresce ao lado do padrinho do crime.",
+        )
+
+    def pesquisar(self, termo):
+        response = self.client.get("/api/filmes/search/", {"q": termo})
+        self.assertEqual(response.status_code, 200)
+        return [f["slug"] for f in response.data["results"]]
+
+    def test_titulo_tem_mais_peso_do_que_a_sinopse(self):
+        self.assertEqual(self.pesquisar("padrinho"), ["o-padrinho", "cidade-de-deus"])
+
+    def test_ultimo_termo_e_prefixo_e_acentos_sao_ignorados(self):
+        self.assertEqual(self.pesquisar("familia corl"), ["o-padrinho"])
+
+    def test_indice_acompanha_save_e_delete(self):
+        self.outro.titulo = "Pulp Fiction"
+        self.outro.descricao = ""
+        self.outro.save()
+        self.assertEqual(self.pesquisar("pulp"), ["cidade-de-deus"])
+        self.assertEqual(self.pesquisar("padrinho"), ["o-padrinho"])
+
+        self.padrinho.delete()
+        self.assertEqual(self.pesquisar("padrinho"), [])
+
+    def test_termo_demasiado_curto(self):
+        response = self.client.get("/api/filmes/search/", {"q": "a"})
+        self.assertEqual(response.status_code, 400)
+
+
+class AutocompleteTests(CatalogoTestCase):
+    """
+    Testes do índice de sugestões em memória e do endpoint `/api/autocomplete/`.
+    """
+
+    def setUp(self):
+        super().setUp()
+        from .autocomplete import indice
+        from .models.pessoa import Pessoa
+
+        self.indice = indice
+        Filme.objects.create(titulo="O Padrinho", slug="o-padrinho", media_rating=4.5)
+        Filme.objects.create(titulo="O Padrinho: Parte II", slug="o-padrinho-ii", media_rating=4.0)
+        Pessoa.objects.create(nome="Al Pacino", slug="al-pacino")
+        # Cada teste começa com o índice recarregado a partir da base de dados.
+        self.indice.carregar()
+
+    def sugerir(self, termo):
+        response = self.client.get("/api/autocomplete/", {"q": termo})
+        self.assertEqual(response.status_code, 200)
+        return [s["slug"] for s in response.data["results"]]
+
+    def test_prefixo_em_qualquer_palavra(self):
+        self.assertEqual(self.sugerir("padr"), ["o-padrinho", "o-padrinho-ii"])
+        self.assertEqual(self.sugerir("paci"), ["al-pacino"])
+
+    def test_tolera_erros_de_escrita(self):
+        self.assertIn("al-pacino", self.sugerir("paccino"))
+
+    def test_atualizado_pelos_sinais(self):
+        filme = Filme.objects.create(titulo="Pulp Fiction", slug="pulp-fiction")
+        self.assertEqual(self.sugerir("pulp"), ["pulp-fiction"])
+
+        filme.titulo = "Jackie Brown"
+        filme.save()
+        self.assertEqual(self.sugerir("pulp"), [])
+        self.assertEqual(self.sugerir("jackie"), ["pulp-fiction"])
+
+        filme.delete()
+        self.assertEqual(self.sugerir("jackie"), [])
+
+    def test_memoria_limitada_com_alteracoes_repetidas(self):
+        from .autocomplete import IndiceAutocomplete, TIPO_FILME
+
+        indice = IndiceAutocomplete(max_entradas=10, ttl=3600)
+        indice.carregar(filmes=iter([(i, f"Filme {i}", f"filme-{i}", 1.0) for i in range(20)]), pessoas=iter(()))
+        for versao in range(50):
+            indice.atualizar(TIPO_FILME, 1, f"Alien {versao}", f"alien-{versao}")
+            # Cada pedido compacta o índice se as entradas removidas ocuparem a folga.
+            self.assertEqual(indice.sugerir(f"alien {versao}")[0].slug, f"alien-{versao}")
+            self.assertLessEqual(len(indice._slots), 10)
+        self.assertEqual(indice.estatisticas()["entradas"], 9)
+        self.assertLessEqual(indice.estatisticas()["chaves"], 2 * 10)
+
+    def test_alteracoes_durante_o_primeiro_carregamento_nao_se_perdem(self):
+        from .autocomplete import IndiceAutocomplete, TIPO_PESSOA
+
+        indice = IndiceAutocomplete(ttl=3600)
+
+        def pessoas():
+            yield (1, "Al Pacino", "al-pacino")
+            indice.atualizar(TIPO_PESSOA, 2, "Robert De Niro", "robert-de-niro")
+            indice.remover(TIPO_PESSOA, 1)
+
+        indice.carregar(filmes=iter(()), pessoas=pessoas())
+        self.assertEqual([e.slug for e in indice.sugerir("niro")], ["robert-de-niro"])
+        self.assertEqual(indice.sugerir("pacino"), [])
+
+    def test_alteracoes_durante_o_carregamento_nao_se_perdem(self):
+        from .autocomplete import TIPO_PESSOA
+
+        def pessoas():
+            yield (1, "Al Pacino", "al-pacino")
+            # Chega um sinal enquanto o índice novo está a ser construído.
+            self.indice.atualizar(TIPO_PESSOA, 2, "Robert De Niro", "robert-de-niro")
+            self.assertEqual([e.slug for e in self.indice.sugerir("padr")][:1], ["o-padrinho"])
+
+        self.indice.carregar(filmes=iter([(1, "O Padrinho", "o-padrinho", 4.5)]), pessoas=pessoas())
+        self.assertEqual(self.sugerir("niro"), ["robert-de-niro"])
+
+
+class FacetasCatalogoTests(CatalogoTestCase):
+    """
+    Testes dos filtros do catálogo e das contagens de facetas mantidas
+    incrementalmente em `ContagemFaceta`.
+    """
+
+    def setUp(self):
+        super().setUp()
+        from .models.taxonomia import Genero
+
+        self.drama = Genero.objects.create(nome="Drama", slug="drama")
+        self.crime = Genero.objects.create(nome="Crime", slug="crime")
+        self.padrinho = Filme.objects.create(titulo="O Padrinho", slug="o-padrinho", ano_lancamento=1972, media_rating=4.6)
+        self.padrinho.generos.add(self.drama, self.crime)
+        self.forrest = Filme.objects.create(titulo="Forrest Gump", slug="forrest-gump", ano_lancamento=1994, media_rating=4.1)
+        self.forrest.generos.add(self.drama)
+        self.pulp = Filme.objects.create(titulo="Pulp Fiction", slug="pulp-fiction", ano_lancamento=1994, media_rating=3.9)
+        self.pulp.generos.add(self.crime)
+
+    def facetas(self, **params):
+        response = self.client.get("/api/filmes/facetas/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def assertContagensIguaisAReconstrucao(self):
+        """As contagens incrementais têm de coincidir com uma reconstrução completa."""
+        from . import facets
+        from .models.faceta import ContagemFaceta
+
+        def estado():
+            return sorted(
+                ContagemFaceta.objects.filter(total__gt=0)
+                .values_list("genero_id", "decada", "faixa_rating", "total")
+                , key=str)
+
+        incremental = estado()
+        facets.reconstruir()
+        self.assertEqual(incremental, estado())
+
+    def test_contagens_por_faceta(self):
+        dados = self.facetas()
+        self.assertEqual(
+            [(g["slug"], g["total"]) for g in dados["generos"]],
+            [("crime", 2), ("drama", 2)],
+        )
+        self.assertEqual([(d["decada"], d["total"]) for d in dados["decadas"]], [(1970, 1), (1990, 2)])
+        self.assertEqual([(f["faixa"], f["total"]) for f in dados["ratings"]], [(3, 1), (4, 2)])
+
+    def test_cada_faceta_ignora_o_seu_proprio_filtro(self):
+        dados = self.facetas(genero="drama", ano_min=1990)
+        self.assertEqual([(g["slug"], g["total"]) for g in dados["generos"]], [("crime", 1), ("drama", 1)])
+        self.assertEqual([(d["decada"], d["total"]) for d in dados["decadas"]], [(1970, 1), (1990, 1)])
+        self.assertEqual([(f["faixa"], f["total"]) for f in dados["ratings"]], [(4, 1)])
+
+    def test_consulta_so_le_a_tabela_de_contagens(self):
+        with self.assertNumQueries(3):
+            self.facetas(genero="crime", rating_min=4)
+
+    def test_lista_aplica_os_filtros(self):
+        response = self.client.get("/api/filmes/", {"genero": "crime", "rating_min": 4})
+        self.assertEqual([f["slug"] for f in response.data["results"]], ["o-padrinho"])
+        response = self.client.get("/api/filmes/", {"ano_min": "x"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejeita_avaliacoes_nao_finitas(self):
+        for valor in ("nan", "inf", "-inf"):
+            self.assertEqual(self.client.get("/api/filmes/facetas/", {"rating_min": valor}).status_code, 400)
+            self.assertEqual(self.client.get("/api/filmes/", {"rating_max": valor}).status_code, 400)
+
+    def test_manutencao_incremental(self):
+        self.forrest.media_rating = 2.5
+        self.forrest.save(update_fields=["media_rating"])
+        self.pulp.ano_lancamento = 2004
+        self.pulp.save(update_fields=["ano_lancamento"])
+        self.padrinho.generos.remove(self.crime)
+        self.crime.filmes.add(self.forrest)
+        self.drama.filmes.clear()
+        self.assertContagensIguaisAReconstrucao()
+
+        self.forrest.delete()
+        self.assertContagensIguaisAReconstrucao()
+
+
+class CatalogoCacheTests(CatalogoTestCase):
+    """
+    Testes da cache de respostas anónimas do catálogo e da sua invalidação.
+    """
+
+    def setUp(self):
+        super().setUp()
+        Filme.objects.create(titulo="O Padrinho", slug="o-padrinho")
+
+    def test_segundo_pedido_anonimo_nao_vai_a_base_de_dados(self):
+        primeira = self.client.get("/api/filmes/")
+        self.assertEqual(primeira["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            segunda = self.client.get("/api/filmes/")
+        self.assertEqual(segunda["X-Cache"], "HIT")
+        self.assertEqual(segunda.data, primeira.data)
+
+    def test_hit_nao_escreve_na_cache(self):
+        from unittest import mock
+        from django.core.cache import cache
+
+        self.client.get("/api/filmes/")
+        with mock.patch.object(cache, "incr") as incr, mock.patch.object(cache, "set") as guardar:
+            self.assertEqual(self.client.get("/api/filmes/")["X-Cache"], "HIT")
+        incr.assert_not_called()
+        guardar.assert_not_called()
+
+    def test_escritas_invalidam_a_cache(self):
+        self.client.get("/api/filmes/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Filme.objects.create(titulo="Pulp Fiction", slug="pulp-fiction")
+        response = self.client.get("/api/filmes/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["count"], 2)
+
+        self.client.get("/api/generos/")
+        with self.captureOnCommitCallbacks(execute=True):
+            from .models.taxonomia import Genero
+            Genero.objects.create(nome="Drama", slug="drama")
+        self.assertEqual(self.client.get("/api/generos/").data["count"], 1)
+
+    def test_pedidos_autenticados_nao_usam_a_cache(self):
+        user = User.objects.create_user(username="cinefilo", password="123", is_staff=True)
+        self.client.force_login(user)
+        self.assertNotIn("X-Cache", self.client.get("/api/filmes/"))
+
+        self.client.logout()
+        self.client.get("/api/filmes/")
+        self.client.get("/api/filmes/")
+        self.client.force_login(user)
+        stats = self.client.get("/api/cache/catalogo/").data
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+
+    def test_cache_por_processo_falha_a_verificacao_de_deploy(self):
+        from django.test import override_settings
+        from .checks import cache_partilhada
+
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([e.id for e in cache_partilhada(None)], ["core.E001"])
+        partilhada = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "cache"}}
+        with override_settings(CACHES=partilhada):
+            self.assertEqual(cache_partilhada(None), [])
+
+
+class PedidosCondicionaisTests(CatalogoTestCase):
+    """
+    Testes de ETag / Last-Modified e das respostas `304 Not Modified`.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.filme = Filme.objects.create(titulo="O Padrinho", slug="o-padrinho")
+        # Autenticado, para testar o caminho sem a cache de respostas.
+        self.user = User.objects.create_user(username="cinefilo", password="123")
+        self.client.force_login(self.user)
+
+    def test_detalhe_responde_304_sem_serializar(self):
+        response = self.client.get("/api/filmes/o-padrinho/")
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        # Sessão e utilizador, mais uma única query ao filme: o `updated_at` pelo slug.
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/filmes/o-padrinho/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_etag_muda_com_os_generos(self):
+        from .models.taxonomia import Genero
+
+        etag = self.client.get("/api/filmes/o-padrinho/")["ETag"]
+        self.filme.generos.add(Genero.objects.create(nome="Drama", slug="drama"))
+        response = self.client.get("/api/filmes/o-padrinho/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_lista_responde_304_ate_haver_alteracoes(self):
+        etag = self.client.get("/api/filmes/")["ETag"]
+        self.assertEqual(self.client.get("/api/filmes/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Filme.objects.create(titulo="Pulp Fiction", slug="pulp-fiction")
+        self.assertEqual(self.client.get("/api/filmes/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_hit_da_cache_anonima_tambem_responde_304(self):
+        self.client.logout()
+        etag = self.client.get("/api/filmes/o-padrinho/")["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/filmes/o-padrinho/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class EstadoListasEmLoteTests(CatalogoTestCase):
+    """
+    Testes do estado de watchlist/favoritos para vários filmes de uma vez.
+    """
+
+    def setUp(self):
+        super().setUp()
+        from .models.listas import Watchlist, Favorito
+
+        self.filmes = [
+            Filme.objects.create(titulo=f"Filme {i}", slug=f"filme-{i}", media_rating=i)
+            for i in range(5)
+        ]
+        self.user = User.objects.create_user(username="cinefilo", password="123")
+        Watchlist.objects.create(utilizador=self.user, filme=self.filmes[0])
+        Favorito.objects.create(utilizador=self.user, filme=self.filmes[1])
+        Favorito.objects.create(utilizador=self.user, filme=self.filmes[0])
+        self.client.force_login(self.user)
+
+    def test_estado_por_ids_em_duas_queries(self):
+        ids = ",".join(str(f.pk) for f in self.filmes)
+        # Sessão e utilizador, mais uma query por lista (depois disso, vêm da cache).
+        with self.assertNumQueries(4):
+            response = self.client.get(f"/api/filmes/status/?ids={ids}")
+        with self.assertNumQueries(2):
+            self.client.get(f"/api/filmes/status/?ids={ids}")
+        self.assertEqual(response.status_code, 200)
+        resultados = response.json()["results"]
+        self.assertEqual(len(resultados), 5)
+        self.assertEqual(resultados[str(self.filmes[0].pk)], {"in_watchlist": True, "is_favorite": True})
+        self.assertEqual(resultados[str(self.filmes[1].pk)], {"in_watchlist": False, "is_favorite": True})
+        self.assertEqual(resultados[str(self.filmes[2].pk)], {"in_watchlist": False, "is_favorite": False})
+
+    def test_estado_por_slugs_no_corpo(self):
+        self.client.get("/api/filmes/status/?slugs=filme-0")
+        # Só a resolução dos slugs: as listas já estão em cache.
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                "/api/filmes/status/", {"slugs": ["filme-0", "filme-3"]}, content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], {
+            "filme-0": {"in_watchlist": True, "is_favorite": True},
+            "filme-3": {"in_watchlist": False, "is_favorite": False},
+        })
+
+    def test_anonimo_nao_faz_queries(self):
+        self.client.logout()
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/filmes/status/?slugs=filme-0")
+        self.assertEqual(response.json()["results"], {"filme-0": {"in_watchlist": False, "is_favorite": False}})
+
+    def test_pedidos_invalidos(self):
+        self.assertEqual(self.client.get("/api/filmes/status/").status_code, 400)
+        self.assertEqual(self.client.get("/api/filmes/status/?ids=abc").status_code, 400)
+        ids = ",".join(str(i) for i in range(101))
+        self.assertEqual(self.client.get(f"/api/filmes/status/?ids={ids}").status_code, 400)
+
+    def test_corpos_post_invalidos(self):
+        for corpo in ({"slugs": [1, {"x": 1}]}, [1, 2], {"ids": ["abc"]}, {"ids": {"a": 1}}, {"slugs": []}, {"ids": [True]}, {"ids": [2**70]}):
+            with self.subTest(corpo=corpo):
+                response = self.client.post("/api/filmes/status/", corpo, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+
+    def test_lista_com_estado_do_utilizador(self):
+        response = self.client.get("/api/filmes/?include=status")
+        self.assertEqual(response.status_code, 200)
+        # A resposta depende do utilizador: não leva validadores.
+        self.assertNotIn("ETag", response)
+        por_slug = {f["slug"]: f for f in response.json()["results"]}
+        self.assertTrue(por_slug["filme-0"]["in_watchlist"])
+        self.assertTrue(por_slug["filme-1"]["is_favorite"])
+        self.assertFalse(por_slug["filme-4"]["in_watchlist"])
+
+        # Sem `include`, a lista mantém o formato de sempre.
+        self.assertNotIn("in_watchlist", self.client.get("/api/filmes/").json()["results"][0])
+
+    def test_estado_na_lista_nao_custa_queries_com_a_cache(self):
+        self.client.get("/api/filmes/?include=status&paginacao=cursor")
+        with self.assertNumQueries(4):
+            self.client.get("/api/filmes/?paginacao=cursor")
+        with self.assertNumQueries(4):
+            self.client.get("/api/filmes/?include=status&paginacao=cursor")
+
+    def test_toggles_descartam_a_cache(self):
+        from django.core.cache import cache
+        from . import membership
+
+        self.client.get(f"/api/filmes/{self.filmes[2].slug}/status/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/filmes/{self.filmes[2].slug}/toggle_watchlist/")
+            self.client.post(f"/api/filmes/{self.filmes[0].slug}/toggle_favorite/")
+        self.assertIsNone(cache.get(membership._chave(self.user.pk, membership.WATCHLIST)))
+
+        # Recarregadas da base de dados na próxima leitura.
+        listas = membership.ids_das_listas(self.user.pk)
+        self.assertEqual(list(listas[membership.WATCHLIST]), sorted([self.filmes[0].pk, self.filmes[2].pk]))
+        self.assertEqual(list(listas[membership.FAVORITOS]), [self.filmes[1].pk])
+
+        # Sessão, utilizador e o filme pelo slug; o estado vem da cache.
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/api/filmes/{self.filmes[2].slug}/status/")
+        self.assertEqual(response.json(), {"in_watchlist": True, "is_favorite": False})
+
+    def test_escrita_desfeita_nao_chega_a_cache(self):
+        from django.db import transaction
+        from . import membership
+        from .models.listas import Watchlist
+
+        membership.ids_das_listas(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Watchlist.objects.create(utilizador=self.user, filme=self.filmes[4])
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertFalse(membership.estado_listas(self.user, [self.filmes[4].pk])[self.filmes[4].pk]["in_watchlist"])
+
+
+class AlterarListasTests(CatalogoTestCase):
+    """
+    Testes das escritas idempotentes na watchlist e nos favoritos.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.filmes = [Filme.objects.create(titulo=f"Filme {i}", slug=f"filme-{i}") for i in range(4)]
+        self.user = User.objects.create_user(username="cinefilo", password="123")
+        self.client.force_login(self.user)
+
+    def ids_na_watchlist(self):
+        from .models.listas import Watchlist
+
+        return sorted(Watchlist.objects.filter(utilizador=self.user).values_list("filme_id", flat=True))
+
+    def test_put_e_delete_sao_idempotentes(self):
+        url = "/api/filmes/filme-0/watchlist/"
+        # Sessão e utilizador, mais uma única instrução.
+        with self.assertNumQueries(3):
+            response = self.client.put(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"in_watchlist": True})
+        self.assertEqual(self.client.put(url).status_code, 200)
+        self.assertEqual(self.ids_na_watchlist(), [self.filmes[0].pk])
+
+        with self.assertNumQueries(3):
+            response = self.client.delete(url)
+        self.assertEqual(response.json(), {"in_watchlist": False})
+        self.assertEqual(self.client.delete(url).status_code, 200)
+        self.assertEqual(self.ids_na_watchlist(), [])
+
+    def test_filme_inexistente_responde_404(self):
+        self.assertEqual(self.client.put("/api/filmes/nao-existe/favorite/").status_code, 404)
+        self.assertEqual(self.client.post("/api/filmes/nao-existe/toggle_watchlist/").status_code, 404)
+
+    def test_toggle_repetido_nao_falha(self):
+        from .models.listas import Watchlist
+
+        # Um duplo clique em que o segundo pedido já encontra a linha criada.
+        Watchlist.objects.create(utilizador=self.user, filme=self.filmes[1])
+        response = self.client.post("/api/filmes/filme-1/toggle_watchlist/")
+        self.assertEqual(response.json(), {"in_watchlist": False})
+        response = self.client.post("/api/filmes/filme-1/toggle_watchlist/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"in_watchlist": True})
+
+    def test_lote_adiciona_e_remove_numa_instrucao(self):
+        ids = [f.pk for f in self.filmes[:3]]
+        with self.assertNumQueries(3):
+            response = self.client.put("/api/watchlist/lote/", {"filmes": ids + [999999]}, content_type="application/json")
+        self.assertEqual(sorted(response.json()["added"]), ids)
+
+        response = self.client.put("/api/watchlist/lote/", {"filmes": ids}, content_type="application/json")
+        self.assertEqual(response.json()["added"], [])
+
+        response = self.client.delete(
+            "/api/watchlist/lote/", {"filmes": [ids[0], self.filmes[3].pk]}, content_type="application/json",
+        )
+        self.assertEqual(response.json()["removed"], [ids[0]])
+        self.assertEqual(self.ids_na_watchlist(), ids[1:])
+
+        self.assertEqual(
+            self.client.put("/api/favoritos/lote/", {"filmes": "x"}, content_type="application/json").status_code, 400,
+        )
+
+    def test_ids_invalidos_no_lote(self):
+        for corpo in ({"filmes": [2**70]}, {"filmes": [True]}, {"filmes": [0]}, {"filmes": []}, [1, 2], {"filmes": list(range(1, 102))}):
+            with self.subTest(corpo=corpo):
+                response = self.client.put("/api/watchlist/lote/", corpo, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.ids_na_watchlist(), [])
+
+    def test_escritas_atualizam_a_cache(self):
+        from . import membership
+
+        membership.ids_das_listas(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put("/api/favoritos/lote/", {"filmes": [self.filmes[2].pk, self.filmes[0].pk]}, content_type="application/json")
+            self.client.delete("/api/filmes/filme-2/favorite/")
+        self.assertEqual(list(membership.ids_das_listas(self.user.pk)[membership.FAVORITOS]), [self.filmes[0].pk])
+
+    def test_alternativa_sem_returning(self):
+        from unittest import mock
+        from . import membership
+
+        with mock.patch.object(membership, "_suporta_returning", return_value=False):
+            self.assertEqual(membership.adicionar(self.user.pk, membership.WATCHLIST, [self.filmes[0].pk, 999999]), [self.filmes[0].pk])
+            self.assertEqual(membership.adicionar(self.user.pk, membership.WATCHLIST, slug="filme-0"), [])
+            self.assertEqual(membership.remover(self.user.pk, membership.WATCHLIST, slug="filme-0"), [self.filmes[0].pk])
+        self.assertEqual(self.ids_na_watchlist(), [])
+
+
+class FeedReviewsTests(CatalogoTestCase):
+    """
+    Testes do feed de reviews paginado por cursor.
+    """
+
+    def setUp(self):
+        super().setUp()
+        from datetime import timedelta
+        from django.utils import timezone
+
+        self.filme = Filme.objects.create(titulo="O Padrinho", slug="o-padrinho")
+        self.autores = [User.objects.create(username=f"critico{i}") for i in range(7)]
+        agora = timezone.now()
+        # `bulk_create` não passa pelos sinais de `Review`.
+        Review.objects.bulk_create([
+            Review(filme=self.filme, autor=autor, texto=f"Texto {i}", rating=4, spoiler=i % 3 == 0)
+            for i, autor in enumerate(self.autores)
+        ])
+        for i, review in enumerate(Review.objects.order_by("id")):
+            Review.objects.filter(pk=review.pk).update(created_at=agora - timedelta(minutes=i))
+
+    def percorrer(self, url):
+        ids = []
+        while url:
+            dados = self.client.get(url).json()
+            ids += [r["id"] for r in dados["results"]]
+            url = dados["next"]
+        return ids
+
+    def test_paginas_por_cursor_com_numero_constante_de_queries(self):
+        url = "/api/filmes/o-padrinho/reviews/?page_size=2"
+        # O filme pelo slug e uma página de reviews já com os autores.
+        with self.assertNumQueries(2):
+            dados = self.client.get(url).json()
+        self.assertEqual(len(dados["results"]), 2)
+        self.assertEqual(dados["results"][0]["autor"]["username"], "critico0")
+        with self.assertNumQueries(2):
+            self.client.get(dados["next"])
+
+        esperados = list(Review.objects.filter(filme=self.filme).order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(self.percorrer(url), esperados)
+
+    def test_filtro_de_spoilers(self):
+        sem = self.client.get("/api/filmes/o-padrinho/reviews/?spoiler=0").json()["results"]
+        com = self.client.get("/api/filmes/o-padrinho/reviews/?spoiler=1").json()["results"]
+        self.assertEqual(len(sem) + len(com), 7)
+        self.assertTrue(all(not r["spoiler"] for r in sem))
+        self.assertTrue(all(r["spoiler"] for r in com))
+        self.assertEqual(self.client.get("/api/filmes/o-padrinho/reviews/?spoiler=talvez").status_code, 400)
+
+    def test_minha_review_primeiro(self):
+        autor = self.autores[5]
+        self.client.force_login(autor)
+        url = "/api/filmes/o-padrinho/reviews/?page_size=3&minha_primeiro=1"
+        # Sessão e utilizador, o filme, a página e a review do utilizador.
+        with self.assertNumQueries(5):
+            dados = self.client.get(url).json()
+        self.assertEqual(dados["results"][0]["autor"]["username"], "critico5")
+
+        # A review do utilizador não se repete nas páginas seguintes.
+        ids = self.percorrer(url)
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(len(set(ids)), 7)
+
+    def test_filme_inexistente(self):
+        self.assertEqual(self.client.get("/api/filmes/nao-existe/reviews/").status_code, 404)
+
+
+class DetalheCompostoTests(CatalogoTestCase):
+    """
+    Testes do detalhe do filme com coleções (`/api/filmes/{slug}/?include=...`).
+    """
+
+    INCLUDES = "reviews,status,credits,videos"
+
+    def setUp(self):
+        super().setUp()
+        from .models.elenco import Elenco
+        from .models.listas import Watchlist
+        from .models.pessoa import Pessoa
+        from .models.taxonomia import Genero
+        from .models.video import Video
+
+        self.filme = Filme.objects.create(titulo="Heat", slug="heat", ano_lancamento=1995)
+        self.filme.generos.add(Genero.objects.create(nome="Crime", slug="crime"))
+        self.autores = [User.objects.create(username=f"critico{i}") for i in range(5)]
+        Review.objects.bulk_create([
+            Review(filme=self.filme, autor=autor, texto=f"Texto {i}", rating=4) for i, autor in enumerate(self.autores)
+        ])
+        pessoas = [Pessoa.objects.create(nome=f"Pessoa {i}", slug=f"pessoa-{i}") for i in range(3)]
+        Elenco.objects.bulk_create([
+            Elenco(filme=self.filme, pessoa=pessoa, papel="Actor", ordem_credito=i) for i, pessoa in enumerate(pessoas)
+        ])
+        Video.objects.create(filme=self.filme, titulo="Trailer", key="abc")
+        Watchlist.objects.create(utilizador=self.autores[0], filme=self.filme)
+
+    def test_todas_as_colecoes_numa_resposta(self):
+        # O filme, os géneros e uma query por coleção (o estado anónimo não custa nenhuma).
+        with self.assertNumQueries(5):
+            response = self.client.get(f"/api/filmes/heat/?include={self.INCLUDES}&page_size=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+        dados = response.json()
+        self.assertEqual((dados["titulo"], dados["generos"][0]["slug"]), ("Heat", "crime"))
+        self.assertEqual((dados["in_watchlist"], dados["is_favorite"]), (False, False))
+        self.assertEqual(len(dados["reviews"]["results"]), 2)
+        self.assertIn("/api/filmes/heat/reviews/?", dados["reviews"]["next"])
+        self.assertIn("page_size=2", dados["reviews"]["next"])
+        self.assertEqual([c["pessoa"]["slug"] for c in dados["credits"]["results"]], ["pessoa-0", "pessoa-1", "pessoa-2"])
+        self.assertEqual(dados["videos"]["results"][0]["key"], "abc")
+
+        # O link `next` continua o feed de reviews sem repetir nenhuma.
+        seguinte = self.client.get(dados["reviews"]["next"]).json()
+        ids = [r["id"] for r in dados["reviews"]["results"] + seguinte["results"]]
+        self.assertEqual(len(set(ids)), 4)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(f"/api/filmes/heat/?include={self.INCLUDES}&page_size=2")["X-Cache"], "HIT")
+
+    def test_numero_de_queries_nao_depende_das_colecoes(self):
+        from .models.elenco import Elenco
+        from .models.pessoa import Pessoa
+        from .models.video import Video
+
+        pessoas = [Pessoa.objects.create(nome=f"Extra {i}", slug=f"extra-{i}") for i in range(20)]
+        Elenco.objects.bulk_create([Elenco(filme=self.filme, pessoa=p, papel="Actor", ordem_credito=10) for p in pessoas])
+        for i in range(5):
+            Video.objects.create(filme=self.filme, titulo=f"Clip {i}", key=f"k{i}")
+        with self.assertNumQueries(5):
+            dados = self.client.get(f"/api/filmes/heat/?include={self.INCLUDES}").json()
+        self.assertEqual((len(dados["credits"]["results"]), len(dados["videos"]["results"])), (23, 6))
+
+    def test_estado_e_review_do_utilizador(self):
+        self.client.force_login(self.autores[3])
+        response = self.client.get("/api/filmes/heat/?include=reviews,status&minha_primeiro=1")
+        dados = response.json()
+        self.assertEqual(dados["reviews"]["results"][0]["autor"]["username"], "critico3")
+        self.assertFalse(dados["in_watchlist"])
+        self.assertNotIn("credits", dados)
+
+        self.client.force_login(self.autores[0])
+        self.assertTrue(self.client.get("/api/filmes/heat/?include=status").json()["in_watchlist"])
+
+    def test_sem_include_nada_muda(self):
+        response = self.client.get("/api/filmes/heat/?include=outra")
+        self.assertIn("ETag", response)
+        self.assertNotIn("reviews", response.json())
+        self.assertEqual(self.client.get("/api/filmes/nao-existe/?include=reviews").status_code, 404)
+
+    def test_editar_review_invalida_a_cache(self):
+        url = "/api/filmes/heat/?include=reviews"
+        self.client.get(url)
+        review = Review.objects.get(autor=self.autores[0])
+        review.texto = "Revisto"
+        with self.captureOnCommitCallbacks(execute=True):
+            review.save()
+        textos = [r["texto"] for r in self.client.get(url).json()["reviews"]["results"]]
+        self.assertIn("Revisto", textos)
+
+
+class AgregadosRatingTests(CatalogoTestCase):
+    """
+    Testes dos agregados de avaliações mantidos por incrementos.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.filme = Filme.objects.create(titulo="O Padrinho", slug="o-padrinho", ano_lancamento=1972)
+        self.outro = Filme.objects.create(titulo="Pulp Fiction", slug="pulp-fiction", ano_lancamento=1994)
+        self.autores = [User.objects.create(username=f"critico{i}") for i in range(3)]
+
+    def test_criar_review_nao_agrega_as_reviews_do_filme(self):
+        Review.objects.create(filme=self.filme, autor=self.autores[0], texto="a", rating=4)
+        # O INSERT e um único UPDATE ao filme.
+        with self.assertNumQueries(2):
+            Review.objects.create(filme=self.filme, autor=self.autores[1], texto="b", rating=3)
+        self.filme.refresh_from_db()
+        self.assertEqual((self.filme.rating_sum, self.filme.reviews_count, self.filme.media_rating), (7, 2, 3.5))
+
+    def test_review_que_muda_de_filme(self):
+        review = Review.objects.create(filme=self.filme, autor=self.autores[0], texto="a", rating=4)
+        review.filme = self.outro
+        review.rating = 2
+        review.save()
+        self.filme.refresh_from_db()
+        self.outro.refresh_from_db()
+        self.assertEqual((self.filme.rating_sum, self.filme.reviews_count, self.filme.media_rating), (0, 0, 0.0))
+        self.assertEqual((self.outro.rating_sum, self.outro.reviews_count, self.outro.media_rating), (2, 1, 2.0))
+
+    def test_gravar_instancia_antiga_do_filme_nao_repoe_os_agregados(self):
+        antigo = Filme.objects.get(pk=self.filme.pk)
+        Review.objects.create(filme=self.filme, autor=self.autores[0], texto="a", rating=5)
+        antigo.descricao = "Nova sinopse"
+        with self.assertRaises(ValueError):
+            antigo.save()
+        antigo.save(update_fields=["descricao"])
+        self.filme.refresh_from_db()
+        self.assertEqual((self.filme.rating_sum, self.filme.reviews_count, self.filme.media_rating), (5, 1, 5.0))
+        self.assertEqual(self.filme.descricao, "Nova sinopse")
+
+    def test_save_completo_grava_a_media_de_um_filme_sem_reviews(self):
+        # Todo o campo que a aplicação mantém sozinha (não editável) é verificado.
+        nao_editaveis = {
+            f.name for f in Filme._meta.concrete_fields
+            if not f.editable and not f.primary_key and f.name not in ("created_at", "updated_at")
+        }
+        self.assertEqual(nao_editaveis, set(Filme.CAMPOS_DERIVADOS))
+
+        # Sem reviews, `media_rating` é a média do IMDb e um `save()` normal grava-a.
+        self.filme.media_rating = 8.7
+        self.filme.save()
+        self.assertEqual(Filme.objects.values_list("media_rating", flat=True).get(pk=self.filme.pk), 8.7)
+
+        # Uma instância cuja linha foi apagada volta a ser inserida, com todos os campos.
+        antigo = Filme.objects.get(pk=self.filme.pk)
+        antigo.reviews_count, antigo.rating_sum, antigo.media_rating = 1, 4, 4.0
+        Filme.objects.filter(pk=self.filme.pk).delete()
+        antigo.save()
+        self.assertEqual(
+            Filme.objects.filter(pk=self.filme.pk).values_list("reviews_count", "rating_sum", "media_rating").get(),
+            (1, 4, 4.0),
+        )
+
+    def test_api_grava_so_os_campos_enviados(self):
+        from .models.taxonomia import Genero
+
+        drama = Genero.objects.create(nome="Drama", slug="drama")
+        Review.objects.create(filme=self.filme, autor=self.autores[0], texto="a", rating=5)
+        self.client.force_login(self.autores[1])
+        response = self.client.patch(
+            f"/api/filmes/{self.filme.slug}/", {"descricao": "Nova sinopse", "generos": [drama.pk]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.filme.refresh_from_db()
+        self.assertEqual((self.filme.rating_sum, self.filme.reviews_count, self.filme.media_rating), (5, 1, 5.0))
+        self.assertEqual(self.filme.descricao, "Nova sinopse")
+        self.assertEqual(list(self.filme.generos.all()), [drama])
+
+    def test_admin_grava_a_media_editada(self):
+        admin = User.objects.create_superuser(username="admin", password="123")
+        self.client.force_login(admin)
+        response = self.client.post(f"/admin/core/filme/{self.filme.pk}/change/", {
+            "titulo": "O Padrinho", "slug": "o-padrinho", "ano_lancamento": 1972, "media_rating": 7.5,
+            **{f"{prefixo}-{campo}": 0 for prefixo in ("creditos", "videos") for campo in ("TOTAL_FORMS", "INITIAL_FORMS")},
+        })
+        self.assertEqual(response.status_code, 302, getattr(response, "context", None) and response.context["errors"])
+        self.filme.refresh_from_db()
+        self.assertEqual(self.filme.media_rating, 7.5)
+
+    def test_facetas_acompanham_a_media_depois_do_commit(self):
+        from .models.faceta import ContagemFaceta
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(filme=self.filme, autor=self.autores[0], texto="a", rating=4)
+        self.assertEqual(
+            ContagemFaceta.objects.get(genero__isnull=True, decada=1970, faixa_rating=4).total, 1,
+        )
+
+    def test_reconciliar_corrige_desvios(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        Review.objects.create(filme=self.filme, autor=self.autores[0], texto="a", rating=4)
+        # Escritas que não passam pelos sinais.
+        Review.objects.bulk_create([Review(filme=self.filme, autor=self.autores[1], texto="b", rating=2)])
+        Filme.objects.filter(pk=self.outro.pk).update(reviews_count=3, rating_sum=9)
+
+        saida = StringIO()
+        call_command("reconcile_ratings", "--dry-run", stdout=saida)
+        self.assertIn("2 filmes com desvios", saida.getvalue())
+        self.filme.refresh_from_db()
+        self.assertEqual(self.filme.reviews_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("reconcile_ratings", stdout=StringIO())
+        self.filme.refresh_from_db()
+        self.outro.refresh_from_db()
+        self.assertEqual((self.filme.rating_sum, self.filme.reviews_count, self.filme.media_rating), (6, 2, 3.0))
+        self.assertEqual((self.outro.rating_sum, self.outro.reviews_count, self.outro.media_rating), (0, 0, 0.0))
+
+        saida = StringIO()
+        call_command("reconcile_ratings", stdout=saida)
+        self.assertIn("Nenhum desvio", saida.getvalue())
+
+    def test_filme_sem_reviews_mantem_a_media_importada(self):
+        from . import ratings
+
+        Filme.objects.filter(pk=self.outro.pk).update(media_rating=8.9)
+        self.assertEqual(ratings.reconciliar(), [])
+
+
+class AgregadosEmLoteTests(CatalogoTestCase):
+    """
+    Testes do trabalho adiado para o commit e do recálculo em bloco.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.filmes = [
+            Filme.objects.create(titulo=f"Filme {i}", slug=f"filme-{i}", ano_lancamento=2000 + i) for i in range(3)
+        ]
+        self.autores = [User.objects.create(username=f"critico{i}") for i in range(4)]
+
+    def agregados(self, filme):
+        filme.refresh_from_db()
+        return filme.rating_sum, filme.reviews_count, filme.media_rating
+
+    def test_propagacao_uma_vez_por_transacao(self):
+        from unittest import mock
+        from . import ratings
+
+        with mock.patch.object(ratings, "propagar") as propagar:
+            with self.captureOnCommitCallbacks(execute=True):
+                for autor in self.autores:
+                    for filme in self.filmes[:2]:
+                        Review.objects.create(filme=filme, autor=autor, texto="x", rating=3)
+        propagar.assert_called_once()
+        self.assertEqual(sorted(propagar.call_args.args[0]), [self.filmes[0].pk, self.filmes[1].pk])
+
+    def test_apagar_utilizador_em_cascata(self):
+        from unittest import mock
+        from . import ratings
+
+        for filme, rating in zip(self.filmes, (5, 4, 1)):
+            Review.objects.create(filme=filme, autor=self.autores[0], texto="x", rating=rating)
+            Review.objects.create(filme=filme, autor=self.autores[1], texto="x", rating=3)
+
+        with mock.patch.object(ratings, "propagar") as propagar:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.autores[0].delete()
+        propagar.assert_called_once()
+        for filme in self.filmes:
+            self.assertEqual(self.agregados(filme), (3, 1, 3.0))
+
+    def verificar_importacao(self):
+        from . import ratings
+
+        Review.objects.create(filme=self.filmes[0], autor=self.autores[0], texto="x", rating=5)
+        Filme.objects.filter(pk=self.filmes[2].pk).update(media_rating=8.5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with ratings.agregados_suspensos() as afetados:
+                Review.objects.filter(filme=self.filmes[0]).delete()
+                novas = [
+                    Review(filme=self.filmes[1], autor=autor, texto="x", rating=rating)
+                    for autor, rating in zip(self.autores, (1, 2, 4, 5))
+                ]
+                Review.objects.bulk_create(novas)
+                afetados.update(r.filme_id for r in novas)
+                afetados.add(self.filmes[2].pk)
+                # Nada foi recalculado ainda.
+                self.assertEqual(self.agregados(self.filmes[0]), (5, 1, 5.0))
+
+        self.assertEqual(self.agregados(self.filmes[0]), (0, 0, 0.0))
+        self.assertEqual(self.agregados(self.filmes[1]), (12, 4, 3.0))
+        # Sem reviews, antes e depois: mantém a média importada.
+        self.assertEqual(self.agregados(self.filmes[2]), (0, 0, 8.5))
+        self.assertEqual(ratings.reconciliar(corrigir=False), [])
+
+    def test_importacao_com_update_from(self):
+        self.verificar_importacao()
+
+    def test_importacao_sem_update_from(self):
+        from unittest import mock
+        from . import ratings
+
+        with mock.patch.object(ratings, "_suporta_update_from", return_value=False):
+            self.verificar_importacao()
+
+    def test_importacao_interrompida_nao_recalcula(self):
+        from unittest import mock
+        from . import ratings
+
+        with mock.patch.object(ratings, "recalcular") as recalcular:
+            with self.assertRaises(RuntimeError):
+                with ratings.agregados_suspensos() as afetados:
+                    afetados.add(self.filmes[0].pk)
+                    raise RuntimeError
+        recalcular.assert_not_called()
+        self.assertIsNone(ratings.suspensos())
+
+
+class HistogramaRatingsTests(CatalogoTestCase):
+    """
+    Testes do histograma de estrelas de cada filme.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.filme = Filme.objects.create(titulo="O Padrinho", slug="o-padrinho")
+        self.autores = [User.objects.create(username=f"critico{i}") for i in range(4)]
+
+    def histograma(self):
+        return Filme.objects.values_list(*Filme.CAMPOS_HISTOGRAMA).get(pk=self.filme.pk)
+
+    def test_histograma_acompanha_as_reviews(self):
+        reviews = [
+            Review.objects.create(filme=self.filme, autor=autor, texto="x", rating=rating)
+            for autor, rating in zip(self.autores, (5, 5, 3, 1))
+        ]
+        self.assertEqual(self.histograma(), (1, 0, 1, 0, 2))
+
+        reviews[0].rating = 2
+        reviews[0].save()
+        reviews[3].delete()
+        self.assertEqual(self.histograma(), (0, 1, 1, 0, 1))
+
+        # Editar só o texto não toca no filme.
+        reviews[1].texto = "Outra opinião"
+        with self.assertNumQueries(2):
+            reviews[1].save()
+
+    def test_detalhe_expoe_a_distribuicao_sem_queries_extra(self):
+        Review.objects.create(filme=self.filme, autor=self.autores[0], texto="x", rating=4)
+        # Os validadores, o filme e os géneros: o mesmo que sem o histograma.
+        with self.assertNumQueries(3):
+            dados = self.client.get("/api/filmes/o-padrinho/").json()
+        self.assertEqual(dados["distribuicao_ratings"], {"1": 0, "2": 0, "3": 0, "4": 1, "5": 0})
+        self.assertEqual(dados["reviews_count"], 1)
+
+    def test_reconstrucao_a_partir_de_uma_agregacao(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from . import ratings
+
+        Review.objects.bulk_create([
+            Review(filme=self.filme, autor=autor, texto="x", rating=rating)
+            for autor, rating in zip(self.autores, (4, 4, 2, 5))
+        ])
+        self.assertEqual(ratings.reconciliar(corrigir=False), [self.filme.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("reconcile_ratings", "--rebuild", stdout=StringIO())
+        self.assertEqual(self.histograma(), (0, 1, 0, 2, 1))
+        self.filme.refresh_from_db()
+        self.assertEqual((self.filme.rating_sum, self.filme.reviews_count, self.filme.media_rating), (15, 4, 3.75))
+        self.assertEqual(ratings.reconciliar(corrigir=False), [])
+
+
+class ScoreBayesianoTests(CatalogoTestCase):
+    """
+    Testes do score bayesiano e do ranking `/api/filmes/top/`.
+    """
+
+    def setUp(self):
+        super().setUp()
+        from .models.taxonomia import Genero
+
+        self.drama = Genero.objects.create(nome="Drama", slug="drama")
+        self.autores = [User.objects.create(username=f"critico{i}") for i in range(12)]
+        self.classico = Filme.objects.create(titulo="O Padrinho", slug="o-padrinho")
+        self.novidade = Filme.objects.create(titulo="Estreia", slug="estreia")
+        self.mediano = Filme.objects.create(titulo="Mediano", slug="mediano")
+        self.classico.generos.add(self.drama)
+        self.mediano.generos.add(self.drama)
+
+        for autor in self.autores:
+            Review.objects.create(filme=self.classico, autor=autor, texto="x", rating=4)
+        Review.objects.create(filme=self.novidade, autor=self.autores[0], texto="x", rating=5)
+        for autor in self.autores[:6]:
+            Review.objects.create(filme=self.mediano, autor=autor, texto="x", rating=2)
+
+    def slugs(self, url):
+        return [f["slug"] for f in self.client.get(url).json()["results"]]
+
+    def test_poucas_avaliacoes_nao_lideram_o_ranking(self):
+        from . import ratings
+
+        ratings.atualizar_scores()
+        self.assertEqual(self.slugs("/api/filmes/top/"), ["o-padrinho", "estreia", "mediano"])
+        # Pela média simples, a estreia com uma única review ficaria à frente.
+        self.assertEqual(self.slugs("/api/filmes/?ordering=-media_rating")[0], "estreia")
+
+        self.classico.refresh_from_db()
+        c, m = ratings.media_global(), ratings.votos_minimos()
+        self.assertAlmostEqual(self.classico.score, (48 + c * m) / (12 + m))
+
+    def test_score_acompanha_as_reviews(self):
+        from . import ratings
+
+        ratings.atualizar_scores()
+        self.novidade.refresh_from_db()
+        antes = self.novidade.score
+        Review.objects.create(filme=self.novidade, autor=self.autores[1], texto="x", rating=5)
+        self.novidade.refresh_from_db()
+        self.assertGreater(self.novidade.score, antes)
+
+    def test_filme_novo_entra_com_a_media_global(self):
+        from . import ratings
+
+        ratings.atualizar_scores()
+        filme = Filme.objects.create(titulo="Sem reviews", slug="sem-reviews")
+        filme.refresh_from_db()
+        self.assertAlmostEqual(filme.score, ratings.media_global())
+
+    def test_ranking_por_genero(self):
+        self.assertEqual(self.slugs("/api/filmes/top/drama/"), ["o-padrinho", "mediano"])
+        self.assertEqual(self.client.get("/api/filmes/top/nao-existe/").status_code, 404)
+
+    def test_ranking_paginado_por_cursor(self):
+        from . import ratings
+
+        ratings.atualizar_scores()
+        with self.assertNumQueries(2):
+            dados = self.client.get("/api/filmes/top/?page_size=2").json()
+        self.assertEqual(len(dados["results"]), 2)
+        self.assertEqual(self.slugs(dados["next"]), ["mediano"])
+
+    def test_comando_atualizar_scores(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        saida = StringIO()
+        call_command("atualizar_scores", stdout=saida)
+        # (12 × 4 + 5 + 6 × 2) / 19 avaliações.
+        self.assertIn("média global 3.421", saida.getvalue())
+
+
+class FilmesSemelhantesTests(CatalogoTestCase):
+    """
+    Testes dos filmes semelhantes (`similarity.py`) e de `/api/filmes/{slug}/similar/`.
+    """
+
+    def setUp(self):
+        super().setUp()
+        from .models.listas import Watchlist, Favorito
+
+        self.filmes = {
+            slug: Filme.objects.create(titulo=slug.title(), slug=slug)
+            for slug in ("alien", "aliens", "prometheus", "amelie")
+        }
+        self.utilizadores = [User.objects.create(username=f"cinefilo{i}") for i in range(4)]
+        u0, u1, u2, u3 = self.utilizadores
+        for utilizador in (u0, u1):
+            Favorito.objects.create(utilizador=utilizador, filme=self.filmes["alien"])
+            Favorito.objects.create(utilizador=utilizador, filme=self.filmes["aliens"])
+        Watchlist.objects.create(utilizador=u2, filme=self.filmes["alien"])
+        Review.objects.create(filme=self.filmes["prometheus"], autor=u2, texto="x", rating=3)
+        Watchlist.objects.create(utilizador=u3, filme=self.filmes["prometheus"])
+
+    def test_semelhanca_de_cosseno(self):
+        import numpy as np
+        from . import similarity
+
+        matriz, _, filme_ids = similarity.matriz_interacoes()
+        densa = matriz.toarray().astype(np.float64)
+        colunas = densa / np.linalg.norm(densa, axis=0)
+        esperado = colunas.T @ colunas
+
+        calculado = {
+            (int(filme_ids[c]), int(filme_ids[v])): s
+            for c, cols, sims in similarity.vizinhos(matriz, k=10, bloco=2)
+            for v, s in zip(cols, sims)
+        }
+        self.assertTrue(calculado)
+        for (a, b), semelhanca in calculado.items():
+            i, j = np.searchsorted(filme_ids, [a, b])
+            self.assertAlmostEqual(semelhanca, esperado[i, j], places=5)
+
+        # `k` limita os vizinhos, do mais semelhante para o menos.
+        alien = self.filmes["alien"].pk
+        _, cols, _ = next(
+            v for v in similarity.vizinhos(matriz, k=1) if filme_ids[v[0]] == alien
+        )
+        self.assertEqual(filme_ids[cols].tolist(), [self.filmes["aliens"].pk])
+
+    def test_endpoint_numa_query(self):
+        from . import similarity
+
+        with self.captureOnCommitCallbacks(execute=True):
+            similarity.calcular(k=5)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/filmes/alien/similar/")
+        self.assertEqual(response.status_code, 200)
+        resultados = response.json()["results"]
+        self.assertEqual([f["slug"] for f in resultados], ["aliens", "prometheus"])
+        self.assertGreater(resultados[0]["similaridade"], resultados[1]["similaridade"])
+
+        # Sem interações, não há vizinhos; um slug inexistente é 404.
+        self.assertEqual(self.client.get("/api/filmes/amelie/similar/").json()["results"], [])
+        self.assertEqual(self.client.get("/api/filmes/nao-existe/similar/").status_code, 404)
+
+    def test_comando_substitui_a_tabela(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models.recomendacao import FilmeSemelhante
+
+        call_command("calcular_semelhantes", "--k", "1", stdout=StringIO())
+        self.assertEqual(FilmeSemelhante.objects.filter(filme=self.filmes["alien"]).count(), 1)
+        call_command("calcular_semelhantes", stdout=StringIO())
+        self.assertEqual(FilmeSemelhante.objects.filter(filme=self.filmes["alien"]).count(), 2)
+        self.assertFalse(FilmeSemelhante.objects.filter(filme=self.filmes["amelie"]).exists())
+
+
+class CreditosApiTests(CatalogoTestCase):
+    """
+    Testes de `/api/filmes/{slug}/creditos/` e de `/api/pessoas/{slug}/`.
+    """
+
+    def setUp(self):
+        super().setUp()
+        from .models.elenco import Elenco
+        from .models.pessoa import Pessoa
+
+        self.filme = Filme.objects.create(titulo="Heat", slug="heat", ano_lancamento=1995)
+        self.pessoas = [Pessoa.objects.create(nome=f"Pessoa {i}", slug=f"pessoa-{i}") for i in range(12)]
+        # Criados fora de ordem para o teste não depender da ordem de inserção.
+        for i, pessoa in reversed(list(enumerate(self.pessoas))):
+            Elenco.objects.create(filme=self.filme, pessoa=pessoa, papel="Actor", ordem_credito=i)
+        Elenco.objects.create(filme=self.filme, pessoa=self.pessoas[0], papel="Director", ordem_credito=20)
+
+        self.filmes = [Filme.objects.create(titulo=f"Filme {i}", slug=f"filme-{i}") for i in range(25)]
+        Elenco.objects.bulk_create([
+            Elenco(filme=filme, pessoa=self.pessoas[0], papel="Actor", ordem_credito=1) for filme in self.filmes
+        ])
+
+    def test_creditos_do_filme_numa_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/filmes/heat/creditos/")
+        self.assertEqual(response.status_code, 200)
+        resultados = response.json()["results"]
+        self.assertEqual(len(resultados), 13)
+        self.assertEqual([c["pessoa"]["slug"] for c in resultados[:3]], ["pessoa-0", "pessoa-1", "pessoa-2"])
+        self.assertEqual((resultados[-1]["pessoa"]["slug"], resultados[-1]["papel"]), ("pessoa-0", "Director"))
+
+        self.assertEqual(self.client.get("/api/filmes/filme-0/creditos/").json()["results"][0]["papel"], "Actor")
+        Filme.objects.create(titulo="Sem Elenco", slug="sem-elenco")
+        self.assertEqual(self.client.get("/api/filmes/sem-elenco/creditos/").json()["results"], [])
+        self.assertEqual(self.client.get("/api/filmes/nao-existe/creditos/").status_code, 404)
+
+    def test_creditos_em_cache_invalidados_por_novo_credito(self):
+        from .models.elenco import Elenco
+
+        self.client.get("/api/filmes/heat/creditos/")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/filmes/heat/creditos/")["X-Cache"], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            Elenco.objects.create(filme=self.filme, pessoa=self.pessoas[1], papel="Writer", ordem_credito=30)
+        self.assertEqual(len(self.client.get("/api/filmes/heat/creditos/").json()["results"]), 14)
+
+    def test_filmografia_paginada_num_numero_fixo_de_queries(self):
+        Filme.objects.filter(slug="filme-3").update(ano_lancamento=2001)
+        vistos = []
+        url = "/api/pessoas/pessoa-0/?page_size=10"
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            dados = response.json()
+            self.assertEqual(dados["nome"], "Pessoa 0")
+            vistos += [(c["filme"]["slug"], c["papel"]) for c in dados["filmografia"]["results"]]
+            url = dados["filmografia"]["next"]
+        self.assertEqual(len(vistos), 27)
+        self.assertEqual(len(set(vistos)), 27)
+        # Lançamentos mais recentes primeiro; os filmes sem ano no fim.
+        self.assertEqual(vistos[0], ("filme-3", "Actor"))
+        self.assertEqual(sorted(vistos[1:3]), [("heat", "Actor"), ("heat", "Director")])
+        self.assertEqual(vistos[3], ("filme-24", "Actor"))
+        self.assertEqual(vistos[-1], ("filme-0", "Actor"))
+
+        with self.assertNumQueries(2):
+            dados = self.client.get("/api/pessoas/pessoa-5/").json()
+        self.assertEqual([c["filme"]["slug"] for c in dados["filmografia"]["results"]], ["heat"])
+        self.assertIsNone(dados["filmografia"]["next"])
+        self.assertEqual(self.client.get("/api/pessoas/nao-existe/").status_code, 404)
+
+
+class GrausSeparacaoTests(CatalogoTestCase):
+    """
+    Testes do grafo de créditos (`costars.py`) e de `/api/pessoas/{a}/path/{b}/`.
+    """
+
+    def test_caminho_mais_curto_como_numa_pesquisa_simples(self):
+        from collections import deque
+        import numpy as np
+        from .costars import GrafoElenco
+
+        rng = np.random.default_rng(3)
+        pessoas = rng.integers(1, 60, size=150)
+        filmes = rng.integers(100, 160, size=150)
+        grafo = GrafoElenco(pessoas, filmes)
+        arestas = set(zip(pessoas.tolist(), filmes.tolist()))
+        elenco_do_filme = {}
+        for p, f in arestas:
+            elenco_do_filme.setdefault(f, set()).add(p)
+
+        def graus(origem, destino):
+            distancias, fila = {origem: 0}, deque([origem])
+            while fila:
+                atual = fila.popleft()
+                for f, elenco in elenco_do_filme.items():
+                    if atual in elenco:
+                        for p in elenco - distancias.keys():
+                            distancias[p] = distancias[atual] + 1
+                            fila.append(p)
+            return distancias.get(destino)
+
+        ids = sorted(set(pessoas.tolist()))
+        for origem in ids[:12]:
+            for destino in ids[-12:]:
+                caminho = grafo.caminho(origem, destino)
+                esperado = graus(origem, destino)
+                if esperado is None:
+                    self.assertIsNone(caminho)
+                    continue
+                self.assertEqual(len(caminho) // 2, esperado)
+                self.assertEqual((caminho[0], caminho[-1]), (origem, destino))
+                for i in range(1, len(caminho), 2):
+                    self.assertIn((caminho[i - 1], caminho[i]), arestas)
+                    self.assertIn((caminho[i + 1], caminho[i]), arestas)
+        self.assertEqual(grafo.caminho(ids[0], ids[0]), [ids[0]])
+        self.assertIsNone(grafo.caminho(ids[0], 999))
+
+    def test_escrita_chega_aos_grafos_de_outros_processos(self):
+        from .costars import _GrafoAtual
+        from .models.elenco import Elenco
+        from .models.pessoa import Pessoa
+
+        ana = Pessoa.objects.create(nome="Ana", slug="ana")
+        bruno = Pessoa.objects.create(nome="Bruno", slug="bruno")
+        heat = Filme.objects.create(titulo="Heat", slug="heat")
+        Elenco.objects.create(pessoa=ana, filme=heat, papel="Actor")
+        # Dois workers, cada um com o seu grafo em memória e a mesma cache.
+        workers = [_GrafoAtual(), _GrafoAtual()]
+        for worker in workers:
+            self.assertIsNone(worker.atual().caminho(ana.pk, bruno.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Elenco.objects.create(pessoa=bruno, filme=heat, papel="Actor")
+        for worker in workers:
+            self.assertEqual(worker.atual().caminho(ana.pk, bruno.pk), [ana.pk, heat.pk, bruno.pk])
+
+    def test_endpoint(self):
+        from .models.elenco import Elenco
+        from .models.pessoa import Pessoa
+
+        pessoas = {slug: Pessoa.objects.create(nome=slug.title(), slug=slug) for slug in ("ana", "bruno", "carla", "duarte")}
+        filmes = {slug: Filme.objects.create(titulo=slug.title(), slug=slug) for slug in ("heat", "ronin", "alien")}
+        for pessoa, filme in (("ana", "heat"), ("bruno", "heat"), ("bruno", "ronin"), ("carla", "ronin")):
+            Elenco.objects.create(pessoa=pessoas[pessoa], filme=filmes[filme], papel="Actor")
+
+        with self.assertNumQueries(4):
+            # Slugs, carregamento do grafo e os dois `in_bulk`.
+            response = self.client.get("/api/pessoas/ana/path/carla/")
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual(dados["graus"], 2)
+        self.assertEqual([p["slug"] for p in dados["pessoas"]], ["ana", "bruno", "carla"])
+        self.assertEqual([f["slug"] for f in dados["filmes"]], ["heat", "ronin"])
+        with self.assertNumQueries(3):
+            self.client.get("/api/pessoas/carla/path/ana/")
+
+        self.assertEqual(self.client.get("/api/pessoas/ana/path/duarte/").json()["graus"], None)
+        self.assertEqual(self.client.get("/api/pessoas/ana/path/nao-existe/").status_code, 404)
+
+        # Um crédito novo recarrega o grafo (e invalida as respostas em cache).
+        with self.captureOnCommitCallbacks(execute=True):
+            Elenco.objects.create(pessoa=pessoas["duarte"], filme=filmes["heat"], papel="Director")
+        self.assertEqual(self.client.get("/api/pessoas/ana/path/duarte/").json()["graus"], 1)
+
+    def test_benchmark(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        saida = StringIO()
+        call_command("benchmark_grafo_elenco", "--creditos", "2000", "--consultas", "5", stdout=saida)
+        self.assertIn("5 pesquisas", saida.getvalue())
+
+
+class RecomendacoesTests(CatalogoTestCase):
+    """
+    Testes da fatorização (`recommendations.py`) e de `/api/me/recommendations/`.
+    """
+
+    def setUp(self):
+        super().setUp()
+        from .models.listas import Favorito
+
+        self.filmes = {
+            slug: Filme.objects.create(titulo=slug.title(), slug=slug, score=1)
+            for slug in ("alien", "aliens", "prometheus", "amelie", "chocolate", "cinema-paraiso")
+        }
+        ficcao, drama = ("alien", "aliens", "prometheus"), ("amelie", "chocolate", "cinema-paraiso")
+        for i in range(8):
+            utilizador = User.objects.create(username=f"cinefilo{i}")
+            for slug in ficcao if i < 4 else drama:
+                Favorito.objects.create(utilizador=utilizador, filme=self.filmes[slug])
+        self.user = User.objects.create(username="novato")
+        for slug in ("alien", "aliens"):
+            Favorito.objects.create(utilizador=self.user, filme=self.filmes[slug])
+
+    def treinar(self):
+        from . import recommendations
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recommendations.treinar(fatores=4, iteracoes=10)
+
+    def slugs(self, response):
+        return [f["slug"] for f in response.json()["results"]]
+
+    def test_recomenda_pelo_gosto_do_utilizador(self):
+        from .models.recomendacao import FatoresFilme, FatoresUtilizador
+
+        self.treinar()
+        self.assertEqual(FatoresUtilizador.objects.count(), 9)
+        self.assertEqual(len(FatoresFilme.objects.get(filme=self.filmes["alien"]).vetor), 4 * 4)
+
+        self.client.force_login(self.user)
+        response = self.client.get("/api/me/recommendations/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["personalizado"])
+        slugs = self.slugs(response)
+        # O que falta da "família" dos favoritos vem primeiro; os favoritos ficam de fora.
+        self.assertEqual(slugs[0], "prometheus")
+        self.assertNotIn("alien", slugs)
+        self.assertNotIn("aliens", slugs)
+
+    def test_cache_ate_as_listas_mudarem(self):
+        from . import membership
+
+        self.treinar()
+        self.client.force_login(self.user)
+        self.client.get("/api/me/recommendations/")
+        # Sessão e utilizador, mais os filmes da resposta e os seus géneros.
+        with self.assertNumQueries(4):
+            response = self.client.get("/api/me/recommendations/?limit=1")
+        self.assertEqual(self.slugs(response), ["prometheus"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            membership.adicionar(self.user.pk, membership.WATCHLIST, [self.filmes["prometheus"].pk])
+        self.assertNotIn("prometheus", self.slugs(self.client.get("/api/me/recommendations/")))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(filme=self.filmes["amelie"], autor=self.user, texto="x", rating=2)
+        self.assertNotIn("amelie", self.slugs(self.client.get("/api/me/recommendations/")))
+
+        # Uma escrita pelos modelos (sinais) também chega às recomendações.
+        from .models.listas import Favorito
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorito.objects.filter(utilizador=self.user, filme=self.filmes["aliens"]).delete()
+        self.assertIn("aliens", self.slugs(self.client.get("/api/me/recommendations/")))
+
+    def test_versao_nao_expira_numa_cache_em_base_de_dados(self):
+        from datetime import datetime
+        from django.core.cache import cache
+        from django.core.management import call_command
+        from django.db import connection
+        from django.test import override_settings
+        from . import recommendations
+
+        tabela = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "cache_testes"}}
+        with override_settings(CACHES=tabela):
+            call_command("createcachetable", verbosity=0)
+            versao = recommendations.versao_modelo()
+            self.treinar()
+            self.assertGreater(recommendations.versao_modelo(), versao)
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT expires FROM cache_testes WHERE cache_key = %s",
+                               [cache.make_and_validate_key(recommendations.CHAVE_VERSAO)])
+                expira = cursor.fetchone()[0]
+        # Sem `touch`, o incremento gravaria a versão com o TIMEOUT por omissão (300 s).
+        self.assertEqual(str(expira)[:4], str(datetime.max.year))
+
+    def test_sem_fatores_usa_o_ranking(self):
+        self.client.force_login(User.objects.create(username="sem-historico"))
+        dados = self.client.get("/api/me/recommendations/").json()
+        self.assertFalse(dados["personalizado"])
+        self.assertEqual(len(dados["results"]), len(self.filmes))
+
+    def test_exige_autenticacao(self):
+        self.assertIn(self.client.get("/api/me/recommendations/").status_code, (401, 403))
+
+
+# --- Scraper do IMDb ---
+
+def _pagina_top250(n, estruturada=False):
+    itens = "".join(
+        f'<li class="ipc-metadata-list-summary-item">'
+        f'<a class="ipc-title-link-wrapper" href="/title/tt{i:07d}/?ref_=chttp_t_{i}"><h3 class="ipc-title__text">{i}. Filme {i}</h3></a>'
+        f'<div class="cli-title-metadata"><span class="cli-title-metadata-item">{1990 + i}</span></div>'
+        f'<span class="ipc-rating-star--imdb"><span class="ipc-rating-star--rating">8,{i % 10}</span></span>'
+        f'</li>'
+        for i in range(1, n + 1)
+    )
+    dados = ""
+    if estruturada:
+        import json
+
+        arestas = [
+            {"node": {"id": f"tt{i:07d}", "titleText": {"text": f"Filme {i}"}, "releaseYear": {"year": 1990 + i},
+                      "ratingsSummary": {"aggregateRating": float(f"8.{i % 10}")}}}
+            for i in range(1, n + 1)
+        ]
+        next_data = {"props": {"pageProps": {"pageData": {"chartTitles": {"edges": arestas}}}}}
+        dados = f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(next_data)}</script>'
+    return f'<html><head>{dados}</head><body><ul>{itens}</ul></body></html>'
+
+
+def _pagina_detalhe(i, estruturada=False):
+    dados = ""
+    if estruturada:
+        import json
+
+        json_ld = {"@context": "https://schema.org", "@type": "Movie", "name": f"Filme {i}",
+                   "image": f"https://m.media-amazon.com/images/M/p{i}._V1_.jpg",
+                   "description": f"Sinopse do filme {i}."}
+        dados = f'<script type="application/ld+json">{json.dumps(json_ld)}</script>'
+    return (
+        f'<html><head>{dados}</head><body><span data-testid="plot-xl">Sinopse do filme {i}.</span>'
+        f'<div data-testid="hero-media__poster"><img src="https://m.media-amazon.com/images/M/p{i}._V1_QL75_UX190_.jpg"></div>'
+        f'<div data-testid="hero-media__backdrop"><img alt="" src="https://m.media-amazon.com/images/M/b{i}._V1_QL75_UX1000_.jpg"></div>'
+        f'</body></html>'
+    )
+
+
+class ServidorIMDbLocal:
+    """
+    Servidor HTTP local que imita as páginas do IMDb usadas pelo scraper.
+
+    `falhas[caminho]` respostas 503 (com `Retry-After: retry_after`) antes da
+    página verdadeira; `atraso` segundos por pedido. As páginas levam um ETag e respondem 304 a um
+    `If-None-Match` igual. Regista os pedidos recebidos e o máximo em paralelo.
+    """
+
+    def __init__(self, n_filmes=5, atraso=0.0):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.paginas = {"/chart/top/": _pagina_top250(n_filmes)}
+        self.paginas.update({f"/title/tt{i:07d}/": _pagina_detalhe(i) for i in range(1, n_filmes + 1)})
+        self.falhas, self.atraso, self.retry_after = {}, atraso, "0"
+        self.pedidos, self.em_curso, self.max_em_curso = [], 0, 0
+        self.nao_modificados = 0
+        self._lock = threading.Lock()
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                import time
+
+                caminho = self.path.split("?")[0]
+                with servidor._lock:
+                    servidor.pedidos.append(caminho)
+                    servidor.em_curso += 1
+                    servidor.max_em_curso = max(servidor.max_em_curso, servidor.em_curso)
+                    falhar = servidor.falhas.get(caminho, 0) > 0
+                    if falhar:
+                        servidor.falhas[caminho] -= 1
+                try:
+                    import hashlib
+
+                    time.sleep(servidor.atraso)
+                    pagina = servidor.paginas.get(caminho)
+                    codigo = 503 if falhar else (200 if pagina is not None else 404)
+                    etag = f'"{hashlib.sha1(pagina.encode()).hexdigest()}"' if pagina is not None else None
+                    if codigo == 200 and etag == self.headers.get("If-None-Match"):
+                        servidor.nao_modificados += 1
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    corpo = (pagina if codigo == 200 else "erro").encode("utf-8")
+                    self.send_response(codigo)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(corpo)))
+                    if falhar:
+                        self.send_header("Retry-After", servidor.retry_after)
+                    elif codigo == 200:
+                        self.send_header("ETag", etag)
+                    self.end_headers()
+                    self.wfile.write(corpo)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # O cliente desistiu (timeout).
+                finally:
+                    with servidor._lock:
+                        servidor.em_curso -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ScraperIMDbTests(TestCase):
+    """
+    Testes do scraper do Top 250 (`imdb.py` e `fetch_imdb_top250`) contra um servidor local.
+    """
+
+    def importar(self, servidor, *args):
+        from io import StringIO
+        from django.core.management import call_command
+
+        saida, erros = StringIO(), StringIO()
+        call_command("fetch_imdb_top250", "--base-url", servidor.url, "--rate", "0", *args, stdout=saida, stderr=erros)
+        return saida.getvalue(), erros.getvalue()
+
+    def test_importa_com_pedidos_em_paralelo(self):
+        with ServidorIMDbLocal(n_filmes=6, atraso=0.05) as servidor:
+            saida, _ = self.importar(servidor, "--concurrency", "3")
+        self.assertIn("6 novos filmes adicionados, 0 filmes atualizados", saida)
+        self.assertGreater(servidor.max_em_curso, 1)
+        self.assertLessEqual(servidor.max_em_curso, 3)
+
+        filme = Filme.objects.get(imdb_id="tt0000002")
+        self.assertEqual((filme.titulo, filme.ano_lancamento, filme.media_rating), ("Filme 2", 1992, 8.2))
+        self.assertEqual(filme.descricao, "Sinopse do filme 2.")
+        self.assertEqual(filme.poster, "https://m.media-amazon.com/images/M/p2._V1_.jpg")
+
+    def test_repete_respostas_de_erro(self):
+        with ServidorIMDbLocal(n_filmes=2) as servidor:
+            servidor.falhas = {"/chart/top/": 1, "/title/tt0000001/": 2}
+            saida, erros = self.importar(servidor, "--concurrency", "1")
+        self.assertIn("2 novos filmes adicionados", saida)
+        self.assertEqual(erros, "")
+        self.assertEqual(servidor.pedidos.count("/title/tt0000001/"), 3)
+        self.assertEqual(Filme.objects.get(imdb_id="tt0000001").descricao, "Sinopse do filme 1.")
+
+    def test_timeout_com_novas_tentativas(self):
+        import requests
+        from . import imdb
+
+        with ServidorIMDbLocal(n_filmes=1, atraso=0.5) as servidor:
+            cliente = imdb.ClienteIMDb(base_url=servidor.url, taxa=0, timeout=0.1, tentativas=2, backoff=0)
+            with self.assertRaises(requests.Timeout):
+                cliente.obter(cliente.url("/title/tt0000001/"))
+            cliente.fechar()
+        self.assertEqual(servidor.pedidos, ["/title/tt0000001/"] * 2)
+
+    def test_retry_after_longo_desiste_do_pedido(self):
+        import time
+        from . import imdb
+
+        with ServidorIMDbLocal(n_filmes=1) as servidor:
+            servidor.falhas, servidor.retry_after = {"/title/tt0000001/": 1}, "86400"
+            cliente = imdb.ClienteIMDb(base_url=servidor.url, taxa=0, tentativas=3, espera_maxima=1)
+            inicio = time.monotonic()
+            response = cliente.obter(cliente.url("/title/tt0000001/"))
+            cliente.fechar()
+        self.assertEqual(response.status_code, 503)
+        self.assertLess(time.monotonic() - inicio, 1)
+        self.assertEqual(servidor.pedidos, ["/title/tt0000001/"])
+
+    def test_limite_de_taxa(self):
+        from . import imdb
+
+        relogio = [0.0]
+        esperas = []
+
+        def dormir(segundos):
+            esperas.append(segundos)
+            relogio[0] += segundos
+
+        limite = imdb.LimiteTaxa(10, relogio=lambda: relogio[0], dormir=dormir)
+        for _ in range(5):
+            limite.adquirir()
+        # A primeira ficha está disponível; as outras quatro chegam a cada 0,1 s.
+        self.assertAlmostEqual(relogio[0], 0.4)
+        self.assertEqual(len(esperas), 4)
+
+
+class ImportacaoEmMassaTests(CatalogoTestCase):
+    """
+    Testes da escrita em massa dos filmes importados (`importacao.py`).
+    """
+
+    def registos(self, n=3, **extra):
+        return [
+            {"imdb_id": f"tt{i:07d}", "titulo": f"Filme {i}", "ano_lancamento": 1990 + i,
+             "media_rating": 8.0, "descricao": f"Sinopse {i}.", **extra}
+            for i in range(1, n + 1)
+        ]
+
+    def escritas(self, contexto):
+        return [q["sql"] for q in contexto.captured_queries if q["sql"].startswith(("INSERT", "UPDATE"))]
+
+    def test_cria_e_depois_so_escreve_o_que_mudou(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import importacao
+
+        resultado = importacao.gravar_filmes(self.registos())
+        self.assertEqual((resultado.criados, resultado.atualizados, resultado.inalterados), (3, 0, 0))
+
+        with CaptureQueriesContext(connection) as contexto:
+            resultado = importacao.gravar_filmes(self.registos())
+        self.assertEqual((resultado.criados, resultado.atualizados, resultado.inalterados), (0, 0, 3))
+        self.assertEqual(self.escritas(contexto), [])
+
+        registos = self.registos()
+        registos[1]["media_rating"] = 8.5
+        with CaptureQueriesContext(connection) as contexto:
+            resultado = importacao.gravar_filmes(registos, lote=2)
+        self.assertEqual((resultado.criados, resultado.atualizados, resultado.inalterados), (0, 1, 2))
+        upserts = [sql for sql in self.escritas(contexto) if "ON CONFLICT" in sql]
+        self.assertEqual(len(upserts), 1)
+        atualizacao = upserts[0].split("DO UPDATE", 1)[1]
+        self.assertIn('"media_rating"', atualizacao)
+        self.assertNotIn('"descricao"', atualizacao)
+        self.assertEqual(Filme.objects.get(imdb_id="tt0000002").media_rating, 8.5)
+
+    def test_nao_substitui_a_media_das_reviews(self):
+        from . import importacao
+
+        importacao.gravar_filmes(self.registos(2))
+        filme = Filme.objects.get(imdb_id="tt0000001")
+        autor = User.objects.create(username="critico")
+        Review.objects.create(filme=filme, autor=autor, texto="x", rating=3)
+
+        registos = self.registos(2, media_rating=9.1)
+        resultado = importacao.gravar_filmes(registos)
+        self.assertEqual((resultado.atualizados, resultado.inalterados), (1, 1))
+        self.assertEqual(Filme.objects.get(imdb_id="tt0000001").media_rating, 3)
+        self.assertEqual(Filme.objects.get(imdb_id="tt0000002").media_rating, 9.1)
+
+    def test_campos_em_falta_nao_sao_apagados(self):
+        from . import importacao
+
+        importacao.gravar_filmes(self.registos(1))
+        registo = self.registos(1)[0]
+        del registo["descricao"]
+        registo["titulo"] = "Filme 1 (Remaster)"
+        resultado = importacao.gravar_filmes([registo])
+        self.assertEqual(resultado.atualizados, 1)
+        filme = Filme.objects.get(imdb_id="tt0000001")
+        self.assertEqual((filme.titulo, filme.descricao), ("Filme 1 (Remaster)", "Sinopse 1."))
+
+    def test_filmes_novos_entram_na_pesquisa_e_no_ranking(self):
+        from . import importacao, ratings
+        from .search import pesquisar_ids
+
+        with self.captureOnCommitCallbacks(execute=True):
+            importacao.gravar_filmes(self.registos(2))
+        filme = Filme.objects.get(imdb_id="tt0000002")
+        self.assertEqual(filme.slug, "filme-2-1992-tt0000002")
+        self.assertAlmostEqual(filme.score, ratings.media_global())
+        self.assertIsNotNone(filme.faceta_decada)
+        self.assertIn(filme.pk, pesquisar_ids("Sinopse 2"))
+
+    def test_comando_conta_criados_e_atualizados(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        with ServidorIMDbLocal(n_filmes=3) as servidor:
+            call_command("fetch_imdb_top250", "--base-url", servidor.url, "--rate", "0", stdout=StringIO())
+            servidor.paginas["/title/tt0000003/"] = servidor.paginas["/title/tt0000003/"].replace("Sinopse", "Nova sinopse")
+            del servidor.paginas["/title/tt0000002/"]
+            saida = StringIO()
+            call_command("fetch_imdb_top250", "--base-url", servidor.url, "--rate", "0", stdout=saida, stderr=StringIO())
+        self.assertIn("0 novos filmes adicionados, 1 filmes atualizados, 2 sem alterações", saida.getvalue())
+        # A página que falhou não apaga a sinopse que já estava guardada.
+        self.assertEqual(Filme.objects.get(imdb_id="tt0000002").descricao, "Sinopse do filme 2.")
+        self.assertEqual(Filme.objects.get(imdb_id="tt0000003").descricao, "Nova sinopse do filme 3.")
+
+
+class CacheHTTPScraperTests(TestCase):
+    """
+    Testes da cache HTTP em disco do scraper e do modo `--replay`.
+    """
+
+    def setUp(self):
+        import tempfile
+
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(__import__("shutil").rmtree, self.diretorio, True)
+
+    def importar(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+
+        saida = StringIO()
+        call_command("fetch_imdb_top250", "--rate", "0", *args, stdout=saida, stderr=StringIO())
+        return saida.getvalue()
+
+    def test_revalida_com_pedidos_condicionais(self):
+        with ServidorIMDbLocal(n_filmes=3) as servidor:
+            self.importar("--base-url", servidor.url, "--cache-dir", self.diretorio, "--cache-ttl", "0")
+            servidor.paginas["/title/tt0000001/"] = _pagina_detalhe(1).replace("Sinopse", "Outra sinopse")
+            saida = self.importar("--base-url", servidor.url, "--cache-dir", self.diretorio, "--cache-ttl", "0")
+        # Lista e dois detalhes confirmados com 304; só a página alterada voltou a vir inteira.
+        self.assertEqual(servidor.nao_modificados, 3)
+        self.assertEqual(len(servidor.pedidos), 8)
+        self.assertIn("1 filmes atualizados, 2 sem alterações", saida)
+        self.assertEqual(Filme.objects.get(imdb_id="tt0000001").descricao, "Outra sinopse do filme 1.")
+
+    def test_copias_frescas_nao_vao_a_rede(self):
+        with ServidorIMDbLocal(n_filmes=3) as servidor:
+            self.importar("--base-url", servidor.url, "--cache-dir", self.diretorio)
+            self.importar("--base-url", servidor.url, "--cache-dir", self.diretorio)
+        self.assertEqual(len(servidor.pedidos), 4)
+
+    def test_replay_sem_rede(self):
+        from pathlib import Path
+
+        with ServidorIMDbLocal(n_filmes=3) as servidor:
+            self.importar("--base-url", servidor.url, "--cache-dir", self.diretorio)
+        Filme.objects.all().delete()
+        # O servidor já está desligado: tudo vem do disco.
+        saida = self.importar("--base-url", servidor.url, "--replay", self.diretorio)
+        self.assertIn("3 novos filmes adicionados", saida)
+        self.assertEqual(Filme.objects.get(imdb_id="tt0000003").descricao, "Sinopse do filme 3.")
+        # Um corpo por página distinta, endereçado pelo seu SHA-256.
+        self.assertEqual(len(list(Path(self.diretorio, "corpos").glob("*/*"))), 4)
+
+
+class LeitoresIMDbTests(TestCase):
+    """
+    Testes dos leitores de páginas do IMDb (dados estruturados e seletores CSS).
+    """
+
+    def test_leitores_dao_o_mesmo_top250(self):
+        from . import imdb
+
+        html = _pagina_top250(3, estruturada=True)
+        estruturado = imdb.ler_top250_json(html)
+        self.assertEqual(len(estruturado), 3)
+        self.assertEqual(estruturado, imdb.ler_top250_bs4(html))
+        self.assertEqual(estruturado[0]["caminho"], "/title/tt0000001/")
+        # Sem `__NEXT_DATA__`, o modo automático recorre aos seletores.
+        self.assertEqual(imdb.ler_top250_json(_pagina_top250(3)), [])
+        self.assertEqual([f["titulo"] for f in imdb.ler_top250(_pagina_top250(3))], ["Filme 1", "Filme 2", "Filme 3"])
+
+    def test_detalhe_estruturado(self):
+        from . import imdb
+
+        html = _pagina_detalhe(7, estruturada=True).replace("Sinopse do filme 7.", "O &apos;filme&apos; 7.", 1)
+        estruturado = imdb.ler_detalhe(html, "json")
+        self.assertEqual(estruturado, {
+            "descricao": "O 'filme' 7.",
+            "poster": "https://m.media-amazon.com/images/M/p7._V1_.jpg",
+            "backdrop": "https://m.media-amazon.com/images/M/b7._V1_.jpg",
+        })
+        self.assertEqual(estruturado["backdrop"], imdb.ler_detalhe_bs4(html)["backdrop"])
+        # Com `__NEXT_DATA__`, a imagem de fundo é a miniatura do vídeo principal.
+        import json
+        acima = {"plot": {"plotText": {"plainText": "Sinopse."}}, "primaryVideos": {"edges": [
+            {"node": {"thumbnail": {"url": "https://m.media-amazon.com/images/M/v7._V1_QL75_UX500_.jpg"}}},
+        ]}}
+        next_data = json.dumps({"props": {"pageProps": {"aboveTheFoldData": acima}}})
+        html = f'<script id="__NEXT_DATA__" type="application/json">{next_data}</script>'
+        self.assertEqual(imdb.ler_detalhe(html, "json")["backdrop"], "https://m.media-amazon.com/images/M/v7._V1_.jpg")
+        self.assertEqual(imdb.ler_detalhe(_pagina_detalhe(7), "json"), {})
+        self.assertEqual(imdb.ler_detalhe(_pagina_detalhe(7))["descricao"], "Sinopse do filme 7.")
+
+    def test_benchmark(self):
+        import shutil
+        import tempfile
+        from io import StringIO
+        from pathlib import Path
+        from django.core.management import call_command
+
+        diretorio = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, diretorio, True)
+        (diretorio / "top.html").write_text(_pagina_top250(5, estruturada=True))
+        for i in range(1, 4):
+            (diretorio / f"tt{i}.html").write_text(_pagina_detalhe(i, estruturada=True))
+
+        saida = StringIO()
+        call_command("benchmark_parser_imdb", str(diretorio), "--repeticoes", "1", stdout=saida)
+        linhas = saida.getvalue().splitlines()
+        self.assertEqual(linhas[0], "4 páginas, 1 leituras cada.")
+        self.assertEqual([linha.split()[:3] for linha in linhas[2:]], [
+            ["top250", "json", "1"], ["top250", "bs4", "1"], ["detalhe", "json", "3"], ["detalhe", "bs4", "3"],
+        ])
+
+
+def _escrever_tsv(caminho, cabecalho, linhas):
+    import gzip
+
+    with gzip.open(caminho, "wt", encoding="utf-8") as ficheiro:
+        for linha in [cabecalho, *linhas]:
+            ficheiro.write("\t".join(linha) + "\n")
+
+
+class DatasetsIMDbTests(CatalogoTestCase):
+    """
+    Testes da carga dos ficheiros de dados do IMDb (`imdb_datasets.py`).
+    """
+
+    BASICS = ("tconst", "titleType", "primaryTitle", "originalTitle", "isAdult",
+              "startYear", "endYear", "runtimeMinutes", "genres")
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from pathlib import Path
+
+        super().setUp()
+        self.diretorio = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.diretorio, True)
+        self.basics = str(self.diretorio / "title.basics.tsv.gz")
+        self.ratings = str(self.diretorio / "title.ratings.tsv.gz")
+        # A ordem é numérica: tt9999999 vem antes de tt10000000.
+        _escrever_tsv(self.basics, self.BASICS, [
+            ("tt0000001", "short", "Curta", "Curta", "0", "1894", r"\N", "1", "Short"),
+            ("tt0000002", "movie", "Filme Dois", "Filme Dois", "0", "1999", r"\N", "90", "Drama,Sci-Fi"),
+            ("tt0000003", "movie", "Filme Três", "Filme Três", "0", r"\N", r"\N", "90", r"\N"),
+            ("tt0000004", "tvSeries", "Série", "Série", "0", "2001", "2003", "45", "Drama"),
+            ("tt9999999", "movie", "Filme Grande", "Filme Grande", "0", "2015", r"\N", "120", "Drama"),
+            ("tt10000000", "movie", "Filme Novo", "Filme Novo", "0", "2021", r"\N", "100", "Comedy"),
+        ])
+        _escrever_tsv(self.ratings, ("tconst", "averageRating", "numVotes"), [
+            ("tt0000001", "5.0", "10"),
+            ("tt0000002", "7.5", "1000"),
+            ("tt0000004", "8.1", "50"),
+            ("tt10000000", "6.2", "20"),
+        ])
+
+    def test_carrega_filmes_com_avaliacoes_e_generos(self):
+        from . import imdb_datasets, ratings
+        from .models.taxonomia import Genero
+        from .search import pesquisar_ids
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = imdb_datasets.carregar(self.basics, self.ratings, lote=2)
+        self.assertEqual((resultado.lidos, resultado.criados, resultado.ultimo), (4, 4, "tt10000000"))
+        self.assertEqual(
+            list(Filme.objects.order_by("imdb_id").values_list("imdb_id", "ano_lancamento", "media_rating")),
+            [("tt0000002", 1999, 7.5), ("tt0000003", None, 0.0), ("tt10000000", 2021, 6.2), ("tt9999999", 2015, 0.0)],
+        )
+        dois = Filme.objects.get(imdb_id="tt0000002")
+        self.assertEqual(sorted(dois.generos.values_list("nome", flat=True)), ["Drama", "Sci-Fi"])
+        self.assertEqual(Genero.objects.get(nome="Sci-Fi").slug, "sci-fi")
+        self.assertFalse(Genero.objects.filter(nome="Short").exists())
+        self.assertAlmostEqual(dois.score, ratings.media_global())
+        self.assertIn(dois.pk, pesquisar_ids("Dois"))
+
+        resposta = self.client.get("/api/filmes/facetas/")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(
+            [(g["slug"], g["total"]) for g in resposta.data["generos"]],
+            [("comedy", 1), ("drama", 2), ("sci-fi", 1)],
+        )
+
+        # Uma segunda carga do mesmo ficheiro não escreve nada nos filmes.
+        resultado = imdb_datasets.carregar(self.basics, self.ratings)
+        self.assertEqual((resultado.criados, resultado.atualizados, resultado.inalterados), (0, 0, 4))
+
+    def test_avaliacao_do_imdb_nao_substitui_a_das_reviews(self):
+        from . import imdb_datasets
+
+        imdb_datasets.carregar(self.basics, self.ratings)
+        filme = Filme.objects.get(imdb_id="tt0000002")
+        Review.objects.create(filme=filme, autor=User.objects.create(username="critico"), texto="x", rating=4)
+
+        _escrever_tsv(self.ratings, ("tconst", "averageRating", "numVotes"), [
+            ("tt0000002", "9.9", "2000"), ("tt10000000", "6.8", "30"),
+        ])
+        resultado = imdb_datasets.carregar(self.basics, self.ratings)
+        self.assertEqual((resultado.atualizados, resultado.inalterados), (1, 3))
+        self.assertEqual(Filme.objects.get(imdb_id="tt0000002").media_rating, 4)
+        self.assertEqual(Filme.objects.get(imdb_id="tt10000000").media_rating, 6.8)
+
+    def test_continua_do_checkpoint(self):
+        from . import imdb_datasets
+
+        checkpoint = imdb_datasets.Checkpoint(str(self.diretorio / "carga.json"))
+
+        def interromper(resultado):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            imdb_datasets.carregar(self.basics, self.ratings, lote=2, checkpoint=checkpoint,
+                                   ao_gravar_lote=interromper)
+        self.assertEqual(checkpoint.ler()["resultado"]["ultimo"], "tt0000003")
+        # O filme gravado depois do checkpoint é lido de novo, mas não é criado outra vez.
+        Filme.objects.filter(imdb_id="tt0000003").update(titulo="Outro título")
+
+        vistos = []
+        resultado = imdb_datasets.carregar(self.basics, self.ratings, lote=2, checkpoint=checkpoint,
+                                           ao_gravar_lote=lambda r: vistos.append(r.ultimo))
+        self.assertEqual(vistos, ["tt10000000"])
+        self.assertEqual((resultado.lidos, resultado.criados), (4, 4))
+        self.assertEqual(Filme.objects.get(imdb_id="tt0000003").titulo, "Outro título")
+        self.assertIsNone(checkpoint.ler())
+
+    def test_ficheiro_fora_de_ordem(self):
+        from . import imdb_datasets
+
+        _escrever_tsv(self.ratings, ("tconst", "averageRating", "numVotes"), [
+            ("tt0000002", "7.5", "1000"), ("tt0000001", "5.0", "10"),
+        ])
+        with self.assertRaises(imdb_datasets.ErroDataset):
+            imdb_datasets.carregar(self.basics, self.ratings)
+
+    def test_carrega_creditos_sem_query_por_linha(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import imdb_datasets
+        from .models.elenco import Elenco
+        from .models.pessoa import Pessoa
+
+        imdb_datasets.carregar(self.basics, self.ratings)
+        homonima = Pessoa.objects.create(nome="Ana Silva", slug="ana-silva")
+        criada_a_mao = Pessoa.objects.create(nome="Bruno Costa", slug="bruno-costa")
+        principals = str(self.diretorio / "title.principals.tsv.gz")
+        names = str(self.diretorio / "name.basics.tsv.gz")
+        _escrever_tsv(principals, ("tconst", "ordering", "nconst", "category", "job", "characters"), [
+            ("tt0000002", "1", "nm0000001", "actor", r"\N", '["Ele"]'),
+            ("tt0000002", "2", "nm0000002", "director", r"\N", r"\N"),
+            ("tt0000002", "3", "nm0000001", "writer", "screenplay", r"\N"),
+            ("tt0000004", "1", "nm0000002", "actor", r"\N", r"\N"),
+            ("tt9999999", "1", "nm0000003", "actress", r"\N", r"\N"),
+            ("tt9999999", "2", "nm0000009", "production_designer", r"\N", r"\N"),
+        ])
+        _escrever_tsv(names, ("nconst", "primaryName", "birthYear", "deathYear", "primaryProfession", "knownForTitles"), [
+            ("nm0000001", "Ana Silva", "1970", r"\N", "actress", "tt0000002"),
+            ("nm0000002", "Bruno Costa", r"\N", r"\N", "director", r"\N"),
+            ("nm0000003", "Ana Silva", r"\N", r"\N", "actress", r"\N"),
+            ("nm0000004", "Sem Créditos", r"\N", r"\N", r"\N", r"\N"),
+        ])
+
+        with CaptureQueriesContext(connection) as contexto:
+            resultado = imdb_datasets.carregar_creditos(principals, names)
+        # Contagens, mapas de ids, criação das pessoas e um lote de créditos.
+        self.assertLessEqual(len(contexto.captured_queries), 14)
+        self.assertEqual(
+            (resultado.creditos, resultado.pessoas_criadas, resultado.pessoas_associadas,
+             resultado.pessoas_homonimas, resultado.sem_pessoa),
+            (4, 2, 1, 1, 1),
+        )
+        # Um nome único no ficheiro liga a pessoa criada à mão; homónimos não.
+        self.assertEqual(Pessoa.objects.get(imdb_id="nm0000002").pk, criada_a_mao.pk)
+        homonima.refresh_from_db()
+        self.assertIsNone(homonima.imdb_id)
+        self.assertEqual(Pessoa.objects.get(imdb_id="nm0000001").slug, "ana-silva-nm0000001")
+        self.assertEqual(Pessoa.objects.get(imdb_id="nm0000003").slug, "ana-silva-nm0000003")
+        self.assertFalse(Pessoa.objects.filter(imdb_id="nm0000004").exists())
+        self.assertEqual(
+            list(Elenco.objects.filter(filme__imdb_id="tt0000002").values_list("pessoa__imdb_id", "papel", "ordem_credito")),
+            [("nm0000001", "Actor", 0), ("nm0000002", "Director", 1), ("nm0000001", "Writer", 2)],
+        )
+
+        resultado = imdb_datasets.carregar_creditos(principals, names, lote=2)
+        self.assertEqual((resultado.creditos, resultado.pessoas_criadas), (0, 0))
+        self.assertEqual(Elenco.objects.count(), 4)
+
+    def test_pessoas_ignoradas_nao_contam_como_criadas(self):
+        from . import imdb_datasets
+        from .models.pessoa import Pessoa
+
+        imdb_datasets.carregar(self.basics, self.ratings)
+        # O slug que a carga daria a nm0000002 já está ocupado.
+        Pessoa.objects.create(nome="Outra", slug="bruno-costa-nm0000002", imdb_id="nm9999999")
+        principals = str(self.diretorio / "title.principals.tsv.gz")
+        names = str(self.diretorio / "name.basics.tsv.gz")
+        _escrever_tsv(principals, ("tconst", "ordering", "nconst", "category", "job", "characters"), [
+            ("tt0000002", "1", "nm0000001", "actor", r"\N", r"\N"),
+            ("tt0000002", "2", "nm0000002", "director", r"\N", r"\N"),
+        ])
+        _escrever_tsv(names, ("nconst", "primaryName", "birthYear", "deathYear", "primaryProfession", "knownForTitles"), [
+            ("nm0000001", "Ana Silva", r"\N", r"\N", r"\N", r"\N"),
+            ("nm0000002", "Bruno Costa", r"\N", r"\N", r"\N", r"\N"),
+        ])
+        resultado = imdb_datasets.carregar_creditos(principals, names)
+        self.assertEqual((resultado.pessoas_criadas, resultado.creditos, resultado.sem_pessoa), (1, 1, 1))
+
+    def test_comando(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        saida = StringIO()
+        call_command("load_imdb_datasets", self.basics, "--ratings", self.ratings,
+                     "--types", "movie,tvSeries", "--batch-size", "5000", stdout=saida)
+        self.assertIn("5 novos filmes, 0 atualizados, 0 sem alterações", saida.getvalue())
+        self.assertTrue(Filme.objects.filter(imdb_id="tt0000004", media_rating=8.1).exists())
@@ -3,19 +3,27 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     GeneroViewSet,
+    PessoaViewSet,
     FilmeViewSet,
     ReviewViewSet,
     WatchlistViewSet,
     FavoritoViewSet,
+    AutocompleteView,
+    CatalogoCacheStatsView,
+    RecomendacoesView,
 )
 
 router = DefaultRouter()
 router.register(r'generos', GeneroViewSet, basename='genero')
 router.register(r'filmes', FilmeViewSet, basename='filme')
+router.register(r'pessoas', PessoaViewSet, basename='pessoa')
 router.register(r'reviews', ReviewViewSet, basename='review')
 router.register(r'watchlist', WatchlistViewSet, basename='watchlist')
 router.register(r'favoritos', FavoritoViewSet, basename='favorito')
 
 urlpatterns = [
+    path('autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
+    path('me/recommendations/', RecomendacoesView.as_view(), name='recomendacoes'),
+    path('cache/catalogo/', CatalogoCacheStatsView.as_view(), name='catalogo-cache-stats'),
     path('', include(router.urls)),
 ]
@@ -1,33 +1,66 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
+from collections.abc import Mapping
+
 from django.contrib.auth import get_user_model
-from rest_framework import viewsets, permissions, generics, status
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework import viewsets, mixins, permissions, generics, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
 
 from .models.taxonomia import Genero
+from .models.pessoa import Pessoa
+from .models.elenco import Elenco
 from .models.filme import Filme
 from .models.review import Review
 from .models.listas import Watchlist, Favorito
+from .models.recomendacao import FilmeSemelhante
 
+from .autocomplete import indice as indice_autocomplete
+from .cache import CatalogoCacheMixin, estatisticas as estatisticas_cache
+from .conditional import ConditionalGetMixin
+from .costars import grafo_elenco
+from .facets import FiltroCatalogo, contar_facetas
+from . import membership, recommendations
+from .membership import estado_listas, estado_listas_por_slug
+from .search import pesquisar_ids
+from .pagination import (
+    CatalogoPagination, FilmografiaCursorPagination, ListaPagination, ReviewCursorPagination, TopCursorPagination,
+)
 from .serializers import (
-    GeneroSerializer,
-    FilmeListSerializer, FilmeDetailSerializer, FilmeWriteSerializer,
+    GeneroSerializer, PessoaSerializer, PessoaMiniSerializer, CreditoSerializer, FilmografiaSerializer, FilmeMiniSerializer,
+    VideoSerializer,
+    FilmeListSerializer, FilmeDetailSerializer, FilmeWriteSerializer, FilmeSemelhanteSerializer,
     ReviewSerializer, WatchlistSerializer, FavoritoSerializer,
-    UserRegistrationSerializer, UserSerializer,
+    UserRegistrationSerializer, UserSerializer, EstadoListasLoteSerializer, ListaLoteSerializer,
 )
 
 User = get_user_model()
 
-class GeneroViewSet(viewsets.ModelViewSet):
+class GeneroViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
     queryset = Genero.objects.all()
     serializer_class = GeneroSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
-class FilmeViewSet(viewsets.ModelViewSet):
+class FilmeViewSet(CatalogoCacheMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Filme.objects.all().prefetch_related('generos')
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CatalogoPagination
     lookup_field = 'slug'
+    cache_actions = ('list', 'retrieve', 'facetas', 'top', 'top_genero', 'similar', 'creditos')
+
+    # Coleções que o detalhe pode trazer na mesma resposta (`?include=reviews,credits`).
+    INCLUDES_DETALHE = ('reviews', 'status', 'credits', 'videos')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = FiltroCatalogo.from_query_params(self.request.query_params).aplicar(queryset)
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -36,44 +69,269 @@ class FilmeViewSet(viewsets.ModelViewSet):
             return FilmeWriteSerializer
         return FilmeDetailSerializer
 
+    def _includes(self, request) -> set[str]:
+        return {parte.strip() for parte in request.query_params.get('include', '').split(',') if parte.strip()}
+
+    def resposta_personalizada(self, request) -> bool:
+        return request.user.is_authenticated and 'status' in self._includes(request)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.action == 'list' and 'status' in self._includes(self.request):
+            # Uma query por lista para a página inteira, em vez de um pedido por cartão.
+            self._estado_listas = estado_listas(self.request.user, [filme.pk for filme in page])
+        return page
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self._includes(request).intersection(self.INCLUDES_DETALHE):
+            return super().retrieve(request, *args, **kwargs)
+        # As coleções não mudam o `updated_at` do filme: sem validadores, mas com a cache anónima.
+        return self.responder_com_cache(request, self._detalhe_composto)
+
+    def _detalhe_composto(self, request):
+        """
+        Detalhe do filme com as coleções pedidas em `?include=`, cada uma
+        numa única query e com o filme resolvido uma só vez:
+
+        - `reviews`: a primeira página do feed de reviews (aceita os mesmos
+          `spoiler`, `minha_primeiro` e `page_size`); o link `next` segue
+          para `/api/filmes/{slug}/reviews/`;
+        - `status`: `in_watchlist` e `is_favorite`, como na lista;
+        - `credits`: o elenco e a equipa, como em `/creditos/`;
+        - `videos`: os vídeos do filme, mais recentes primeiro.
+        """
+        includes = self._includes(request)
+        filme = self.get_object()
+        if 'status' in includes:
+            self._estado_listas = estado_listas(request.user, [filme.pk])
+        dados = self.get_serializer(filme).data
+        if 'reviews' in includes:
+            url = request.build_absolute_uri(reverse('filme-list-reviews', kwargs={'slug': filme.slug}))
+            for nome in ('spoiler', 'minha_primeiro', 'page_size'):
+                if nome in request.query_params:
+                    url = replace_query_param(url, nome, request.query_params[nome])
+            dados['reviews'] = self._feed_reviews(request, filme.pk, url_base=url)
+        if 'credits' in includes:
+            creditos = Elenco.objects.filter(filme=filme).select_related('pessoa').order_by('ordem_credito', 'id')
+            dados['credits'] = {'results': CreditoSerializer(creditos, many=True).data}
+        if 'videos' in includes:
+            dados['videos'] = {'results': VideoSerializer(filme.videos.order_by('-created_at', '-id'), many=True).data}
+        return Response(dados)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if getattr(self, '_estado_listas', None) is not None:
+            context['estado_listas'] = self._estado_listas
+        return context
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        termo = request.query_params.get('q', '').strip()
+        try:
+            limite = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            limite = 20
+        if len(termo) < 2:
+            return Response({'detail': 'O parâmetro "q" deve ter pelo menos 2 caracteres.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = pesquisar_ids(termo, limite=max(limite, 1))
+        filmes = self.get_queryset().in_bulk(ids)
+        resultados = [filmes[pk] for pk in ids if pk in filmes]
+        serializer = FilmeListSerializer(resultados, many=True, context=self.get_serializer_context())
+        return Response({'query': termo, 'results': serializer.data})
+
+    @action(detail=False, methods=['get'])
+    def facetas(self, request):
+        return self.responder_com_cache(request, self._contar_facetas)
+
+    def _contar_facetas(self, request):
+        filtro = FiltroCatalogo.from_query_params(request.query_params)
+        return Response(contar_facetas(filtro))
+
+    @action(detail=False, methods=['get', 'post'], url_path='status', url_name='status-lote', permission_classes=[permissions.AllowAny])
+    def status_lote(self, request):
+        """
+        Estado das listas para vários filmes: `?ids=1,2,3` ou `?slugs=a,b`
+        (ou as mesmas chaves, como listas, no corpo de um POST).
+        """
+        dados = request.data if request.method == 'POST' else request.query_params
+        if not isinstance(dados, Mapping):
+            raise ValidationError({'detail': 'O corpo do pedido tem de ser um objeto JSON.'})
+        serializer = EstadoListasLoteSerializer(data={
+            nome: valor for nome in ('ids', 'slugs') if (valor := self._ler_lista(dados, nome)) is not None
+        })
+        serializer.is_valid(raise_exception=True)
+        ids, slugs = serializer.validated_data.get('ids', []), serializer.validated_data.get('slugs', [])
+
+        resultados = {}
+        if ids:
+            resultados.update(estado_listas(request.user, ids))
+        if slugs:
+            resultados.update(estado_listas_por_slug(request.user, slugs))
+        return Response({'results': resultados})
+
+    @staticmethod
+    def _ler_lista(dados, nome):
+        """Aceita `a,b` na query string ou num valor de texto; listas seguem tal e qual para o serializer."""
+        if hasattr(dados, 'getlist'):
+            if nome not in dados:
+                return None
+            valores = []
+            for valor in dados.getlist(nome):
+                valores.extend(parte.strip() for parte in str(valor).split(',') if parte.strip())
+            return valores
+        valor = dados.get(nome)
+        if isinstance(valor, str):
+            return [parte.strip() for parte in valor.split(',') if parte.strip()]
+        return valor
+
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        """Ranking do catálogo pelo score bayesiano, paginado por cursor."""
+        return self.responder_com_cache(request, self._ranking, Filme.objects.all())
+
+    @action(detail=False, methods=['get'], url_path=r'top/(?P<genero>[-\w]+)')
+    def top_genero(self, request, genero=None):
+        """O mesmo ranking, só com os filmes de um género."""
+        return self.responder_com_cache(request, self._ranking_genero, genero)
+
+    def _ranking_genero(self, request, genero):
+        if not Genero.objects.filter(slug=genero).exists():
+            raise NotFound('Género não encontrado.')
+        return self._ranking(request, Filme.objects.filter(generos__slug=genero))
+
+    def _ranking(self, request, filmes):
+        paginator = TopCursorPagination()
+        pagina = paginator.paginate_queryset(filmes.prefetch_related('generos'), request, view=self)
+        serializer = FilmeListSerializer(pagina, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, slug=None):
+        """Filmes semelhantes (calculados offline por `calcular_semelhantes`)."""
+        return self.responder_com_cache(request, self._semelhantes, slug)
+
+    def _semelhantes(self, request, slug):
+        vizinhos = list(
+            FilmeSemelhante.objects.filter(filme__slug=slug)
+            .select_related('semelhante')
+            .order_by('posicao')
+        )
+        # Só quando não há vizinhos é preciso distinguir um filme sem vizinhos de um slug inexistente.
+        if not vizinhos and not self._filme_existe(slug):
+            raise NotFound()
+        return Response({'results': FilmeSemelhanteSerializer(vizinhos, many=True).data})
+
+    @action(detail=True, methods=['get'])
+    def creditos(self, request, slug=None):
+        """Elenco e equipa do filme, pela ordem dos créditos."""
+        return self.responder_com_cache(request, self._creditos, slug)
+
+    def _creditos(self, request, slug):
+        creditos = list(
+            Elenco.objects.filter(filme__slug=slug)
+            .select_related('pessoa')
+            .order_by('ordem_credito', 'id')
+        )
+        if not creditos and not self._filme_existe(slug):
+            raise NotFound()
+        return Response({'results': CreditoSerializer(creditos, many=True).data})
+
     @action(detail=True, methods=['get'], permission_classes=[permissions.AllowAny])
     def status(self, request, slug=None):
         user = request.user
         if not user.is_authenticated:
             return Response({'in_watchlist': False, 'is_favorite': False})
-        filme = self.get_object()
-        data = {
-            'in_watchlist': Watchlist.objects.filter(utilizador=user, filme=filme).exists(),
-            'is_favorite': Favorito.objects.filter(utilizador=user, filme=filme).exists(),
-        }
-        return Response(data)
+        filme_id = get_object_or_404(Filme.objects.values_list('pk', flat=True), slug=slug)
+        return Response(estado_listas(user, [filme_id])[filme_id])
+
+    def _filme_existe(self, slug) -> bool:
+        return Filme.objects.filter(slug=slug).exists()
+
+    def _alternar(self, lista, campo, slug):
+        # Tenta primeiro retirar; se não havia nada para retirar, adiciona. Cada
+        # passo é uma única instrução, sem `IntegrityError` em cliques repetidos.
+        if membership.remover(self.request.user.pk, lista, slug=slug):
+            return Response({campo: False}, status=status.HTTP_200_OK)
+        if membership.adicionar(self.request.user.pk, lista, slug=slug):
+            return Response({campo: True}, status=status.HTTP_201_CREATED)
+        if not self._filme_existe(slug):
+            raise NotFound()
+        # Adicionado entretanto por um pedido concorrente.
+        return Response({campo: True}, status=status.HTTP_200_OK)
+
+    def _definir(self, lista, campo, slug):
+        """`PUT` adiciona e `DELETE` retira; repetir o pedido não muda nada."""
+        if self.request.method == 'PUT':
+            alterados = membership.adicionar(self.request.user.pk, lista, slug=slug)
+        else:
+            alterados = membership.remover(self.request.user.pk, lista, slug=slug)
+        if not alterados and not self._filme_existe(slug):
+            raise NotFound()
+        presente = self.request.method == 'PUT'
+        codigo = status.HTTP_201_CREATED if alterados and presente else status.HTTP_200_OK
+        return Response({campo: presente}, status=codigo)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def toggle_watchlist(self, request, slug=None):
-        filme = self.get_object()
-        user = request.user
-        watchlist_entry, created = Watchlist.objects.get_or_create(utilizador=user, filme=filme)
-        if not created:
-            watchlist_entry.delete()
-            return Response({'in_watchlist': False}, status=status.HTTP_200_OK)
-        return Response({'in_watchlist': True}, status=status.HTTP_201_CREATED)
+        return self._alternar(membership.WATCHLIST, 'in_watchlist', slug)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def toggle_favorite(self, request, slug=None):
-        filme = self.get_object()
-        user = request.user
-        favorite_entry, created = Favorito.objects.get_or_create(utilizador=user, filme=filme)
-        if not created:
-            favorite_entry.delete()
-            return Response({'is_favorite': False}, status=status.HTTP_200_OK)
-        return Response({'is_favorite': True}, status=status.HTTP_201_CREATED)
+        return self._alternar(membership.FAVORITOS, 'is_favorite', slug)
+
+    @action(detail=True, methods=['put', 'delete'], url_path='watchlist', permission_classes=[permissions.IsAuthenticated])
+    def watchlist(self, request, slug=None):
+        return self._definir(membership.WATCHLIST, 'in_watchlist', slug)
+
+    @action(detail=True, methods=['put', 'delete'], url_path='favorite', permission_classes=[permissions.IsAuthenticated])
+    def favorite(self, request, slug=None):
+        return self._definir(membership.FAVORITOS, 'is_favorite', slug)
 
     @action(detail=True, methods=['get'], url_path='reviews')
     def list_reviews(self, request, slug=None):
-        filme = self.get_object()
-        reviews = filme.reviews.all()
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+        """
+        Feed de reviews paginado por cursor, mais recentes primeiro.
+
+        `?spoiler=0` esconde as reviews com spoilers (`1` mostra só essas) e
+        `?minha_primeiro=1` põe a review do próprio utilizador no topo da
+        primeira página. O número de queries não depende do número de reviews.
+        """
+        filme_id = get_object_or_404(Filme.objects.values_list('pk', flat=True), slug=slug)
+        return Response(self._feed_reviews(request, filme_id))
+
+    def _feed_reviews(self, request, filme_id, url_base=None) -> dict:
+        reviews = Review.objects.filter(filme_id=filme_id).select_related('autor')
+        spoiler = self._ler_booleano(request, 'spoiler')
+        if spoiler is not None:
+            reviews = reviews.filter(spoiler=spoiler)
+
+        minha = None
+        if self._ler_booleano(request, 'minha_primeiro') and request.user.is_authenticated:
+            reviews = reviews.exclude(autor=request.user)
+            if ReviewCursorPagination.cursor_query_param not in request.query_params:
+                minha = Review.objects.filter(filme_id=filme_id, autor=request.user).select_related('autor')
+                if spoiler is not None:
+                    minha = minha.filter(spoiler=spoiler)
+                minha = minha.first()
+
+        paginator = ReviewCursorPagination()
+        paginator.url_base = url_base
+        pagina = paginator.paginate_queryset(reviews, request, view=self)
+        if minha is not None:
+            pagina = [minha, *pagina]
+        return paginator.get_paginated_response(ReviewSerializer(pagina, many=True).data).data
+
+    @staticmethod
+    def _ler_booleano(request, nome):
+        valor = request.query_params.get(nome)
+        if valor in (None, ''):
+            return None
+        if valor.lower() in ('1', 'true'):
+            return True
+        if valor.lower() in ('0', 'false'):
+            return False
+        raise ValidationError({nome: f'Valor inválido: {valor!r}.'})
 
     @action(detail=True, methods=['post'], url_path='reviews/create', permission_classes=[permissions.IsAuthenticated])
     def create_review(self, request, slug=None):
@@ -88,6 +346,54 @@ class FilmeViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class PessoaViewSet(CatalogoCacheMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Detalhe de uma pessoa com a primeira página da filmografia (por ano de
+    lançamento, paginada por cursor, `?cursor=`). São sempre duas queries,
+    seja qual for o número de créditos.
+    """
+    queryset = Pessoa.objects.all()
+    serializer_class = PessoaSerializer
+    permission_classes = [permissions.AllowAny]
+    lookup_field = 'slug'
+    cache_actions = ('retrieve', 'path')
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.responder_com_cache(request, self._detalhe)
+
+    def _detalhe(self, request):
+        pessoa = self.get_object()
+        paginator = FilmografiaCursorPagination()
+        creditos = paginator.paginate_queryset(
+            Elenco.objects.filter(pessoa=pessoa).select_related('filme'), request, view=self
+        )
+        dados = self.get_serializer(pessoa).data
+        dados['filmografia'] = paginator.get_paginated_response(FilmografiaSerializer(creditos, many=True).data).data
+        return Response(dados)
+
+    @action(detail=True, methods=['get'], url_path=r'path/(?P<destino>[^/.]+)')
+    def path(self, request, slug=None, destino=None):
+        """
+        Graus de separação: a cadeia mais curta de colegas de elenco entre as
+        duas pessoas, calculada no grafo em memória (`costars.py`).
+        """
+        return self.responder_com_cache(request, self._caminho, slug, destino)
+
+    def _caminho(self, request, slug, destino):
+        ids = dict(Pessoa.objects.filter(slug__in=[slug, destino]).values_list('slug', 'pk'))
+        if slug not in ids or destino not in ids:
+            raise NotFound()
+        caminho = grafo_elenco.atual().caminho(ids[slug], ids[destino])
+        if caminho is None:
+            return Response({'graus': None, 'pessoas': [], 'filmes': []})
+        pessoas = Pessoa.objects.in_bulk(caminho[0::2])
+        filmes = Filme.objects.in_bulk(caminho[1::2])
+        return Response({
+            'graus': len(caminho) // 2,
+            'pessoas': PessoaMiniSerializer([pessoas[pk] for pk in caminho[0::2]], many=True).data,
+            'filmes': FilmeMiniSerializer([filmes[pk] for pk in caminho[1::2]], many=True).data,
+        })
+
 class ReviewViewSet(viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
@@ -99,6 +405,8 @@ class ReviewViewSet(viewsets.ModelViewSet):
 class WatchlistViewSet(viewsets.ModelViewSet):
     serializer_class = WatchlistSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ListaPagination
+    lista = membership.WATCHLIST
 
     def get_queryset(self):
         return Watchlist.objects.filter(utilizador=self.request.user)
@@ -106,12 +414,70 @@ class WatchlistViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(utilizador=self.request.user)
 
+    @action(detail=False, methods=['put', 'delete'], url_path='lote')
+    def lote(self, request):
+        """
+        Adiciona (`PUT`) ou retira (`DELETE`) vários filmes de uma vez, com
+        `{"filmes": [ids]}` no corpo. Responde com os ids que mudaram.
+        """
+        if not isinstance(request.data, Mapping):
+            raise ValidationError({'detail': 'O corpo do pedido tem de ser um objeto JSON.'})
+        serializer = ListaLoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['filmes']
+
+        if request.method == 'PUT':
+            return Response({'added': membership.adicionar(request.user.pk, self.lista, ids)})
+        return Response({'removed': membership.remover(request.user.pk, self.lista, ids)})
+
 class FavoritoViewSet(WatchlistViewSet):
     serializer_class = FavoritoSerializer
+    lista = membership.FAVORITOS
     
     def get_queryset(self):
         return Favorito.objects.filter(utilizador=self.request.user)
 
+class AutocompleteView(APIView):
+    # Sem autenticação: as sugestões são públicas e assim cada tecla não paga
+    # a descodificação do JWT nem a leitura da sessão.
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            limite = min(max(int(request.query_params.get('limit', 8)), 1), 20)
+        except ValueError:
+            limite = 8
+        sugestoes = indice_autocomplete.sugerir(request.query_params.get('q', ''), limite=limite)
+        return Response({
+            'results': [
+                {'tipo': s.tipo, 'id': s.id, 'slug': s.slug, 'label': s.label}
+                for s in sugestoes
+            ]
+        })
+
+class RecomendacoesView(APIView):
+    """Recomendações personalizadas do utilizador autenticado (ver `recommendations.py`)."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limite = min(max(int(request.query_params.get('limit', 20)), 1), recommendations.MAX_RECOMENDACOES)
+        except ValueError:
+            limite = 20
+        personalizado, ids = recommendations.recomendar(request.user.pk)
+        ids = ids[:limite]
+        filmes = Filme.objects.prefetch_related('generos').in_bulk(ids)
+        resultados = [filmes[pk] for pk in ids if pk in filmes]
+        serializer = FilmeListSerializer(resultados, many=True, context={'request': request})
+        return Response({'personalizado': personalizado, 'results': serializer.data})
+
+class CatalogoCacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(estatisticas_cache())
+
 class UserRegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserRegistrationSerializer
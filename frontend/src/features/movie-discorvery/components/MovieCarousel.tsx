@@ -1,14 +1,16 @@
 // src/features/movie-discovery/components/MovieCarousel.tsx
 import React from 'react';
 import { Link } from 'react-router-dom';
-import { Filme } from '../../../types';
+import { Filme, MovieStatus } from '../../../types';
 
 interface MovieCarouselProps {
   title: string;
   movies: Filme[];
+  // Estado das listas por slug, pedido em lote pela página (`getMoviesStatus`).
+  status?: Record<string, MovieStatus>;
 }
 
-const MovieCarousel: React.FC<MovieCarouselProps> = ({ title, movies }) => {
+const MovieCarousel: React.FC<MovieCarouselProps> = ({ title, movies, status }) => {
   if (!movies || movies.length === 0) {
     return null;
   }
@@ -17,24 +19,37 @@ const MovieCarousel: React.FC<MovieCarouselProps> = ({ title, movies }) => {
     <section className="container mx-auto px-4">
       <h2 className="text-2xl font-bold text-white mb-4">{title}</h2>
       <div className="flex overflow-x-auto space-x-4 pb-4 -mx-4 px-4">
-        {movies.map((movie) => (
-          <Link to={`/filme/${movie.slug}`} key={movie.id} className="flex-shrink-0 w-40 md:w-48 group">
-            <div className="relative rounded-lg overflow-hidden border-2 border-transparent group-hover:border-brand-accent transition-all duration-300">
-              <img 
-                src={movie.poster} 
-                alt={movie.titulo} 
-                className="w-full h-60 md:h-72 object-cover bg-brand-light"
-                // Adiciona um placeholder em caso de erro na imagem
-                onError={(e) => { e.currentTarget.src = 'https://via.placeholder.com/192x288.png?text=No+Image'; }}
-              />
-              <div className="absolute inset-0 bg-black bg-opacity-20 group-hover:bg-opacity-0 transition-opacity duration-300"></div>
-            </div>
-            <h3 className="text-white text-sm mt-2 truncate group-hover:text-brand-accent transition-colors">
-              {movie.titulo}
-            </h3>
-            <p className="text-brand-text text-xs">{movie.ano_lancamento}</p>
-          </Link>
-        ))}
+        {movies.map((movie) => {
+          const movieStatus = status?.[movie.slug];
+          return (
+            <Link to={`/filme/${movie.slug}`} key={movie.id} className="flex-shrink-0 w-40 md:w-48 group">
+              <div className="relative rounded-lg overflow-hidden border-2 border-transparent group-hover:border-brand-accent transition-all duration-300">
+                <img 
+                  src={movie.poster} 
+                  alt={movie.titulo} 
+                  className="w-full h-60 md:h-72 object-cover bg-brand-light"
+                  // Adiciona um placeholder em caso de erro na imagem
+                  onError={(e) => { e.currentTarget.src = 'https://via.placeholder.com/192x288.png?text=No+Image'; }}
+                />
+                <div className="absolute inset-0 bg-black bg-opacity-20 group-hover:bg-opacity-0 transition-opacity duration-300"></div>
+                {movieStatus && (movieStatus.in_watchlist || movieStatus.is_favorite) && (
+                  <div className="absolute top-2 right-2 flex space-x-1 text-xs font-semibold">
+                    {movieStatus.in_watchlist && (
+                      <span className="px-1.5 py-0.5 rounded bg-green-600 text-white" title="Na Watchlist">W</span>
+                    )}
+                    {movieStatus.is_favorite && (
+                      <span className="px-1.5 py-0.5 rounded bg-pink-600 text-white" title="Favorito">♥</span>
+                    )}
+                  </div>
+                )}
+              </div>
+              <h3 className="text-white text-sm mt-2 truncate group-hover:text-brand-accent transition-colors">
+                {movie.titulo}
+              </h3>
+              <p className="text-brand-text text-xs">{movie.ano_lancamento}</p>
+            </Link>
+          );
+        })}
       </div>
     </section>
   );
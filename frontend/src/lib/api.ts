@@ -1,6 +1,6 @@
 // src/lib/api.ts
 import axios from 'axios';
-import { Filme, PaginatedResponse, User, LoginCredentials, RegisterCredentials, MovieStatus, Review, ReviewPayload } from '../types';
+import { Filme, FilmeDetalhe, PaginatedResponse, User, LoginCredentials, RegisterCredentials, MovieStatus, Review, ReviewPayload } from '../types';
 
 const baseURL = import.meta.env.VITE_API_URL || 'http://localhost:8765';
 
@@ -38,6 +38,17 @@ export const getFilmeDetail = async (slug: string): Promise<Filme> => {
   return response.data;
 };
 
+// Detalhe com as coleções pedidas numa só resposta, em vez de um pedido por coleção.
+export const getFilmeDetailWithIncludes = async (
+  slug: string,
+  include: Array<'reviews' | 'status' | 'credits' | 'videos'>,
+): Promise<FilmeDetalhe> => {
+  const response = await apiClient.get(`/filmes/${slug}/`, {
+    params: { include: include.join(','), minha_primeiro: 1 },
+  });
+  return response.data;
+};
+
 export const login = async (credentials: LoginCredentials) => {
   const response = await apiClient.post('/auth/token/', credentials);
   const tokens = response.data;
@@ -59,9 +70,14 @@ export const getMe = async (): Promise<User> => {
   return response.data;
 };
 
-export const getMovieStatus = async (slug: string): Promise<MovieStatus> => {
-  const response = await apiClient.get(`/filmes/${slug}/status/`);
-  return response.data;
+export const getRecommendations = async (limit = 20): Promise<Filme[]> => {
+  const response = await apiClient.get('/me/recommendations/', { params: { limit } });
+  return response.data.results;
+};
+
+export const getMoviesStatus = async (slugs: string[]): Promise<Record<string, MovieStatus>> => {
+  const response = await apiClient.post('/filmes/status/', { slugs });
+  return response.data.results;
 };
 
 export const toggleWatchlist = async (slug: string): Promise<{ in_watchlist: boolean }> => {
@@ -74,11 +90,6 @@ export const toggleFavorite = async (slug: string): Promise<{ is_favorite: boole
   return response.data;
 };
 
-export const getMovieReviews = async (slug: string): Promise<Review[]> => {
-  const response = await apiClient.get(`/filmes/${slug}/reviews/`);
-  return response.data;
-};
-
 export const createMovieReview = async (slug: string, payload: ReviewPayload): Promise<Review> => {
   const response = await apiClient.post(`/filmes/${slug}/reviews/create/`, payload);
   return response.data;
@@ -1,17 +1,22 @@
 // src/pages/HomePage.tsx
-import React, { useEffect, useState, useCallback } from 'react';
+import React, { useEffect, useState, useCallback, useRef } from 'react';
 import { useTranslation } from 'react-i18next';
-import { getFilmes } from '../lib/api';
+import { getFilmes, getMoviesStatus, getRecommendations } from '../lib/api';
 import MovieCarousel from '../features/movie-discorvery/components/MovieCarousel';
 import ErrorMessage from '../components/ErrorMessage';
-import { Filme } from '../types';
+import { Filme, MovieStatus } from '../types';
+import { useUserStore } from '../store/userStore';
 
 const HomePage: React.FC = () => {
   const { t } = useTranslation();
   const [popularMovies, setPopularMovies] = useState<Filme[]>([]);
   const [recentMovies, setRecentMovies] = useState<Filme[]>([]);
+  const [recommendedMovies, setRecommendedMovies] = useState<Filme[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [statusBySlug, setStatusBySlug] = useState<Record<string, MovieStatus>>({});
+  const requestedSlugs = useRef(new Set<string>());
+  const { isAuthenticated } = useUserStore();
 
   const fetchMovies = useCallback(async () => {
     try {
@@ -25,7 +30,6 @@ const HomePage: React.FC = () => {
       
       setPopularMovies(popularResponse.results);
       setRecentMovies(recentResponse.results);
-      
     } catch (err: any) {
       setError(err.message);
       console.error(err);
@@ -38,6 +42,41 @@ const HomePage: React.FC = () => {
     fetchMovies();
   }, [fetchMovies]);
 
+  // Recomendações só com sessão iniciada: pedidas ao entrar (mesmo já nesta
+  // página) e limpas ao sair. Uma falha aqui não esconde o resto da página.
+  useEffect(() => {
+    if (!isAuthenticated) {
+      setRecommendedMovies([]);
+      return;
+    }
+    let cancelled = false;
+    getRecommendations()
+      .then((movies) => {
+        if (!cancelled) setRecommendedMovies(movies);
+      })
+      .catch((err) => console.error(err));
+    return () => {
+      cancelled = true;
+    };
+  }, [isAuthenticated]);
+
+  // Estado das listas de todos os cartões num só pedido (e só dos filmes que
+  // ainda não foram pedidos, quando as recomendações chegam depois).
+  useEffect(() => {
+    if (!isAuthenticated) {
+      requestedSlugs.current.clear();
+      setStatusBySlug({});
+      return;
+    }
+    const slugs = [...new Set([...recommendedMovies, ...popularMovies, ...recentMovies].map((movie) => movie.slug))]
+      .filter((slug) => !requestedSlugs.current.has(slug));
+    if (slugs.length === 0) return;
+    slugs.forEach((slug) => requestedSlugs.current.add(slug));
+    getMoviesStatus(slugs)
+      .then((results) => setStatusBySlug((prev) => ({ ...prev, ...results })))
+      .catch((err) => console.error(err));
+  }, [isAuthenticated, recommendedMovies, popularMovies, recentMovies]);
+
   if (loading) {
     return <div className="text-center text-white py-10">A carregar filmes...</div>;
   }
@@ -48,8 +87,11 @@ const HomePage: React.FC = () => {
 
   return (
     <div className="space-y-12">
-      <MovieCarousel title={t('homePage.popular')} movies={popularMovies} />
-      <MovieCarousel title={t('homePage.recent')} movies={recentMovies} />
+      {recommendedMovies.length > 0 && (
+        <MovieCarousel title={t('homePage.forYou')} movies={recommendedMovies} status={statusBySlug} />
+      )}
+      <MovieCarousel title={t('homePage.popular')} movies={popularMovies} status={statusBySlug} />
+      <MovieCarousel title={t('homePage.recent')} movies={recentMovies} status={statusBySlug} />
     </div>
   );
 };
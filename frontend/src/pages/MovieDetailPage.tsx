@@ -1,7 +1,7 @@
 // src/pages/MovieDetailPage.tsx
 import React, { useEffect, useState, useCallback } from 'react';
 import { useParams } from 'react-router-dom';
-import { getFilmeDetail, getMovieStatus, toggleWatchlist, toggleFavorite, getMovieReviews } from '../lib/api';
+import { getFilmeDetailWithIncludes, toggleWatchlist, toggleFavorite } from '../lib/api';
 import { Filme, MovieStatus, Review } from '../types';
 import ErrorMessage from '../components/ErrorMessage';
 import { useUserStore } from '../store/userStore';
@@ -24,16 +24,16 @@ const MovieDetailPage: React.FC = () => {
       setLoading(true);
       setError(null);
       
-      const [movieData, reviewsData] = await Promise.all([
-        getFilmeDetail(slug),
-        getMovieReviews(slug)
-      ]);
+      // Filme, reviews e (com sessão) estado das listas num único pedido.
+      const { reviews: reviewsPage, in_watchlist, is_favorite, ...movieData } = await getFilmeDetailWithIncludes(
+        slug,
+        isAuthenticated ? ['reviews', 'status'] : ['reviews'],
+      );
       setMovie(movieData);
-      setReviews(reviewsData);
+      setReviews(reviewsPage?.results ?? []);
 
       if (isAuthenticated) {
-        const statusData = await getMovieStatus(slug);
-        setStatus(statusData);
+        setStatus({ in_watchlist: !!in_watchlist, is_favorite: !!is_favorite });
       }
     } catch (err: any) {
       setError(err.message);
@@ -24,6 +24,8 @@ export interface Filme {
   generos?: Genero[];
   descricao: string;
   imdb_id: string;
+  reviews_count?: number;
+  distribuicao_ratings?: Record<string, number>;
 }
 
 export interface User {
@@ -61,6 +63,43 @@ export interface Review {
   created_at: string;
 }
 
+// --- Detalhe do filme com coleções (`?include=reviews,status,credits,videos`) ---
+
+export interface CursorPage<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+export interface PessoaMini {
+  id: number;
+  nome: string;
+  slug: string;
+  foto: string;
+}
+
+export interface Credito {
+  pessoa: PessoaMini;
+  papel: string;
+  ordem_credito: number;
+}
+
+export interface Video {
+  id: number;
+  titulo: string;
+  tipo: string;
+  site: string;
+  key: string;
+  url: string;
+  idioma: string;
+}
+
+export interface FilmeDetalhe extends Filme, Partial<MovieStatus> {
+  reviews?: CursorPage<Review>;
+  credits?: { results: Credito[] };
+  videos?: { results: Video[] };
+}
+
 export interface ReviewPayload {
   titulo?: string;
   texto: string;